@@ -0,0 +1,285 @@
+import argparse
+import json
+import os
+import sys
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.formparsers import MultiPartException, MultiPartParser
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+import metrics
+from archive import SubmissionArchive
+from customer_index import CustomerIndex, describe_matches
+from ficha import TEMPLATE_PATH, cells_sold_to, cells_ship_to, image_keys, required_fields, find_missing_fields, form_fields, \
+    shipping_fields
+from jobs import JobQueue, QueueFull
+from mailer import SMTPPool, SMTP_HOST, SMTP_PORT, MAX_MESSAGE_BYTES
+from outbox import Outbox, Dispatcher
+from submission import process_submission
+from validation import validate_fields
+
+# API HTTP (ASGI) para cadastros enviados por sistemas de parceiros, sem passar pelo formulário Streamlit.
+# POST /submissions recebe os mesmos campos do dicionário data do formulário e devolve um job_id;
+# a validação é a mesma do formulário e a ficha é gerada e enviada pela mesma fila de processamento
+# (process_submission em threads de JobQueue), fora do event loop. GET /submissions/{job_id} informa o status.
+#
+# Corpo do POST:
+#   multipart/form-data: parte "data" com o JSON dos campos de texto e um arquivo por comprovante
+#                        (nome da parte = chave da imagem, ex.: comprovante_endereco)
+#   application/json:    só os campos de texto (útil para validar; os comprovantes obrigatórios faltarão)
+# Um cliente já cadastrado retorna 409; repita com ?confirm_duplicate=true para enviar mesmo assim.
+# Um job concluído informa em "delivery" se o e-mail foi enviado ("sent") ou se o mesmo cadastro ainda está
+# sendo enviado por outra requisição ("sending"; consulte de novo ou reenvie mais tarde).
+#
+# Uso: python api.py --port 8000   (ou: uvicorn api:create_app --factory)
+# As configurações são as mesmas do formulário (.streamlit/secrets.toml).
+
+# Tamanho máximo de cada comprovante e do corpo inteiro da requisição
+MAX_UPLOAD_BYTES = 10 * 1024 * 1024
+MAX_REQUEST_BYTES = 60 * 1024 * 1024
+TRUE_VALUES = {"1", "true", "sim", "s", "yes", "y"}
+
+
+class InvalidRequest(Exception):
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+# Limite excedido durante a leitura do corpo; é uma MultiPartException para que o parser feche os
+# arquivos temporários já criados
+class TooLarge(MultiPartException):
+    pass
+
+
+# Parser multipart que recusa uma parte (comprovante) maior que MAX_UPLOAD_BYTES assim que ela passa do limite,
+# sem gravar o resto no arquivo temporário
+class LimitedMultiPartParser(MultiPartParser):
+    def on_part_begin(self):
+        super().on_part_begin()
+        self.part_bytes = 0
+
+    def on_part_data(self, data, start, end):
+        self.part_bytes += end - start
+        if self.part_bytes > MAX_UPLOAD_BYTES:
+            raise TooLarge(f"Arquivo maior que {MAX_UPLOAD_BYTES // (1024 * 1024)} MB")
+        super().on_part_data(data, start, end)
+
+
+# Corpo da requisição em blocos, interrompido assim que passa de MAX_REQUEST_BYTES
+# (vale também para envios sem Content-Length, com Transfer-Encoding: chunked)
+async def _limited_stream(request):
+    received = 0
+    async for chunk in request.stream():
+        received += len(chunk)
+        if received > MAX_REQUEST_BYTES:
+            raise TooLarge(f"Requisição maior que {MAX_REQUEST_BYTES // (1024 * 1024)} MB")
+        yield chunk
+
+
+# Função para montar as configurações de envio a partir de st.secrets (mesmas chaves e padrões do forms.py)
+def load_settings():
+    import streamlit as st
+    secrets = st.secrets
+    sender = secrets["SENDER_EMAIL"]
+    password = secrets["EMAIL_PASSWORD"]
+    pool = SMTPPool(secrets.get("SMTP_HOST", SMTP_HOST), secrets.get("SMTP_PORT", SMTP_PORT), sender, password,
+                    size=secrets.get("SMTP_POOL_SIZE", 2), idle_timeout=secrets.get("SMTP_IDLE_TIMEOUT", 60),
+                    starttls=secrets.get("SMTP_STARTTLS", True))
+    outbox = None
+    if secrets.get("OUTBOX_PATH", "outbox.db"):
+        outbox = Outbox(secrets.get("OUTBOX_PATH", "outbox.db"), attachment_mode=secrets.get("ATTACHMENT_MODE", "separate"),
+                        max_message_bytes=secrets.get("MAX_MESSAGE_BYTES", MAX_MESSAGE_BYTES))
+        Dispatcher(outbox, pool, interval=secrets.get("OUTBOX_INTERVAL", 30), batch_size=secrets.get("OUTBOX_BATCH_SIZE", 20))
+    customer_index = secrets.get("CUSTOMER_INDEX", "customers.db")
+    archive = secrets.get("ARCHIVE_PATH", "archive")
+    metrics.configure(secrets.get("METRICS_ENABLED", False))
+    return {
+        "sender_email": sender,
+        "receiver_email": secrets["RECEIVER_EMAIL"],
+        "password": password,
+        "template_path": TEMPLATE_PATH,
+        "template_cache": secrets.get("TEMPLATE_CACHE", True),
+        "excel_engine": secrets.get("EXCEL_ENGINE", "openpyxl"),
+        "templates": secrets.get("TEMPLATES", ["ficha"]),
+        "render_workers": secrets.get("RENDER_WORKERS", 3),
+        "cells_sold_to": cells_sold_to,
+        "cells_ship_to": cells_ship_to,
+        "image_keys": image_keys,
+        "smtp_max_attempts": secrets.get("SMTP_MAX_ATTEMPTS", 3),
+        "smtp_retry_backoff": secrets.get("SMTP_RETRY_BACKOFF", 2.0),
+        "smtp_pool": pool,
+        "attachment_mode": secrets.get("ATTACHMENT_MODE", "separate"),
+        "max_message_bytes": secrets.get("MAX_MESSAGE_BYTES", MAX_MESSAGE_BYTES),
+        "image_normalize": secrets.get("IMAGE_NORMALIZE", True),
+        "image_max_dimension": secrets.get("IMAGE_MAX_DIMENSION", 2000),
+        "image_max_bytes": secrets.get("IMAGE_MAX_BYTES", 800_000),
+        "image_workers": secrets.get("IMAGE_WORKERS", 4),
+        "metrics_file": secrets.get("METRICS_FILE", None),
+        "outbox": outbox,
+        "customers": CustomerIndex(customer_index) if customer_index else None,
+        "archive": SubmissionArchive(archive, batch_size=secrets.get("ARCHIVE_BATCH_SIZE", 200),
+                                     interval=secrets.get("ARCHIVE_INTERVAL", 60)) if archive else None,
+    }
+
+
+# Função para converter o JSON recebido no dicionário data do formulário (campos ausentes ficam como None)
+# Como em collect_form_data, sem shipping_address os campos de entrega são descartados
+def parse_fields(payload):
+    if not isinstance(payload, dict):
+        raise InvalidRequest("O corpo deve ser um objeto JSON com os campos do formulário")
+    unknown = sorted(key for key in payload if key not in form_fields or key in image_keys)
+    if unknown:
+        raise InvalidRequest(f"Campos desconhecidos (comprovantes vão como arquivos): {', '.join(unknown)}", 422)
+    data = {}
+    for key in form_fields:
+        value = payload.get(key)
+        if key == "shipping_address":
+            data[key] = value if isinstance(value, bool) else str(value or "").strip().lower() in TRUE_VALUES
+        elif value is None or isinstance(value, str):
+            data[key] = value
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            data[key] = str(value)
+        else:
+            raise InvalidRequest(f"Valor inválido para o campo {key}", 422)
+    if not data["shipping_address"]:
+        data.update(dict.fromkeys(shipping_fields))
+    return data
+
+
+async def _read_request(request):
+    size = request.headers.get("content-length")
+    if size is not None and size.isdigit() and int(size) > MAX_REQUEST_BYTES:
+        raise InvalidRequest(f"Requisição maior que {MAX_REQUEST_BYTES // (1024 * 1024)} MB", 413)
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith("application/json"):
+        try:
+            body = b"".join([chunk async for chunk in _limited_stream(request)])
+        except TooLarge as e:
+            raise InvalidRequest(str(e), 413)
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            raise InvalidRequest("JSON inválido")
+        return parse_fields(payload)
+    if not content_type.startswith("multipart/form-data"):
+        raise InvalidRequest("Use multipart/form-data (campos em 'data' e comprovantes como arquivos) ou application/json", 415)
+
+    parser = LimitedMultiPartParser(request.headers, _limited_stream(request), max_files=len(image_keys) + 1, max_fields=1)
+    try:
+        form = await parser.parse()
+    except TooLarge as e:
+        raise InvalidRequest(str(e), 413)
+    except MultiPartException as e:
+        raise InvalidRequest(e.message)
+    try:
+        raw = form.get("data") or "{}"
+        if not isinstance(raw, str):
+            raw = await raw.read()
+        try:
+            data = parse_fields(json.loads(raw))
+        except json.JSONDecodeError:
+            raise InvalidRequest("A parte 'data' deve conter um JSON válido")
+        for key, upload in form.multi_items():
+            if key == "data":
+                continue
+            if key not in image_keys or isinstance(upload, str):
+                raise InvalidRequest(f"Parte desconhecida: {key}", 422)
+            content = await upload.read()
+            data[key] = content or None
+    finally:
+        await form.close()
+    return data
+
+
+# Validação do formulário (campos obrigatórios, formato e cliente repetido); roda em uma thread porque a
+# consulta ao índice de clientes acessa o SQLite
+def _check(data, customers, confirm_duplicate):
+    with metrics.stage("api.validate"):
+        missing_fields = find_missing_fields(data, required_fields)
+        invalid_fields = validate_fields(data)
+    if missing_fields or invalid_fields:
+        metrics.incr("validation_failures_total")
+        return 422, {"error": "Dados inválidos", "missing_fields": missing_fields, "invalid_fields": invalid_fields}
+    if customers is not None and not confirm_duplicate:
+        with metrics.stage("api.duplicates"):
+            duplicates = customers.find(data)
+        if duplicates:
+            metrics.incr("duplicate_warnings_total")
+            return 409, {"error": f"Cliente já cadastrado ({describe_matches(duplicates)}). "
+                                  "Envie com confirm_duplicate=true se for mesmo um novo cadastro."}
+    return None
+
+
+def _job_status(job):
+    return {"job_id": job.job_id, "status": job.status, "attempts": job.attempts, "error": job.error, "delivery": job.result}
+
+
+# Função para criar a aplicação ASGI; settings e a fila podem ser informados (benchmark, testes locais)
+# workers limita quantos cadastros são gerados e enviados ao mesmo tempo; max_pending, quantos esperam na fila
+def create_app(settings=None, workers=None, max_pending=None):
+    if settings is None:
+        import streamlit as st
+        settings = load_settings()
+        workers = workers or st.secrets.get("API_WORKERS", st.secrets.get("SUBMIT_WORKERS", 2))
+        max_pending = max_pending or st.secrets.get("API_QUEUE_SIZE", st.secrets.get("SUBMIT_QUEUE_SIZE", 20))
+    job_queue = JobQueue(process_submission, workers=workers or 2, max_pending=max_pending or 20)
+
+    async def submit(request):
+        try:
+            data = await _read_request(request)
+        except InvalidRequest as e:
+            metrics.incr("api_requests_total", status=str(e.status_code))
+            return JSONResponse({"error": str(e)}, status_code=e.status_code)
+        confirm_duplicate = request.query_params.get("confirm_duplicate", "").lower() in TRUE_VALUES
+        problem = await run_in_threadpool(_check, data, settings.get("customers"), confirm_duplicate)
+        if problem is not None:
+            status_code, body = problem
+            metrics.incr("api_requests_total", status=str(status_code))
+            return JSONResponse(body, status_code=status_code)
+        try:
+            job_id = job_queue.submit(data, settings)
+        except QueueFull:
+            metrics.incr("queue_full_total")
+            metrics.incr("api_requests_total", status="503")
+            return JSONResponse({"error": "Muitos cadastros sendo processados no momento. Tente novamente em instantes."},
+                                status_code=503, headers={"Retry-After": "5"})
+        metrics.incr("api_requests_total", status="202")
+        return JSONResponse({"job_id": job_id, "status": job_queue.get(job_id).status}, status_code=202,
+                            headers={"Location": f"/submissions/{job_id}"})
+
+    async def status(request):
+        job = job_queue.get(request.path_params["job_id"])
+        if job is None:
+            return JSONResponse({"error": "Job não encontrado"}, status_code=404)
+        return JSONResponse(_job_status(job))
+
+    async def health(request):
+        return JSONResponse({"status": "ok", "pending": job_queue.pending()})
+
+    app = Starlette(routes=[
+        Route("/submissions", submit, methods=["POST"]),
+        Route("/submissions/{job_id}", status, methods=["GET"]),
+        Route("/health", health, methods=["GET"]),
+    ])
+    app.state.job_queue = job_queue
+    app.state.settings = settings
+    return app
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="API HTTP para envio de cadastros (mesma validação e envio do formulário).")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=None, help="Cadastros processados ao mesmo tempo (padrão: API_WORKERS)")
+    parser.add_argument("--queue-size", type=int, default=None, help="Cadastros aguardando na fila (padrão: API_QUEUE_SIZE)")
+    args = parser.parse_args(argv)
+
+    import uvicorn
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    uvicorn.run(create_app(workers=args.workers, max_pending=args.queue_size), host=args.host, port=args.port)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,232 @@
+import argparse
+import atexit
+import logging
+import os
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from ficha import TEMPLATES, form_fields, image_keys
+from xlsx_patcher import read_cells
+
+# Arquivo colunar dos cadastros enviados, para relatórios sem abrir as fichas uma a uma.
+# Cada envio concluído vira uma linha com os campos de texto do dicionário data (sem as imagens), gravada
+# em Parquet particionado por mês e UF: <raiz>/month=2026-10/uf=SP/part-....parquet.
+# As linhas são acumuladas em memória e gravadas em lotes por uma thread (SubmissionArchive), fora do envio.
+# tipo_empresa, uso_produtos e area_atuacao_empresa são gravados como categorias (dicionário no Parquet).
+#
+# Uso: python archive.py query --month 2026-09 --uf SP --where area_atuacao_empresa=Academy --group-by uso_produtos
+#      python archive.py backfill fichas/ --workers 8
+
+logger = logging.getLogger(__name__)
+
+FIELDS = [key for key in form_fields if key not in image_keys and key != "uf"]
+CATEGORICAL_FIELDS = ["tipo_empresa", "uso_produtos", "area_atuacao_empresa"]
+PARTITION_COLS = ["month", "uf"]
+SCHEMA = pa.schema(
+    [(key, pa.bool_() if key == "shipping_address" else
+      pa.dictionary(pa.int32(), pa.string()) if key in CATEGORICAL_FIELDS else pa.string()) for key in FIELDS]
+    + [("submitted_at", pa.timestamp("ms")), ("source", pa.string()), ("month", pa.string()), ("uf", pa.string())]
+)
+
+
+# Função para converter um cadastro (dicionário data) em uma linha do arquivo; submitted_at em segundos (time.time()),
+# gravado no horário local, como as datas do índice de clientes
+def archive_row(data, submitted_at=None, source="form"):
+    submitted_at = submitted_at or time.time()
+    row = {}
+    for key in FIELDS:
+        value = data.get(key)
+        if key == "shipping_address":
+            row[key] = bool(value)
+        else:
+            row[key] = (str(value).strip() or None) if value is not None else None
+    row["submitted_at"] = pd.Timestamp(time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(submitted_at)))
+    row["source"] = source
+    row["month"] = row["submitted_at"].strftime("%Y-%m")
+    row["uf"] = (str(data.get("uf") or "").strip().upper()) or "NA"
+    return row
+
+
+# Função para gravar um lote de linhas; cada partição (mês, UF) do lote vira um arquivo novo
+def write_rows(root, rows):
+    if not rows:
+        return 0
+    frame = pd.DataFrame(rows, columns=SCHEMA.names)
+    for key in CATEGORICAL_FIELDS:
+        frame[key] = frame[key].astype("category")
+    table = pa.Table.from_pandas(frame, schema=SCHEMA, preserve_index=False)
+    pq.write_to_dataset(table, root, partition_cols=PARTITION_COLS,
+                        basename_template=f"part-{time.strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:8]}-{{i}}.parquet")
+    return len(rows)
+
+
+# Gravação em lotes: append só guarda a linha; uma thread grava a cada interval segundos ou quando o lote
+# chega a batch_size linhas. O que estiver pendente é gravado ao encerrar o processo (close/atexit).
+class SubmissionArchive:
+    def __init__(self, root="archive", batch_size=200, interval=60):
+        self.root = root
+        self.batch_size = batch_size
+        self.interval = interval
+        self._rows = []
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="archive-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def append(self, data, submitted_at=None, source="form"):
+        row = archive_row(data, submitted_at, source)
+        with self._lock:
+            self._rows.append(row)
+            full = len(self._rows) >= self.batch_size
+        if full:
+            self._wake.set()
+
+    # Grava as linhas pendentes; retorna quantas foram gravadas
+    def flush(self):
+        with self._write_lock:
+            with self._lock:
+                rows, self._rows = self._rows, []
+            try:
+                return write_rows(self.root, rows)
+            except Exception:
+                # Mantém as linhas para a próxima tentativa
+                with self._lock:
+                    self._rows[:0] = rows
+                raise
+
+    def pending(self):
+        with self._lock:
+            return len(self._rows)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Falha ao gravar o arquivo de cadastros")
+
+    def close(self):
+        if not self._stop.is_set():
+            self._stop.set()
+            self._wake.set()
+            self._thread.join()
+        self.flush()
+
+
+# Função para consultar o arquivo com pandas; month e uf aceitam um valor ou uma lista (só as partições
+# correspondentes são lidas) e os demais filtros são igualdades por campo (valor ou lista de valores)
+# Ex.: query("archive", month="2026-09", uf="SP", area_atuacao_empresa="Academy")
+def query(root="archive", month=None, uf=None, columns=None, **equals):
+    filters = []
+    for key, value in [("month", month), ("uf", uf), *equals.items()]:
+        if value is None:
+            continue
+        if key not in SCHEMA.names:
+            raise ValueError(f"Campo desconhecido: {key}")
+        values = [value] if isinstance(value, str) else list(value)
+        filters.append((key, "in", [str(v).upper() if key == "uf" else str(v) for v in values]))
+    if not os.path.isdir(root):
+        return pd.DataFrame(columns=columns or SCHEMA.names)
+    return pd.read_parquet(root, columns=columns, filters=filters or None, schema=SCHEMA)
+
+
+# Função executada nos processos do backfill: extrai os campos de uma FICHA CADASTRAL já gerada com os mapas
+# de células do template; retorna a linha do arquivo ou None se o arquivo não for uma ficha
+def extract_ficha(path, template="ficha"):
+    spec = TEMPLATES[template]
+    sold_to = {key: cell for key, cell in spec["cells_sold_to"].items() if key not in image_keys and isinstance(cell, str)}
+    # A aba de entrega só é preenchida quando há endereço de entrega; nela ficam também os dados de contribuição
+    ship_to = {key: cell for key, cell in spec["cells_ship_to"].items() if key not in image_keys and isinstance(cell, str)}
+    try:
+        values = read_cells(path, {spec["sheet_sold_to"]: list(sold_to.values()), spec["sheet_ship_to"]: list(ship_to.values())})
+    except Exception as e:
+        return {"error": f"{type(e).__name__}: {e}"}
+    sold_values = values[spec["sheet_sold_to"]]
+    ship_values = values[spec["sheet_ship_to"]]
+    data = {key: sold_values[cell] for key, cell in sold_to.items()}
+    if not data.get("nome_empresa"):
+        return None
+    data["shipping_address"] = any(value is not None for value in ship_values.values())
+    for key, cell in ship_to.items():
+        if data.get(key) is None:
+            data[key] = ship_values[cell]
+    return archive_row(data, os.path.getmtime(path), source="backfill")
+
+
+def _iter_xlsx(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            for folder, _, names in os.walk(path):
+                yield from (os.path.join(folder, name) for name in sorted(names)
+                            if name.lower().endswith(".xlsx") and not name.startswith("~$"))
+        else:
+            yield path
+
+
+# Função para importar fichas já geradas (ex.: anexos salvos dos e-mails), em paralelo em um processo por núcleo
+def backfill(paths, root="archive", workers=None, batch_size=5000, template="ficha"):
+    counts = {"archived": 0, "skipped": 0, "errors": 0}
+    rows = []
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1) as executor:
+        files = list(_iter_xlsx(paths))
+        for path, row in zip(files, executor.map(extract_ficha, files, [template] * len(files), chunksize=16)):
+            if row is None:
+                counts["skipped"] += 1
+            elif "error" in row:
+                counts["errors"] += 1
+                logger.warning("Não foi possível ler %s: %s", path, row["error"])
+            else:
+                rows.append(row)
+                if len(rows) >= batch_size:
+                    counts["archived"] += write_rows(root, rows)
+                    rows = []
+    counts["archived"] += write_rows(root, rows)
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Arquivo colunar (Parquet) dos cadastros enviados.")
+    parser.add_argument("--archive", default="archive", help="Diretório do arquivo (padrão: archive)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    load = commands.add_parser("backfill", help="Importa FICHAS CADASTRAIS (.xlsx) já geradas")
+    load.add_argument("paths", nargs="+", help="Arquivos .xlsx ou diretórios")
+    load.add_argument("--workers", type=int, default=None, help="Processos em paralelo (padrão: um por núcleo)")
+    search = commands.add_parser("query", help="Consulta o arquivo e mostra o total (ou a contagem por campo)")
+    search.add_argument("--month", action="append", help="Mês (AAAA-MM); pode ser repetido")
+    search.add_argument("--uf", action="append", help="UF; pode ser repetido")
+    search.add_argument("--where", action="append", default=[], metavar="CAMPO=VALOR", help="Filtro por igualdade; pode ser repetido")
+    search.add_argument("--group-by", default=None, help="Mostra a contagem por este campo")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    if args.command == "backfill":
+        start = time.perf_counter()
+        counts = backfill(args.paths, args.archive, args.workers)
+        print({**counts, "seconds": round(time.perf_counter() - start, 2)})
+        return 0
+
+    equals = {}
+    for condition in args.where:
+        key, sep, value = condition.partition("=")
+        if not sep:
+            parser.error(f"Filtro inválido: {condition} (use CAMPO=VALOR)")
+        equals.setdefault(key.strip(), []).append(value.strip())
+    frame = query(args.archive, month=args.month, uf=args.uf, **equals)
+    print(f"{len(frame)} cadastros")
+    if args.group_by:
+        print(frame.groupby(args.group_by, observed=True).size().sort_values(ascending=False).to_string())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
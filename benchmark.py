@@ -0,0 +1,680 @@
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from synthetic import IMAGE_SIZES, multipart_body, synthetic_cep_csv, synthetic_data, synthetic_image
+
+# Benchmarks do fluxo formulário -> ficha -> e-mail, com dados sintéticos (synthetic.py) e um servidor SMTP local.
+# Cada caso roda em um processo novo, para que o pico de memória (RSS) seja medido só daquele caso.
+#
+# Uso:
+#     python benchmark.py --output resultados.json
+#     python benchmark.py --compare base.json resultados.json
+
+NAMES_ITERATIONS = 10_000
+# Escala aproximada da base nacional de CEPs dos Correios
+CEP_ROWS = 1_100_000
+CEP_LOOKUPS = 100_000
+# Índice de clientes: cada cliente gera duas chaves (CNPJ e razão social), ou seja, 1 milhão de chaves
+CUSTOMER_ROWS = 500_000
+CUSTOMER_LOOKUPS = 20_000
+# Teste de carga da API: cadastros por rodada e clientes enviando ao mesmo tempo
+API_REQUESTS = 24
+API_CLIENTS = 8
+# Teste de capacidade do formulário: sessões (AppTest) preenchendo e enviando ao mesmo tempo
+SESSIONS = (1, 4, 8)
+
+
+def _current_rss_kb():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+    except OSError:
+        return None
+
+
+def _timed(fn, repeat):
+    fn()  # aquecimento (cache do template, imports)
+    samples = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        samples.append(time.perf_counter() - start)
+    return samples, result
+
+
+def _peak_rss_kb():
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux informa em KB, macOS em bytes
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+# Casos de benchmark; cada um devolve (amostras de tempo, bytes de saída, extras)
+def case_names(params, repeat):
+    from ficha import generate_unique_name, sanitize_filename
+    names = [f"Empresa/Teste: {i} <Filial> \"SP\"" for i in range(100)]
+
+    def run():
+        for i in range(NAMES_ITERATIONS):
+            sanitize_filename(names[i % 100])
+            generate_unique_name("FICHA_CADASTRAL", names[i % 100])
+
+    samples, _ = _timed(run, repeat)
+    return samples, 0, {"iterations": NAMES_ITERATIONS}
+
+
+def case_save_to_excel(params, repeat):
+    from ficha import TEMPLATE_PATH, cells_sold_to, cells_ship_to, image_keys, freeze_uploads, save_to_excel
+    from template_cache import load_template
+    data = freeze_uploads(synthetic_data(params["images"], params["shipping"], params["image_size"]), image_keys)
+
+    def run():
+        buffer = io.BytesIO()
+        save_to_excel(buffer, data, cells_sold_to, cells_ship_to, image_keys,
+                      template=load_template(TEMPLATE_PATH), engine=params["engine"])
+        return len(buffer.getvalue())
+
+    samples, size = _timed(run, repeat)
+    return samples, size, {}
+
+
+def case_mime(params, repeat):
+    from mailer import build_message, iter_message, package_files
+    from ficha import TEMPLATE_PATH
+    with open(TEMPLATE_PATH, "rb") as f:
+        workbook = f.read()
+    files = [("FICHA_CADASTRAL.xlsx", workbook)]
+    files += [(f"doc{i}.jpg", synthetic_image(params["image_size"], i)) for i in range(params["attachments"])]
+
+    def run():
+        if params.get("mode"):
+            # Mensagem gerada em blocos, como no envio (mailer.stream_message), sem montá-la inteira
+            size = 0
+            for group in package_files(files, params["mode"]):
+                size += sum(len(chunk) for chunk in iter_message("remetente@example.com", "cadastro@example.com",
+                                                                 "Formulário de Cadastro", "Corpo", group))
+            return size
+        msg = build_message("remetente@example.com", "cadastro@example.com", "Formulário de Cadastro", "Corpo", files)
+        return len(msg.as_bytes())
+
+    samples, size = _timed(run, repeat)
+    return samples, size, {}
+
+
+def case_submission(params, repeat):
+    from ficha import TEMPLATE_PATH, cells_sold_to, cells_ship_to, image_keys, shutdown_render_executors
+    from mailer import SMTPPool
+    from smtp_stub import SMTPStub
+    from submission import process_submission
+
+    with SMTPStub() as stub:
+        pool = SMTPPool(stub.host, stub.port, starttls=False)
+        settings = {
+            "sender_email": "remetente@example.com",
+            "receiver_email": "cadastro@example.com",
+            "password": "",
+            "template_path": TEMPLATE_PATH,
+            "excel_engine": params["engine"],
+            "cells_sold_to": cells_sold_to,
+            "cells_ship_to": cells_ship_to,
+            "image_keys": image_keys,
+            "smtp_pool": pool,
+            "image_normalize": params["normalize"],
+            # Vários templates por envio, gerados ao mesmo tempo (um worker por template)
+            "templates": params.get("templates"),
+            "render_workers": len(params.get("templates") or ()),
+        }
+        data = synthetic_data(params["images"], params["shipping"], params["image_size"])
+
+        def run():
+            before = stub.bytes_received
+            process_submission(None, data, settings)
+            return stub.bytes_received - before
+
+        samples, size = _timed(run, repeat)
+        pool.close()
+    # Os processos de geração dos templates precisam terminar antes deste processo (worker do benchmark)
+    shutdown_render_executors(wait=True)
+    return samples, size, {"smtp_connections": stub.connections}
+
+
+def case_cep(params, repeat):
+    import tempfile
+    from cep_index import CEPIndex
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, "ceps.csv")
+        index_path = os.path.join(tmp, "ceps.idx")
+        ceps = synthetic_cep_csv(csv_path, params["rows"])
+        # A compilação roda em outro processo para não inflar o RSS medido da consulta
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "cep_index.py", "build", csv_path, "--output", index_path, "--sep", ";"],
+                       check=True, capture_output=True)
+        build_seconds = time.perf_counter() - start
+        rng = random.Random(0)
+        hits = [f"{cep:08d}" for cep in rng.sample(list(ceps), CEP_LOOKUPS)]
+        misses = [f"{rng.randrange(100_000_000):08d}" for _ in range(1000)]
+        del ceps
+
+        rss_before = _current_rss_kb()
+        start = time.perf_counter()
+        index = CEPIndex(index_path)
+        load_seconds = time.perf_counter() - start
+
+        def run():
+            for cep in hits:
+                index.lookup(cep)
+
+        samples, _ = _timed(run, repeat)
+        found = sum(index.lookup(cep) is not None for cep in misses)
+        rss_after = _current_rss_kb()
+        index_bytes = os.path.getsize(index_path)
+        index.close()
+    return samples, index_bytes, {
+        "build_seconds": build_seconds,
+        "load_seconds": load_seconds,
+        "lookups": CEP_LOOKUPS,
+        "lookup_us": statistics.median(samples) / CEP_LOOKUPS * 1e6,
+        "misses_found": found,
+        "index_rss_kb": rss_after - rss_before if rss_before is not None else None,
+    }
+
+
+def case_customers(params, repeat):
+    import tempfile
+    from customer_index import CustomerIndex
+
+    rng = random.Random(0)
+    customers = [{"cnpj": f"{rng.randrange(10 ** 13, 10 ** 14)}", "nome_empresa": f"Empresa Sintética {i} Ltda"}
+                 for i in range(params["rows"])]
+    hits = rng.sample(customers, CUSTOMER_LOOKUPS)
+    misses = [{"cnpj": f"{rng.randrange(10 ** 13, 10 ** 14)}", "nome_empresa": f"Cliente Novo {i}"}
+              for i in range(CUSTOMER_LOOKUPS)]
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "customers.db")
+        start = time.perf_counter()
+        index = CustomerIndex(path)
+        index.add_many(customers)
+        index.close()
+        build_seconds = time.perf_counter() - start
+        del customers
+
+        start = time.perf_counter()
+        index = CustomerIndex(path)
+        load_seconds = time.perf_counter() - start
+        keys = len(index)
+
+        def run():
+            for data in hits:
+                index.find(data)
+
+        samples, _ = _timed(run, repeat)
+        start = time.perf_counter()
+        false_positives = sum(bool(index.find(data)) for data in misses)
+        miss_seconds = time.perf_counter() - start
+        index_bytes = os.path.getsize(path)
+        index.close()
+    return samples, index_bytes, {
+        "keys": keys,
+        "build_seconds": build_seconds,
+        "load_seconds": load_seconds,
+        "lookups": CUSTOMER_LOOKUPS,
+        "hit_lookup_us": statistics.median(samples) / CUSTOMER_LOOKUPS * 1e6,
+        "miss_lookup_us": miss_seconds / CUSTOMER_LOOKUPS * 1e6,
+        "misses_found": false_positives,
+    }
+
+
+def case_api(params, repeat):
+    import http.client
+    import socket
+    import threading
+    from concurrent.futures import ThreadPoolExecutor
+    import uvicorn
+    from api import create_app
+    from ficha import image_keys, shutdown_render_executors
+    from mailer import SMTPPool
+    from smtp_stub import SMTPStub
+
+    with SMTPStub() as stub:
+        pool = SMTPPool(stub.host, stub.port, size=params["workers"], starttls=False)
+        settings = {
+            "sender_email": "remetente@example.com",
+            "receiver_email": "cadastro@example.com",
+            "password": "",
+            "excel_engine": params["engine"],
+            "templates": ["ficha"],
+            "image_keys": image_keys,
+            "smtp_pool": pool,
+        }
+        app = create_app(settings, workers=params["workers"], max_pending=params["requests"])
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            port = sock.getsockname()[1]
+        server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+        thread = threading.Thread(target=server.run, daemon=True)
+        thread.start()
+        while not server.started:
+            time.sleep(0.05)
+        body, content_type = multipart_body(synthetic_data(8, True, "medium"), image_keys)
+        accept_latencies = []
+
+        def request(method, path, payload=None, headers=None):
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=300)
+            try:
+                conn.request(method, path, payload, headers or {})
+                response = conn.getresponse()
+                return response.status, json.loads(response.read())
+            finally:
+                conn.close()
+
+        def post(_):
+            start = time.perf_counter()
+            status, result = request("POST", "/submissions", body, {"Content-Type": content_type})
+            accept_latencies.append(time.perf_counter() - start)
+            if status != 202:
+                raise RuntimeError(f"POST /submissions retornou {status}: {result}")
+            return result["job_id"]
+
+        # Uma rodada: API_CLIENTS clientes enviam API_REQUESTS cadastros; termina quando todos foram enviados
+        def run():
+            with ThreadPoolExecutor(params["clients"]) as clients:
+                job_ids = list(clients.map(post, range(params["requests"])))
+            pending = set(job_ids)
+            while pending:
+                time.sleep(0.1)
+                for job_id in list(pending):
+                    _, job = request("GET", f"/submissions/{job_id}")
+                    if job["status"] == "failed":
+                        raise RuntimeError(f"Envio {job_id} falhou: {job['error']}")
+                    if job["status"] == "done":
+                        pending.discard(job_id)
+            return len(job_ids)
+
+        samples, _ = _timed(run, repeat)
+        server.should_exit = True
+        thread.join()
+        pool.close()
+    shutdown_render_executors(wait=True)
+    accept_latencies.sort()
+    return samples, len(body), {
+        "requests": params["requests"],
+        "registrations_per_s": params["requests"] / statistics.median(samples),
+        "accept_p50_ms": accept_latencies[len(accept_latencies) // 2] * 1000,
+        "accept_p95_ms": accept_latencies[int(len(accept_latencies) * 0.95)] * 1000,
+        "smtp_messages": stub.messages,
+    }
+
+
+# Função para preencher o formulário (AppTest) com o dicionário data; os comprovantes são copiados, como se cada
+# sessão tivesse recebido o seu próprio upload do navegador
+def _fill_form(at, data, image_keys):
+    for widget in at.text_input:
+        if data.get(widget.key) is not None:
+            widget.input(data[widget.key])
+    for widget in at.selectbox:
+        widget.set_value(data[widget.key]) if data.get(widget.key) in widget.options else widget.select_index(0)
+    for widget in at.file_uploader:
+        field = next(key for key in image_keys if widget.key == key or widget.key.startswith(f"{key}_"))
+        if data.get(field) is not None:
+            widget.set_value((f"{field}.jpg", bytes(bytearray(data[field].getvalue())), "image/jpeg"))
+
+
+def case_sessions(params, repeat):
+    import gc
+    import itertools
+    import tempfile
+    import threading
+    from concurrent.futures import ThreadPoolExecutor
+    from streamlit.testing.v1 import AppTest
+    from ficha import image_keys, shutdown_render_executors
+    from smtp_stub import SMTPStub
+
+    data = synthetic_data(params["images"], False, params["image_size"])
+    names = itertools.count()
+    latencies = []
+    rss = {"filled": [], "after_submit": []}
+    retained = []
+    with SMTPStub() as stub, tempfile.TemporaryDirectory() as tmp:
+        secrets = {
+            "SENDER_EMAIL": "remetente@example.com",
+            "RECEIVER_EMAIL": "cadastro@example.com",
+            "EMAIL_PASSWORD": "",
+            "SMTP_HOST": stub.host,
+            "SMTP_PORT": stub.port,
+            "SMTP_STARTTLS": False,
+            "SMTP_POOL_SIZE": params["sessions"],
+            "EXCEL_ENGINE": params["engine"],
+            "SUBMIT_WORKERS": params["sessions"],
+            "SUBMIT_QUEUE_SIZE": params["sessions"],
+            "OUTBOX_PATH": os.path.join(tmp, "outbox.db"),
+            "CUSTOMER_INDEX": "",
+            "ARCHIVE_PATH": "",
+            "METRICS_ENABLED": False,
+        }
+
+        def new_session():
+            at = AppTest.from_file("forms.py", default_timeout=300)
+            for key, value in secrets.items():
+                at.secrets[key] = value
+            return at.run()
+
+        # AppTest não suporta execuções simultâneas (secrets e runtime são globais): as execuções do script são
+        # serializadas, enquanto os envios seguem em paralelo na fila de processamento do formulário
+        script_lock = threading.Lock()
+
+        def submit(at):
+            start = time.perf_counter()
+            with script_lock:
+                at.button[0].click().run()
+            while "job_id" in at.session_state:
+                time.sleep(0.1)
+                with script_lock:
+                    at.run()
+            if not at.success:
+                raise RuntimeError(f"Envio não concluído: {[e.value for e in [*at.error, *at.warning, *at.exception]]}")
+            latencies.append(time.perf_counter() - start)
+
+        # Uma rodada: sessions sessões preenchem o formulário (com os comprovantes) e clicam em Enviar ao mesmo
+        # tempo; o RSS é medido com todas as sessões preenchidas e depois que os envios terminam
+        def run():
+            baseline = _current_rss_kb()
+            sessions = [new_session() for _ in range(params["sessions"])]
+            for at in sessions:
+                # Razão social diferente por envio: a caixa de saída descarta envios repetidos
+                _fill_form(at, {**data, "nome_empresa": f"Empresa Sintética {next(names)} Ltda"}, image_keys)
+                at.run()
+            gc.collect()
+            rss["filled"].append((_current_rss_kb() - baseline) / params["sessions"])
+            with ThreadPoolExecutor(params["sessions"]) as executor:
+                list(executor.map(submit, sessions))
+            gc.collect()
+            rss["after_submit"].append((_current_rss_kb() - baseline) / params["sessions"])
+            # Comprovantes que continuam anexados (e na memória do servidor) depois do envio
+            retained.append(sum(widget.value.size for at in sessions for widget in at.file_uploader if widget.value)
+                            / params["sessions"])
+            return params["sessions"]
+
+        samples, _ = _timed(run, repeat)
+    shutdown_render_executors(wait=True)
+    latencies = sorted(latencies[params["sessions"]:])
+    return samples, sum(len(data[key].getvalue()) for key in image_keys if data.get(key) is not None), {
+        "sessions": params["sessions"],
+        "submit_p50_ms": latencies[len(latencies) // 2] * 1000,
+        "submit_p95_ms": latencies[int(len(latencies) * 0.95)] * 1000,
+        # Sem a rodada de aquecimento
+        "rss_per_session_kb": statistics.median(rss["filled"][1:]),
+        "rss_retained_per_session_kb": statistics.median(rss["after_submit"][1:]),
+        "uploads_retained_per_session_kb": statistics.median(retained) / 1024,
+        "smtp_messages": stub.messages,
+    }
+
+
+# Preenchimento do formulário campo a campo (um rerun por interação, como no navegador), contando reruns completos
+# e reruns de fragmento e o tempo de CPU de cada um. Com fragments=False toda interação reexecuta o script inteiro
+# (o comportamento antes das seções virarem fragmentos); com fragments=True a interação reexecuta só a seção do
+# widget. O AppTest sempre faz reruns completos, então o rerun de fragmento é pedido ao script runner diretamente.
+# O caso reruns usa detalhes internos do Streamlit (testados com a versão do requirements.txt): o RerunData que o
+# AppTest monta a cada run, onde o pedido de rerun de fragmento é injetado, e o registro de fragmentos da sessão
+def _unsupported_streamlit():
+    import streamlit
+    return RuntimeError(f"Versão do Streamlit não suportada pelo caso reruns: {streamlit.__version__} "
+                        f"(use a versão fixada no requirements.txt)")
+
+
+def _rerun_data_class():
+    from streamlit.testing.v1 import local_script_runner
+    try:
+        from streamlit.runtime.scriptrunner_utils.script_requests import RerunData
+    except ImportError:
+        raise _unsupported_streamlit() from None
+    if not hasattr(local_script_runner, "RerunData") \
+            or "fragment_id_queue" not in getattr(RerunData, "__dataclass_fields__", {}):
+        raise _unsupported_streamlit()
+    return RerunData
+
+
+def _fragment_ids(at):
+    fragments = getattr(getattr(at, "_fragment_storage", None), "_fragments", None)
+    if fragments is None:
+        raise _unsupported_streamlit()
+    return list(fragments)
+
+
+def case_reruns(params, repeat):
+    from unittest import mock
+    from streamlit.testing.v1 import AppTest
+    from ficha import image_keys, shutdown_render_executors
+
+    RerunData = _rerun_data_class()
+
+    data = synthetic_data(params["images"], False, params["image_size"])
+    secrets = {
+        "SENDER_EMAIL": "remetente@example.com",
+        "RECEIVER_EMAIL": "cadastro@example.com",
+        "EMAIL_PASSWORD": "",
+        "OUTBOX_PATH": "",
+        "CUSTOMER_INDEX": "",
+        "ARCHIVE_PATH": "",
+        "METRICS_ENABLED": False,
+    }
+    fragment_queue = []
+
+    def rerun_data(**kwargs):
+        return RerunData(**kwargs, fragment_id_queue=list(fragment_queue))
+
+    def cpu_run(at, times, fragment_id=None):
+        fragment_queue[:] = [fragment_id] if fragment_id else []
+        start = time.process_time()
+        at.run()
+        times.append(time.process_time() - start)
+        fragment_queue.clear()
+
+    # Uma interação por widget preenchido em data, na ordem das seções; cada seção (expander) é um fragmento
+    def interactions(at):
+        steps = []
+        for section, expander in enumerate(at.expander):
+            for widget in expander.text_input:
+                if data.get(widget.key):
+                    steps.append((section, lambda at, key=widget.key: at.text_input(key=key).input(data[key])))
+            for widget in expander.selectbox:
+                steps.append((section, lambda at, key=widget.key: at.selectbox(key=key).select_index(0)))
+            for widget in expander.get("file_uploader"):
+                field = next(key for key in image_keys if widget.key == key or widget.key.startswith(f"{key}_"))
+                if data.get(field) is not None:
+                    steps.append((section, lambda at, key=widget.key, field=field: at.file_uploader(key=key).set_value(
+                        (f"{field}.jpg", data[field].getvalue(), "image/jpeg"))))
+        return steps
+
+    counts = {}
+
+    def run():
+        full, fragment = [], []
+        at = AppTest.from_file("forms.py", default_timeout=300)
+        for key, value in secrets.items():
+            at.secrets[key] = value
+        cpu_run(at, full)
+        if at.exception:
+            raise RuntimeError(f"Erro ao carregar o formulário: {[e.value for e in at.exception]}")
+        sections = _fragment_ids(at) if params["fragments"] else []
+        for section, action in interactions(at):
+            if sections:
+                # Depois de um rerun de fragmento a árvore do AppTest só tem a seção reexecutada; um rerun completo
+                # (não contado) recupera os outros widgets antes da próxima interação
+                at.run()
+                action(at)
+                cpu_run(at, fragment, sections[section])
+            else:
+                action(at)
+                cpu_run(at, full)
+        at.run()
+        at.button[0].click()
+        cpu_run(at, full)
+        if at.exception or at.error:
+            raise RuntimeError(f"Formulário não aceito: {[e.value for e in [*at.exception, *at.error]]}")
+        counts.update(full=full, fragment=fragment)
+        return sum(full) + sum(fragment)
+
+    with mock.patch("streamlit.testing.v1.local_script_runner.RerunData", rerun_data):
+        samples, _ = _timed(run, repeat)
+    shutdown_render_executors(wait=True)
+    full, fragment = counts["full"], counts["fragment"]
+    return samples, 0, {
+        "full_reruns": len(full),
+        "fragment_reruns": len(fragment),
+        "full_rerun_cpu_ms": statistics.median(full) * 1000,
+        "fragment_rerun_cpu_ms": statistics.median(fragment) * 1000 if fragment else None,
+        "session_cpu_s": sum(full) + sum(fragment),
+    }
+
+
+CASES = {
+    "names": case_names,
+    "save_to_excel": case_save_to_excel,
+    "mime": case_mime,
+    "submission": case_submission,
+    "cep": case_cep,
+    "customers": case_customers,
+    "api": case_api,
+    "sessions": case_sessions,
+    "reruns": case_reruns,
+}
+
+
+def build_plan(engines, quick=False):
+    plan = [("names", {})]
+    for engine in engines:
+        for images in (0, 4, 8):
+            for shipping in (False, True):
+                plan.append(("save_to_excel", {"engine": engine, "images": images, "shipping": shipping, "image_size": "medium"}))
+    plan.append(("mime", {"attachments": 0, "image_size": "small"}))
+    for image_size in IMAGE_SIZES:
+        plan.append(("mime", {"attachments": 3, "image_size": image_size}))
+        for mode in ("separate", "zip"):
+            plan.append(("mime", {"attachments": 3, "image_size": image_size, "mode": mode}))
+    for engine in engines:
+        for image_size in (("medium",) if quick else IMAGE_SIZES):
+            plan.append(("submission", {"engine": engine, "images": 8, "shipping": True,
+                                        "image_size": image_size, "normalize": True}))
+        plan.append(("submission", {"engine": engine, "images": 8, "shipping": True, "image_size": "medium",
+                                    "normalize": True, "templates": ["ficha", "merck", "sigma"]}))
+    plan.append(("cep", {"rows": CEP_ROWS}))
+    plan.append(("customers", {"rows": CUSTOMER_ROWS}))
+    for engine in engines:
+        for workers in (1, 4):
+            plan.append(("api", {"engine": engine, "workers": workers, "requests": API_REQUESTS, "clients": API_CLIENTS}))
+    for sessions in SESSIONS:
+        plan.append(("sessions", {"engine": "xml", "sessions": sessions, "images": 8, "image_size": "medium"}))
+    for fragments in (False, True):
+        plan.append(("reruns", {"fragments": fragments, "images": 8, "image_size": "small"}))
+    return plan
+
+
+# Executado no processo filho
+def _run_case(group, params, repeat):
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    sys.path.insert(0, os.getcwd())
+    import warnings
+    warnings.simplefilter("ignore")
+    samples, output_bytes, extra = CASES[group](params, repeat)
+    return {
+        "group": group,
+        "params": params,
+        "name": group + ("[" + ",".join(f"{k}={v}" for k, v in params.items()) + "]" if params else ""),
+        "wall_s": {
+            "min": min(samples),
+            "median": statistics.median(samples),
+            "mean": statistics.fmean(samples),
+            "samples": samples,
+        },
+        "peak_rss_kb": _peak_rss_kb(),
+        "output_bytes": output_bytes,
+        **extra,
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def run_benchmarks(repeat=3, engines=("openpyxl", "xml"), only=None, quick=False):
+    results = []
+    context = get_context("spawn")
+    for group, params in build_plan(engines, quick):
+        if only and group not in only:
+            continue
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            result = executor.submit(_run_case, group, params, repeat).result()
+        print(f"{result['name']:<90} {result['wall_s']['median'] * 1000:10.1f} ms "
+              f"{result['peak_rss_kb'] / 1024:8.1f} MB {result['output_bytes']:>10} B", file=sys.stderr)
+        results.append(result)
+    return {
+        "meta": {
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "repeat": repeat,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        },
+        "results": results,
+    }
+
+
+# Função para comparar dois arquivos de resultado (mediana de tempo, pico de RSS e bytes de saída)
+def compare(base_path, new_path):
+    with open(base_path, encoding="utf-8") as f:
+        base = {r["name"]: r for r in json.load(f)["results"]}
+    with open(new_path, encoding="utf-8") as f:
+        new = json.load(f)["results"]
+    print(f"{'caso':<90} {'base ms':>10} {'novo ms':>10} {'razão':>7} {'RSS Δ MB':>9} {'bytes Δ':>10}")
+    for result in new:
+        old = base.get(result["name"])
+        if old is None:
+            print(f"{result['name']:<90} {'-':>10} {result['wall_s']['median'] * 1000:10.1f}")
+            continue
+        ratio = result["wall_s"]["median"] / old["wall_s"]["median"] if old["wall_s"]["median"] else float("nan")
+        print(f"{result['name']:<90} {old['wall_s']['median'] * 1000:10.1f} {result['wall_s']['median'] * 1000:10.1f} "
+              f"{ratio:7.2f} {(result['peak_rss_kb'] - old['peak_rss_kb']) / 1024:9.1f} "
+              f"{result['output_bytes'] - old['output_bytes']:10}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks do fluxo de cadastro (ficha, MIME e envio completo).")
+    parser.add_argument("--output", default=None, help="Arquivo JSON de resultados (padrão: saída padrão)")
+    parser.add_argument("--repeat", type=int, default=3, help="Repetições medidas por caso (após 1 aquecimento)")
+    parser.add_argument("--engines", default="openpyxl,xml", help="Engines de Excel a medir, separadas por vírgula")
+    parser.add_argument("--only", default=None, help="Grupos a executar: names,save_to_excel,mime,submission,cep,customers,api,sessions,reruns")
+    parser.add_argument("--quick", action="store_true", help="Envio completo só com imagens médias")
+    parser.add_argument("--compare", nargs=2, metavar=("BASE", "NOVO"), help="Compara dois arquivos de resultado")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        compare(*args.compare)
+        return 0
+    results = run_benchmarks(args.repeat, args.engines.split(","), args.only.split(",") if args.only else None, args.quick)
+    payload = json.dumps(results, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(payload)
+    else:
+        print(payload)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
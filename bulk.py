@@ -0,0 +1,216 @@
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from contextlib import nullcontext
+from itertools import islice
+import pandas as pd
+from openpyxl import load_workbook
+from ficha import (TEMPLATE_PATH, cells_sold_to, cells_ship_to, image_keys, required_fields,
+                   find_missing_fields, generate_unique_name, save_to_excel)
+from images import normalize_image, MAX_DIMENSION, MAX_BYTES
+from template_cache import load_template
+from validation import validate_frame
+from customer_index import CNPJ, CustomerIndex, customer_keys, describe_matches, key_hash
+
+# Cadastro em lote: lê um CSV, XLSX ou JSONL com as mesmas chaves do dicionário data do formulário,
+# valida cada linha (campos obrigatórios e formato, um bloco de linhas por vez), descarta clientes repetidos
+# (no arquivo ou já enviados pelo formulário) e gera uma FICHA CADASTRAL por linha em paralelo (ProcessPoolExecutor).
+# As colunas de imagem contêm caminhos de arquivo, relativos à pasta do arquivo de entrada.
+#
+# Uso: python bulk.py clientes.csv --output fichas.zip --report relatorio.csv
+
+CHUNK_SIZE = 1000
+TRUE_VALUES = {"1", "true", "sim", "s", "yes", "y", "x"}
+REPORT_COLUMNS = ["row", "status", "file", "error", "warning"]
+
+
+# Função para ler as linhas do arquivo de entrada sem carregá-lo inteiro na memória
+def iter_rows(path, chunk_size=CHUNK_SIZE):
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".csv":
+        for chunk in pd.read_csv(path, dtype=str, keep_default_na=False, chunksize=chunk_size):
+            yield from chunk.to_dict("records")
+    elif extension in (".jsonl", ".ndjson"):
+        for chunk in pd.read_json(path, lines=True, dtype=False, chunksize=chunk_size):
+            for record in chunk.to_dict("records"):
+                yield {key: value for key, value in record.items() if not (isinstance(value, float) and pd.isna(value))}
+    elif extension == ".xlsx":
+        wb = load_workbook(path, read_only=True, data_only=True)
+        try:
+            rows = wb.worksheets[0].iter_rows(values_only=True)
+            header = [str(name).strip() if name is not None else None for name in next(rows, [])]
+            for values in rows:
+                if all(value is None for value in values):
+                    continue
+                yield {key: value for key, value in zip(header, values) if key}
+        finally:
+            wb.close()
+    else:
+        raise ValueError(f"Formato de entrada não suportado: {extension} (use .csv, .xlsx ou .jsonl)")
+
+
+# Função para converter uma linha da planilha no mesmo formato do dicionário data do formulário
+def normalize_row(record):
+    data = {}
+    for key, value in record.items():
+        if value is None:
+            continue
+        if key == "shipping_address":
+            data[key] = value if isinstance(value, bool) else str(value).strip().lower() in TRUE_VALUES
+        elif isinstance(value, float) and value.is_integer():
+            data[key] = str(int(value))
+        else:
+            data[key] = str(value).strip()
+    for key in image_keys:
+        if not data.get(key):
+            data[key] = None
+    return data
+
+
+# Função para procurar cadastros repetidos: no próprio arquivo (seen: hash da chave -> linha) e no histórico
+# de envios (customers); retorna a descrição dos repetidos ou "" e registra a linha em seen
+def find_duplicates(data, row_number, seen, customers):
+    found = []
+    for kind, key in customer_keys(data):
+        first = seen.setdefault(key_hash(key), row_number)
+        if first != row_number:
+            found.append(f"{'Mesmo CNPJ/CPF' if kind == CNPJ else 'Mesma Razão Social'} da linha {first}")
+    if customers is not None:
+        matches = customers.find(data)
+        if matches:
+            found.append(describe_matches(matches))
+    return "; ".join(found)
+
+
+# Função executada nos processos: lê as imagens, gera a ficha e grava no diretório ou devolve os bytes
+def render_row(row_number, data, options):
+    try:
+        base_dir = options["base_dir"]
+        for key in image_keys:
+            if data.get(key):
+                with open(os.path.join(base_dir, data[key]), "rb") as f:
+                    blob = f.read()
+                if options["normalize"]:
+                    blob = normalize_image(blob, options["max_dimension"], options["max_bytes"])[0]
+                data[key] = blob
+
+        filename = f"{row_number:06d}_{generate_unique_name('FICHA_CADASTRAL', data['nome_empresa'])}"
+        template = load_template(options["template_path"])
+        if options["output_dir"] is not None:
+            save_to_excel(os.path.join(options["output_dir"], filename), data, cells_sold_to, cells_ship_to, image_keys,
+                          template=template, engine=options["engine"])
+            return {"row": row_number, "status": "ok", "file": filename, "error": ""}
+        buffer = io.BytesIO()
+        save_to_excel(buffer, data, cells_sold_to, cells_ship_to, image_keys, template=template, engine=options["engine"])
+        return {"row": row_number, "status": "ok", "file": filename, "error": "", "content": buffer.getvalue()}
+    except Exception as e:
+        return {"row": row_number, "status": "error", "file": "", "error": f"{type(e).__name__}: {e}"}
+
+
+# Função principal do modo em lote; retorna (linhas geradas, linhas com erro)
+def run_bulk(input_path, output, report_path, workers=None, engine="xml", template_path=TEMPLATE_PATH,
+             normalize=True, max_dimension=MAX_DIMENSION, max_bytes=MAX_BYTES, chunk_size=CHUNK_SIZE,
+             customer_index="customers.db", allow_duplicates=False):
+    workers = workers or os.cpu_count() or 1
+    to_zip = output.lower().endswith(".zip")
+    if not to_zip:
+        os.makedirs(output, exist_ok=True)
+    options = {
+        "base_dir": os.path.dirname(os.path.abspath(input_path)),
+        "output_dir": None if to_zip else output,
+        "template_path": os.path.abspath(template_path),
+        "engine": engine,
+        "normalize": normalize,
+        "max_dimension": max_dimension,
+        "max_bytes": max_bytes,
+    }
+    # Limita as linhas em processamento para manter a memória constante em arquivos grandes
+    max_in_flight = workers * 4
+    counts = {"ok": 0, "error": 0, "duplicate": 0}
+    # Histórico de clientes já enviados pelo formulário (só consultado, se existir)
+    customers = CustomerIndex(customer_index) if customer_index and os.path.exists(customer_index) else None
+    seen = {}
+    warnings = {}
+
+    with open(report_path, "w", newline="", encoding="utf-8") as report_file, \
+            (zipfile.ZipFile(output, "w", zipfile.ZIP_STORED) if to_zip else nullcontext()) as archive, \
+            ProcessPoolExecutor(max_workers=workers) as executor:
+        report = csv.DictWriter(report_file, fieldnames=REPORT_COLUMNS, extrasaction="ignore")
+        report.writeheader()
+
+        def record(result):
+            counts[result["status"]] += 1
+            result["warning"] = warnings.pop(result["row"], "")
+            if archive is not None and result["status"] == "ok":
+                # xlsx já é compactado: armazenado sem recompressão
+                archive.writestr(result["file"], result.pop("content"))
+            report.writerow(result)
+
+        pending = set()
+        rows = iter_rows(input_path, chunk_size)
+        row_number = 0
+        while chunk := [normalize_row(record_data) for record_data in islice(rows, chunk_size)]:
+            # Formato dos campos validado de uma vez para o bloco inteiro
+            invalid = validate_frame(pd.DataFrame.from_records(chunk)).tolist()
+            for data, format_errors in zip(chunk, invalid):
+                row_number += 1
+                errors = []
+                missing = find_missing_fields(data, required_fields)
+                if missing:
+                    errors.append(f"Campos obrigatórios não preenchidos: {', '.join(missing)}")
+                if format_errors:
+                    errors.append(f"Campos inválidos: {format_errors}")
+                if errors:
+                    record({"row": row_number, "status": "error", "file": "", "error": "; ".join(errors)})
+                    continue
+                # Cadastros repetidos não geram ficha, a menos que allow_duplicates seja usado (fica só o aviso)
+                duplicates = find_duplicates(data, row_number, seen, customers)
+                if duplicates and not allow_duplicates:
+                    record({"row": row_number, "status": "duplicate", "file": "", "error": duplicates})
+                    continue
+                if duplicates:
+                    warnings[row_number] = duplicates
+                pending.add(executor.submit(render_row, row_number, data, options))
+                if len(pending) >= max_in_flight:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        record(future.result())
+        for future in pending:
+            record(future.result())
+
+    if customers is not None:
+        customers.close()
+    return counts["ok"], counts["error"] + counts["duplicate"]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Gera fichas cadastrais em lote a partir de um CSV, XLSX ou JSONL.")
+    parser.add_argument("input", help="Arquivo de entrada (.csv, .xlsx ou .jsonl)")
+    parser.add_argument("--output", required=True, help="Diretório de saída ou arquivo .zip")
+    parser.add_argument("--report", default=None, help="Relatório por linha (CSV). Padrão: <saída>_relatorio.csv")
+    parser.add_argument("--workers", type=int, default=None, help="Número de processos (padrão: núcleos da máquina)")
+    parser.add_argument("--engine", choices=["openpyxl", "xml"], default="xml", help="Engine de preenchimento do Excel")
+    parser.add_argument("--template", default=TEMPLATE_PATH, help="Template da ficha cadastral")
+    parser.add_argument("--no-normalize", action="store_true", help="Não normaliza as imagens")
+    parser.add_argument("--max-dimension", type=int, default=MAX_DIMENSION)
+    parser.add_argument("--max-bytes", type=int, default=MAX_BYTES)
+    parser.add_argument("--customers", default="customers.db", help="Índice de clientes já cadastrados (\"\" para não consultar)")
+    parser.add_argument("--allow-duplicates", action="store_true", help="Gera a ficha mesmo para clientes repetidos (só registra o aviso)")
+    args = parser.parse_args(argv)
+
+    report_path = args.report or f"{os.path.splitext(args.output.rstrip(os.sep))[0]}_relatorio.csv"
+    ok, errors = run_bulk(args.input, args.output, report_path, workers=args.workers, engine=args.engine,
+                          template_path=args.template, normalize=not args.no_normalize,
+                          max_dimension=args.max_dimension, max_bytes=args.max_bytes,
+                          customer_index=args.customers, allow_duplicates=args.allow_duplicates)
+    print(json.dumps({"ok": ok, "errors": errors, "report": report_path}))
+    return 0 if errors == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
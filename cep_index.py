@@ -0,0 +1,179 @@
+import argparse
+import bisect
+import json
+import mmap
+import os
+import re
+import struct
+import sys
+import time
+
+# Índice offline de CEPs para preencher o endereço automaticamente.
+# "build" compila um CSV no formato dos Correios (cep, logradouro, bairro, cidade, uf) em um arquivo binário
+# ordenado por CEP; o app abre esse arquivo com mmap e faz busca binária, sem rede e sem carregar o índice
+# inteiro na memória (só as páginas consultadas ficam residentes).
+#
+# Layout do arquivo (inteiros uint32 little-endian):
+#   cabeçalho (32 bytes): MAGIC, quantidade de CEPs (n), quantidade de textos (m), tamanho dos textos
+#   ceps[n] | logradouro[n] | bairro[n] | cidade[n] | uf[n] | offsets[m + 1] | textos (UTF-8)
+# As colunas de endereço guardam o índice de cada texto, que é armazenado uma única vez.
+#
+# Uso: python cep_index.py build ceps.csv --output ceps.idx
+#      python cep_index.py lookup ceps.idx 06455-030
+
+MAGIC = b"CEPIDX01"
+HEADER = struct.Struct("<8sIII12x")
+# Nomes aceitos para cada coluna do CSV (o DNE dos Correios e bases derivadas usam nomes diferentes)
+COLUMNS = {
+    "cep": ("cep",),
+    "endereco": ("logradouro", "endereco", "endereço", "rua"),
+    "endereco_bairro": ("bairro", "endereco_bairro"),
+    "cidade": ("cidade", "localidade", "municipio", "município"),
+    "uf": ("uf", "estado"),
+}
+FIELDS = ["endereco", "endereco_bairro", "cidade", "uf"]
+
+
+# Função para converter um CEP digitado ("06455-030", "06455030") em inteiro; None se não tiver 8 dígitos
+def normalize_cep(value):
+    if value is None:
+        return None
+    digits = re.sub(r"\D", "", str(value))
+    return int(digits) if len(digits) == 8 else None
+
+
+# Função para compilar o CSV no índice binário
+def build_index(csv_path, output, sep=None, encoding="utf-8", chunk_size=500_000):
+    import numpy as np
+    import pandas as pd
+
+    reader = pd.read_csv(csv_path, sep=sep, engine="python" if sep is None else "c", dtype=str,
+                         keep_default_na=False, encoding=encoding, chunksize=chunk_size)
+    strings = {"": 0}
+    ceps, columns = [], {field: [] for field in FIELDS}
+    for chunk in reader:
+        chunk.columns = [str(name).strip().lower() for name in chunk.columns]
+        rename = {}
+        for field, names in COLUMNS.items():
+            found = next((name for name in names if name in chunk.columns), None)
+            if found is None:
+                raise ValueError(f"Coluna obrigatória ausente no CSV: {names[0]}")
+            rename[found] = field
+        chunk = chunk[list(rename)].rename(columns=rename)
+        cep = pd.to_numeric(chunk["cep"].str.replace(r"\D", "", regex=True), errors="coerce")
+        valid = cep.notna() & (cep < 100_000_000)
+        chunk = chunk[valid]
+        ceps.append(cep[valid].to_numpy(dtype=np.uint32))
+        for field in FIELDS:
+            values = chunk[field].str.strip()
+            if field == "uf":
+                values = values.str.upper()
+            codes, uniques = pd.factorize(values)
+            ids = np.fromiter((strings.setdefault(text, len(strings)) for text in uniques), dtype=np.uint32, count=len(uniques))
+            columns[field].append(ids[codes])
+
+    keys = np.concatenate(ceps) if ceps else np.empty(0, dtype=np.uint32)
+    order = np.argsort(keys, kind="stable")
+    keys = keys[order]
+    # CEP repetido: mantém a primeira ocorrência
+    unique = np.ones(len(keys), dtype=bool)
+    unique[1:] = keys[1:] != keys[:-1]
+    order = order[unique]
+    keys = keys[unique]
+
+    blob = bytearray()
+    offsets = np.empty(len(strings) + 1, dtype=np.uint32)
+    for i, text in enumerate(strings):
+        offsets[i] = len(blob)
+        blob += text.encode("utf-8")
+    offsets[-1] = len(blob)
+
+    tmp = f"{output}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(HEADER.pack(MAGIC, len(keys), len(strings), len(blob)))
+        f.write(keys.astype("<u4").tobytes())
+        for field in FIELDS:
+            column = np.concatenate(columns[field]) if columns[field] else np.empty(0, dtype=np.uint32)
+            f.write(column[order].astype("<u4").tobytes())
+        f.write(offsets.astype("<u4").tobytes())
+        f.write(blob)
+    os.replace(tmp, output)
+    return len(keys)
+
+
+class CEPIndex:
+    def __init__(self, path):
+        if sys.byteorder != "little":
+            raise RuntimeError("O índice de CEPs exige uma plataforma little-endian")
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, n, m, blob_size = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            self._mmap.close()
+            raise ValueError(f"Arquivo de índice de CEPs inválido: {path}")
+        self.size = n
+        view = memoryview(self._mmap)
+        position = HEADER.size
+        self._columns = []
+        for _ in range(1 + len(FIELDS)):
+            self._columns.append(view[position:position + 4 * n].cast("I"))
+            position += 4 * n
+        self._keys = self._columns.pop(0)
+        self._offsets = view[position:position + 4 * (m + 1)].cast("I")
+        position += 4 * (m + 1)
+        self._blob = view[position:position + blob_size]
+        self._views = [view, self._keys, self._offsets, self._blob, *self._columns]
+
+    def _text(self, string_id):
+        return str(self._blob[self._offsets[string_id]:self._offsets[string_id + 1]], "utf-8")
+
+    # Busca binária pelo CEP; retorna {"endereco", "endereco_bairro", "cidade", "uf"} ou None
+    def lookup(self, cep):
+        key = normalize_cep(cep)
+        if key is None:
+            return None
+        i = bisect.bisect_left(self._keys, key)
+        if i == self.size or self._keys[i] != key:
+            return None
+        return {field: self._text(column[i]) for field, column in zip(FIELDS, self._columns)}
+
+    def __len__(self):
+        return self.size
+
+    def close(self):
+        for view in reversed(self._views):
+            view.release()
+        self._mmap.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Índice offline de CEPs (compilação e consulta).")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="Compila um CSV de CEPs no índice binário")
+    build.add_argument("csv", help="CSV com as colunas cep, logradouro, bairro, cidade e uf")
+    build.add_argument("--output", default="ceps.idx", help="Arquivo de índice gerado (padrão: ceps.idx)")
+    build.add_argument("--sep", default=None, help="Separador do CSV (padrão: detectado automaticamente)")
+    build.add_argument("--encoding", default="utf-8", help="Codificação do CSV (ex.: latin-1 para arquivos dos Correios)")
+    lookup = commands.add_parser("lookup", help="Consulta um CEP no índice")
+    lookup.add_argument("index")
+    lookup.add_argument("cep")
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        start = time.perf_counter()
+        count = build_index(args.csv, args.output, sep=args.sep, encoding=args.encoding)
+        print(json.dumps({"ceps": count, "bytes": os.path.getsize(args.output),
+                          "seconds": round(time.perf_counter() - start, 2)}))
+        return 0
+    index = CEPIndex(args.index)
+    try:
+        result = index.lookup(args.cep)
+    finally:
+        index.close()
+    print(json.dumps(result, ensure_ascii=False))
+    return 0 if result else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,254 @@
+import argparse
+import hashlib
+import json
+import math
+import re
+import sqlite3
+import sys
+import threading
+import time
+import unicodedata
+import numpy as np
+
+# Índice de clientes já cadastrados, para avisar antes de gerar uma segunda ficha para o mesmo cliente.
+# Cada envio concluído registra duas chaves: o CNPJ/CPF normalizado (só dígitos) e um hash da razão social
+# normalizada (sem acentos, caixa, pontuação e espaços repetidos).
+# As chaves ficam em um banco SQLite (armazenamento exato, persistente); na frente dele há um filtro de Bloom
+# em memória, montado ao abrir o índice, que responde "não cadastrado" sem consultar o banco.
+# O formulário e a API (processos diferentes) usam o mesmo banco: quando outro processo grava no banco
+# (PRAGMA data_version muda), as consultas vão direto ao SQLite até o filtro ser refeito, no máximo a cada
+# refresh_interval segundos.
+#
+# Uso: python customer_index.py import clientes.csv
+#      python customer_index.py lookup 33.069.212/0038-76
+
+CNPJ = "cnpj"
+NAME = "nome_empresa"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS customers (
+    key TEXT PRIMARY KEY,
+    hash INTEGER NOT NULL,
+    cnpj TEXT,
+    created_at REAL NOT NULL
+) WITHOUT ROWID;
+"""
+
+
+# Função para normalizar o CNPJ/CPF: só os dígitos; None se não tiver 11 ou 14 dígitos
+def normalize_cnpj(value):
+    if value is None:
+        return None
+    digits = re.sub(r"\D", "", str(value))
+    return digits if len(digits) in (11, 14) else None
+
+
+# Função para normalizar a razão social: "Merck S/A" e "MERCK  S.A." resultam no mesmo texto
+def normalize_name(value):
+    if value is None:
+        return None
+    text = str(value)
+    if not text.isascii():
+        text = "".join(c for c in unicodedata.normalize("NFKD", text) if not unicodedata.combining(c))
+    text = text.casefold()
+    text = " ".join(re.sub(r"[^\w\s]", "", text).split())
+    return text or None
+
+
+# Função para obter as chaves de um cadastro: [(tipo, chave)], com tipo CNPJ ou NAME
+def customer_keys(data):
+    keys = []
+    cnpj = normalize_cnpj(data.get("cnpj"))
+    if cnpj is not None:
+        keys.append((CNPJ, f"cnpj:{cnpj}"))
+    name = normalize_name(data.get("nome_empresa"))
+    if name is not None:
+        keys.append((NAME, "nome:" + hashlib.sha256(name.encode("utf-8")).hexdigest()))
+    return keys
+
+
+# Hash de 64 bits (com sinal, para caber em INTEGER do SQLite) usado pelo filtro de Bloom
+def key_hash(key):
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "little", signed=True)
+
+
+# Filtro de Bloom com k posições por chave obtidas por hash duplo (h1 + i * h2) a partir do hash de 64 bits
+class BloomFilter:
+    def __init__(self, capacity, error_rate=0.01):
+        capacity = max(int(capacity), 1)
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, h):
+        h &= 0xFFFFFFFFFFFFFFFF
+        h1, h2 = h & 0xFFFFFFFF, (h >> 32) | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, h):
+        for position in self._positions(h):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, h):
+        bits = self.bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(h))
+
+    # Adiciona vários hashes de uma vez (usado ao montar o filtro a partir do banco)
+    def add_many(self, hashes, chunk_size=1_000_000):
+        view = np.frombuffer(self.bits, dtype=np.uint8)
+        hashes = np.asarray(hashes, dtype=np.int64).view(np.uint64)
+        for start in range(0, len(hashes), chunk_size):
+            chunk = hashes[start:start + chunk_size]
+            h1 = chunk & np.uint64(0xFFFFFFFF)
+            h2 = (chunk >> np.uint64(32)) | np.uint64(1)
+            for i in range(self.hashes):
+                positions = (h1 + np.uint64(i) * h2) % np.uint64(self.size)
+                np.bitwise_or.at(view, (positions >> np.uint64(3)).astype(np.intp),
+                                 (np.uint8(1) << (positions & np.uint64(7)).astype(np.uint8)))
+
+
+class CustomerIndex:
+    def __init__(self, path="customers.db", capacity=100_000, error_rate=0.01, refresh_interval=60):
+        self.path = path
+        self.error_rate = error_rate
+        self.refresh_interval = refresh_interval
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        self._count = self._conn.execute("SELECT COUNT(*) FROM customers").fetchone()[0]
+        self._build_bloom(max(capacity, 2 * self._count))
+
+    # Monta o filtro a partir das chaves gravadas; chamado com o lock adquirido (ou na inicialização)
+    def _build_bloom(self, capacity):
+        self._built_at = time.monotonic()
+        bloom = BloomFilter(capacity, self.error_rate)
+        cursor = self._conn.execute("SELECT hash FROM customers")
+        while rows := cursor.fetchmany(500_000):
+            bloom.add_many([row[0] for row in rows])
+        self._bloom = bloom
+
+    # Verifica se outro processo gravou no banco depois que o filtro foi montado; refaz o filtro se já passou
+    # refresh_interval segundos desde a última vez. Retorna True se o filtro não tem todas as chaves do banco
+    # (as consultas devem ir ao SQLite). Chamado com o lock adquirido
+    def _bloom_stale(self):
+        version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        if version == self._data_version:
+            return False
+        if time.monotonic() - self._built_at < self.refresh_interval:
+            return True
+        self._data_version = version
+        self._count = self._conn.execute("SELECT COUNT(*) FROM customers").fetchone()[0]
+        self._build_bloom(max(self._bloom.capacity, 2 * self._count))
+        return False
+
+    # Procura o cadastro pelas chaves; retorna [{"match": tipo, "cnpj": ..., "created_at": ...}] com os
+    # cadastros anteriores encontrados (vazio se o cliente é novo)
+    def find(self, data):
+        matches = []
+        with self._lock:
+            stale = self._bloom_stale()
+        for kind, key in customer_keys(data):
+            if not stale and key_hash(key) not in self._bloom:
+                continue
+            with self._lock:
+                row = self._conn.execute("SELECT cnpj, created_at FROM customers WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                matches.append({"match": kind, "cnpj": row[0], "created_at": row[1]})
+        return matches
+
+    # Registra um cadastro enviado; retorna quantas chaves eram novas
+    def add(self, data, created_at=None):
+        return self.add_many([data], created_at)
+
+    def add_many(self, records, created_at=None):
+        created_at = created_at or time.time()
+        rows = []
+        for data in records:
+            cnpj = normalize_cnpj(data.get("cnpj"))
+            rows.extend((key, key_hash(key), cnpj, created_at) for _, key in customer_keys(data))
+        # Inserir em ordem de chave evita escritas espalhadas pela árvore do SQLite em importações grandes
+        rows.sort()
+        with self._lock:
+            before = self._conn.total_changes
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany("INSERT OR IGNORE INTO customers (key, hash, cnpj, created_at) VALUES (?, ?, ?, ?)", rows)
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+            added = self._conn.total_changes - before
+            self._count += added
+            if self._count > self._bloom.capacity:
+                # Acima da capacidade a taxa de falsos positivos sobe: o filtro é refeito com o dobro do tamanho
+                self._build_bloom(2 * self._count)
+            else:
+                self._bloom.add_many([row[1] for row in rows])
+        return added
+
+    def __len__(self):
+        return self._count
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+# Função para descrever os cadastros encontrados em uma frase, usada no formulário e no relatório do lote
+def describe_matches(matches):
+    cnpjs = {match["cnpj"] for match in matches if match["match"] == CNPJ}
+    names = {match["cnpj"] for match in matches if match["match"] == NAME}
+    parts = []
+    for match in matches:
+        when = time.strftime("%d/%m/%Y", time.localtime(match["created_at"]))
+        if match["match"] == CNPJ:
+            if match["cnpj"] in names:
+                parts.append(f"CNPJ/CPF e Razão Social já cadastrados em {when}")
+            else:
+                parts.append(f"CNPJ/CPF já cadastrado em {when}")
+        elif match["cnpj"] not in cnpjs:
+            parts.append(f"Razão Social já cadastrada em {when} (CNPJ/CPF {match['cnpj'] or 'não informado'})")
+    return "; ".join(parts)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Índice de clientes já cadastrados (detecção de duplicados).")
+    parser.add_argument("--index", default="customers.db", help="Banco do índice (padrão: customers.db)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    load = commands.add_parser("import", help="Registra os clientes de um CSV, XLSX ou JSONL (mesmas colunas do bulk.py)")
+    load.add_argument("input")
+    lookup = commands.add_parser("lookup", help="Consulta um CNPJ/CPF e, opcionalmente, uma razão social")
+    lookup.add_argument("cnpj")
+    lookup.add_argument("nome_empresa", nargs="?")
+    args = parser.parse_args(argv)
+
+    index = CustomerIndex(args.index)
+    try:
+        if args.command == "import":
+            from bulk import iter_rows
+            start = time.perf_counter()
+            added = 0
+            batch = []
+            for record in iter_rows(args.input):
+                batch.append(record)
+                if len(batch) == 10_000:
+                    added += index.add_many(batch)
+                    batch = []
+            added += index.add_many(batch)
+            print(json.dumps({"added_keys": added, "total_keys": len(index),
+                              "seconds": round(time.perf_counter() - start, 2)}))
+            return 0
+        matches = index.find({"cnpj": args.cnpj, "nome_empresa": args.nome_empresa})
+        print(json.dumps(matches))
+        return 0 if matches else 1
+    finally:
+        index.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,353 @@
+import io
+import re
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import get_context
+from openpyxl import load_workbook
+from openpyxl.drawing.image import Image as OpenpyxlImage
+import metrics
+from xlsx_patcher import patch_workbook
+from template_cache import load_template
+
+# Caminho relativo do template Excel
+TEMPLATE_PATH = "templates/FICHA CADASTRAL.xlsx"
+
+# Dicionários com as células correspondentes para cada aba
+cells_ship_to = {
+    "nome_empresa": "C11",
+    "cnpj": "H11",
+    "inscricao_estadual": "I11",
+    "n_suframa": "J11",
+    "cod_df": "K11",
+    "telefone_fixo": "D15",
+    "celular": "E15",
+    "email": "F15",
+    "endereco": "C13",
+    "endereco_n": "G13",
+    "endereco_bairro": "H13",
+    "cep": "I13",
+    "cidade": "J13",
+    "uf": "L13",
+    "caixa_postal": "C15",
+    "sigla_universidade": "C19",
+    "sigla_instituto": "E19",
+    "departamento": "F19",
+    "laboratorio": "H19",
+    "bloco_predio": "J19",
+    "andar": "K19",
+    "sala": "L19",
+    "nome_contato": "C22",
+    "cargo": "F22",
+    "email_contato": "G22",
+    "telefone_contato": "J22",
+    "tipo_empresa": "C27",
+    "uso_produtos": "D27",
+    "area_atuacao_empresa": "F27",
+    "tipo_contribuicao": "H27",
+    # "icms": "C31",
+    # "ipi": "D31",
+    # "pis": "E31",
+    # "cofins": "F31",
+    # "observacao_incentivo_geral": "G29",
+    # "associated_names": ["C35", "C36", "C37", "C38"],
+    # "associated_tax_ids": ["I35", "I36", "I37", "I38"],
+}
+
+cells_sold_to = {
+    "nome_empresa": "C11",
+    "cnpj": "H11",
+    "inscricao_estadual": "I11",
+    "n_suframa": "J11",
+    "cod_df": "K11",
+    "telefone_fixo": "D15",
+    "celular": "E15",
+    "email": "F15",
+    "endereco": "C13",
+    "endereco_n": "G13",
+    "endereco_bairro": "H13",
+    "cep": "I13",
+    "cidade": "J13",
+    "uf": "L13",
+    "caixa_postal": "C15",
+    "sigla_universidade": "C19",
+    "sigla_instituto": "E19",
+    "departamento": "F19",
+    "laboratorio": "H19",
+    "bloco_predio": "J19",
+    "andar": "K19",
+    "sala": "L19",
+    "nome_contato": "C22",
+    "cargo": "F22",
+    "email_contato": "G22",
+    "telefone_contato": "J22",
+    "comprovante_endereco": "C165",
+    "cartao_receita_federal": "C175",
+    "exclusivo_pessoa_fisica": "C185",
+    "cartao_sintegra": "C195",
+    "cartao_suframa": "C205",
+    "contrato_social": "C215",
+    "cartao_cnpj": "C225",
+    "balanco_patrimonial_ou_dre": "C235"
+}
+
+# Lista de chaves que correspondem a imagens
+image_keys = [
+    "comprovante_endereco",
+    "cartao_receita_federal",
+    "exclusivo_pessoa_fisica",
+    "cartao_sintegra",
+    "cartao_suframa",
+    "shipping_comprovante_endereco",
+    "contrato_social",
+    "cartao_cnpj",
+    "balanco_patrimonial_ou_dre"
+]
+
+# Templates Merck.xlsx e Sigma.xlsx: mesmo layout nas abas Sold-to e Ship-to; na Sold-to a contribuição fica
+# logo abaixo do contato e os comprovantes começam mais abaixo (seção COMPROVANTES)
+cells_merck_sold_to = {
+    **{key: cell for key, cell in cells_sold_to.items() if key not in image_keys},
+    "tipo_empresa": "C27",
+    "uso_produtos": "D27",
+    "area_atuacao_empresa": "F27",
+    "tipo_contribuicao": "H27",
+    "comprovante_endereco": "C55",
+    "cartao_receita_federal": "C76",
+    "cartao_sintegra": "C111",
+    "cartao_suframa": "C147",
+    "exclusivo_pessoa_fisica": "C187",
+    "contrato_social": "C222",
+    "cartao_cnpj": "C232",
+    "balanco_patrimonial_ou_dre": "C242"
+}
+
+cells_merck_ship_to = dict(cells_ship_to)
+
+# Registro de templates: cada template declara o arquivo, o prefixo do nome do arquivo gerado,
+# as abas de faturamento (sold-to) e de entrega (ship-to) e o mapa de células de cada aba
+TEMPLATES = {}
+
+# Função para registrar (ou substituir) um template
+def register_template(name, path, sheet_sold_to, sheet_ship_to, cells_sold_to, cells_ship_to, prefix="FICHA_CADASTRAL", label=None):
+    TEMPLATES[name] = {
+        "name": name,
+        "label": label or name,
+        "path": path,
+        "prefix": prefix,
+        "sheet_sold_to": sheet_sold_to,
+        "sheet_ship_to": sheet_ship_to,
+        "cells_sold_to": cells_sold_to,
+        "cells_ship_to": cells_ship_to,
+    }
+    return TEMPLATES[name]
+
+register_template("ficha", TEMPLATE_PATH, "Dados de faturamento", "Dados de entrega", cells_sold_to, cells_ship_to,
+                  prefix="FICHA_CADASTRAL", label="Ficha Cadastral")
+register_template("merck", "templates/Merck.xlsx", "FICHA CADASTRAL (Sold-to)", "FICHA CADASTRAL (Ship-to)",
+                  cells_merck_sold_to, cells_merck_ship_to, prefix="FICHA_MERCK", label="Merck")
+register_template("sigma", "templates/Sigma.xlsx", "FICHA CADASTRAL (Sold-to)", "FICHA CADASTRAL (Ship-to)",
+                  cells_merck_sold_to, cells_merck_ship_to, prefix="FICHA_SIGMA", label="Sigma")
+
+# Lista de campos obrigatórios
+required_fields = {
+    "nome_empresa": "Razão Social",
+    "cnpj": "CNPJ/CPF",
+    "telefone_fixo": "Telefone Fixo",
+    "email": "Email para envio do XML",
+    "endereco": "Endereço",
+    "endereco_n": "Número",
+    "endereco_bairro": "Bairro",
+    "cep": "CEP",
+    "cidade": "Cidade",
+    "uf": "Estado",
+    "tipo_empresa": "Tipo de Empresa",
+    "uso_produtos": "Uso dos Produtos",
+    "area_atuacao_empresa": "Área de Atuação da Empresa",
+    # "icms": "ICMS",
+    # "ipi": "IPI",
+    # "pis": "PIS",
+    # "cofins": "COFINS",
+    "comprovante_endereco": "Comprovante de Endereço",
+    "cartao_receita_federal": "Cartão da Receita Federal",
+    "contrato_social": "Contrato Social",
+    "cartao_cnpj": "Cartão CNPJ",
+    "balanco_patrimonial_ou_dre": "Balanço Patrimonial e/ou DRE"
+}
+
+# Campos de complemento e de endereço de entrega, preenchidos só quando o respectivo toggle está ativo
+complement_fields = ["sigla_universidade", "sigla_instituto", "departamento", "laboratorio", "bloco_predio", "andar", "sala"]
+shipping_complement_fields = [f"shipping_{key}" for key in complement_fields]
+shipping_fields = [
+    "shipping_endereco",
+    "shipping_endereco_n",
+    "shipping_endereco_bairro",
+    "shipping_cep",
+    "shipping_cidade",
+    "shipping_uf",
+    "shipping_caixa_postal",
+] + shipping_complement_fields
+
+# Lista de campos do formulário (chaves do dicionário data e dos widgets em st.session_state)
+form_fields = [
+    "nome_empresa", "cnpj", "inscricao_estadual", "n_suframa", "cod_df", "telefone_fixo", "celular", "email",
+    "endereco", "endereco_n", "endereco_bairro", "cep", "cidade", "uf", "caixa_postal",
+    *complement_fields,
+    "shipping_address",
+    *shipping_fields,
+    "nome_contato", "cargo", "email_contato", "telefone_contato",
+    "tipo_empresa", "uso_produtos", "area_atuacao_empresa", "tipo_contribuicao",
+    *[key for key in image_keys if key != "shipping_comprovante_endereco"],
+]
+
+# Função para sanitizar o nome da empresa para uso em nomes de arquivos
+def sanitize_filename(name):
+    name = re.sub(r'[\/:*?"<>|]', '', name)
+    name = name.replace(' ', '_')
+    return name
+
+# Função para gerar um nome de arquivo baseado no nome da empresa
+def generate_unique_name(base_name, empresa):
+    sanitized_empresa = sanitize_filename(empresa)
+    return f"{base_name}_{sanitized_empresa}.xlsx"
+
+# Função para obter os bytes de um upload (UploadedFile/BytesIO) ou de bytes já extraídos
+def image_bytes(value):
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return value
+    return value.getvalue()
+
+# Função para copiar os bytes de cada upload uma única vez; ficha e anexos usam a mesma cópia
+def freeze_uploads(data, image_keys):
+    return {key: image_bytes(value) if key in image_keys and value is not None else value for key, value in data.items()}
+
+# Função para montar o que será escrito em uma aba: valores por célula e imagens por célula
+def build_sheet_plan(data, cells, image_keys):
+    plan = {"cells": {}, "images": {}}
+    for key, cell in cells.items():
+        if key in image_keys and data.get(key) is not None:
+            plan["images"][cell] = data[key]
+        elif key in ["associated_names", "associated_tax_ids"] and data.get(key):
+            values = data[key].split("; ")
+            for i, value in enumerate(values):
+                if i < len(cell):
+                    plan["cells"][cell[i]] = value.strip()
+        elif isinstance(cell, str):
+            plan["cells"][cell] = data.get(key)
+    return plan
+
+# Função para salvar os dados no Excel
+# Se template for informado (arquivo ou buffer), ele é lido e o resultado é gravado em path
+# path pode ser um caminho ou um buffer (ex.: io.BytesIO), sem arquivos temporários
+# engine: "openpyxl" (carrega e salva o workbook inteiro) ou "xml" (reescreve só as abas preenchidas)
+def save_to_excel(path, data, cells_sold_to, cells_ship_to, image_keys, sheet_sold_to="Dados de faturamento", sheet_ship_to="Dados de entrega", template=None, engine="openpyxl"):
+    sheets = {sheet_sold_to: build_sheet_plan(data, cells_sold_to, image_keys)}
+    if data.get("shipping_address", False):
+        sheets[sheet_ship_to] = build_sheet_plan(data, cells_ship_to, image_keys)
+    metrics.incr("images_embedded_total", sum(len(plan["images"]) for plan in sheets.values()))
+
+    if engine == "xml":
+        with metrics.stage("excel.patch"):
+            patch_workbook(template if template is not None else path, path, sheets)
+        return
+    if engine != "openpyxl":
+        raise ValueError(f"Engine de Excel desconhecida: {engine}")
+
+    with metrics.stage("excel.load_workbook"):
+        wb = load_workbook(template if template is not None else path)
+
+    # Aba Dados de faturamento (principal) e, se aplicável, Dados de entrega
+    with metrics.stage("excel.fill_cells"):
+        for sheet, plan in sheets.items():
+            ws = wb[sheet]
+            for cell, value in plan["cells"].items():
+                ws[cell] = value
+    with metrics.stage("excel.embed_images"):
+        for sheet, plan in sheets.items():
+            ws = wb[sheet]
+            for cell, value in plan["images"].items():
+                ws.add_image(OpenpyxlImage(io.BytesIO(image_bytes(value))), cell)
+
+    with metrics.stage("excel.save"):
+        wb.save(path)
+
+# Função para gerar a ficha de um template do registro; retorna (nome do arquivo, bytes, segundos)
+# Recebe o dicionário do template (e não o nome) para funcionar também em outro processo
+def render_template(spec, data, image_keys, engine="openpyxl", use_cache=True):
+    start = time.perf_counter()
+    buffer = io.BytesIO()
+    with metrics.stage("template.load"):
+        template = load_template(spec["path"], use_cache=use_cache)
+    save_to_excel(buffer, data, spec["cells_sold_to"], spec["cells_ship_to"], image_keys, spec["sheet_sold_to"],
+                  spec["sheet_ship_to"], template=template, engine=engine)
+    return generate_unique_name(spec["prefix"], data["nome_empresa"]), buffer.getvalue(), time.perf_counter() - start
+
+_render_executors = {}
+_render_executors_lock = threading.Lock()
+
+# Pools compartilhados para gerar vários templates ao mesmo tempo. A engine openpyxl é Python puro (presa ao GIL)
+# e roda em processos; a engine xml passa quase todo o tempo em zlib, que libera o GIL, e roda em threads,
+# sem copiar as imagens entre processos
+def get_render_executor(engine, max_workers=3):
+    kind = "process" if engine == "openpyxl" else "thread"
+    with _render_executors_lock:
+        executor = _render_executors.get(kind)
+        if executor is None:
+            if kind == "process":
+                executor = ProcessPoolExecutor(max_workers=max_workers, mp_context=get_context("spawn"))
+            else:
+                executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="template-render")
+            _render_executors[kind] = executor
+        return executor
+
+# Função para encerrar os pools da engine (ou todos, com engine=None); o próximo uso cria outro
+# Usada quando um processo filho cai (pool quebrado) e por quem precisa encerrar os processos antes de sair
+def shutdown_render_executors(engine=None, wait=False):
+    kinds = ["process", "thread"] if engine is None else ["process" if engine == "openpyxl" else "thread"]
+    with _render_executors_lock:
+        executors = [_render_executors.pop(kind) for kind in kinds if kind in _render_executors]
+    for executor in executors:
+        executor.shutdown(wait=wait, cancel_futures=True)
+
+# Função para gerar as fichas de vários templates de um mesmo envio; retorna [(nome do arquivo, bytes)] na
+# ordem de specs. Com mais de um template e executor informado, os templates são gerados ao mesmo tempo e o
+# tempo total fica próximo ao do template mais lento
+def render_templates(specs, data, image_keys, engine="openpyxl", use_cache=True, executor=None):
+    if len(specs) <= 1 or executor is None:
+        results = [render_template(spec, data, image_keys, engine, use_cache) for spec in specs]
+    else:
+        futures = []
+        for spec in specs:
+            # Só os campos usados pelo template (evita copiar imagens que ele não usa para outro processo)
+            keys = {"nome_empresa", "shipping_address", *spec["cells_sold_to"], *spec["cells_ship_to"]}
+            fields = {key: value for key, value in data.items() if key in keys}
+            futures.append(executor.submit(render_template, spec, fields, image_keys, engine, use_cache))
+        results = [future.result() for future in futures]
+    for _, _, seconds in results:
+        metrics.observe("excel.template", seconds)
+    return [(filename, content) for filename, content, _ in results]
+
+# Função para listar os rótulos dos campos obrigatórios não preenchidos
+def find_missing_fields(data, required_fields):
+    missing_fields = []
+    for field, label in required_fields.items():
+        value = data.get(field)
+        if value is None or (isinstance(value, str) and not value.strip()):
+            missing_fields.append(label)
+    return missing_fields
+
+# Função para montar o dicionário data a partir do estado dos widgets (st.session_state)
+# Campos de seções ocultas (complemento, endereço de entrega) ficam como None
+# uploads: {campo: arquivo}, quando os comprovantes não estão na chave com o nome do campo
+def collect_form_data(state, uploads=None):
+    data = {key: state.get(key) for key in form_fields}
+    if uploads is not None:
+        data.update((key, uploads.get(key)) for key in image_keys if key in data)
+    data["shipping_address"] = bool(data["shipping_address"])
+    if not state.get("complement"):
+        data.update(dict.fromkeys(complement_fields))
+    if not data["shipping_address"]:
+        data.update(dict.fromkeys(shipping_fields))
+    elif not state.get("shipping_address_complement"):
+        data.update(dict.fromkeys(shipping_complement_fields))
+    return data
@@ -1,237 +1,226 @@
-import streamlit as st
-import pandas as pd
-from openpyxl import load_workbook
-from openpyxl.drawing.image import Image as OpenpyxlImage
-import shutil
 import os
-import re
-import tempfile
-import uuid
-import smtplib
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
-from email.mime.base import MIMEBase
-from email import encoders
-
-# Caminho relativo do template Excel
-TEMPLATE_PATH = "templates/FICHA CADASTRAL.xlsx"
+import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+from jobs import JobQueue, QueueFull, RETRYING, DONE
+from mailer import SMTPPool, SMTP_HOST, SMTP_PORT, MAX_MESSAGE_BYTES
+from submission import process_submission
+from outbox import Outbox, Dispatcher, SENDING
+import metrics
+from cep_index import CEPIndex
+from validation import validate_fields
+from customer_index import CustomerIndex, describe_matches
+from archive import SubmissionArchive
+from ficha import TEMPLATE_PATH, cells_sold_to, cells_ship_to, image_keys, required_fields, find_missing_fields, collect_form_data, form_fields
+
 LOGO_PATH = "merck1.jpg"
+# Índice offline de CEPs para preencher o endereço (gerado com: python cep_index.py build ceps.csv)
+CEP_INDEX_PATH = st.secrets.get("CEP_INDEX", "ceps.idx")
+# Total de comprovantes que uma sessão pode manter anexados (bytes); cada sessão aberta guarda os arquivos na memória
+MAX_SESSION_UPLOAD_BYTES = st.secrets.get("MAX_SESSION_UPLOAD_BYTES", 30 * 1024 * 1024)
 
 st.set_page_config(page_icon='merck1.jpg', page_title='Merck Sigma - Registration Form')
 
-# Função para sanitizar o nome da empresa para uso em nomes de arquivos
-def sanitize_filename(name):
-    name = re.sub(r'[\/:*?"<>|]', '', name)
-    name = name.replace(' ', '_')
-    return name
-
-# Função para gerar um nome de arquivo baseado no nome da empresa
-def generate_unique_name(base_name, empresa):
-    sanitized_empresa = sanitize_filename(empresa)
-    return f"{base_name}_{sanitized_empresa}.xlsx"
-
-# Função para salvar os dados no Excel
-def save_to_excel(path, data, cells_sold_to, cells_ship_to, image_keys, sheet_sold_to="Dados de faturamento", sheet_ship_to="Dados de entrega"):
-    wb = load_workbook(path)
-    temp_files = []
-
-    # Aba Dados de faturamento (principal)
-    ws_sold_to = wb[sheet_sold_to]
-    for key, cell in cells_sold_to.items():
-        if key in image_keys and data.get(key) is not None:
-            temp_img_path = os.path.join(tempfile.gettempdir(), f"{key}_{uuid.uuid4()}.png")
-            with open(temp_img_path, "wb") as f:
-                f.write(data[key].getvalue())
-            img = OpenpyxlImage(temp_img_path)
-            ws_sold_to.add_image(img, cell)
-            temp_files.append(temp_img_path)
-        elif key in ["associated_names", "associated_tax_ids"] and data.get(key):
-            values = data[key].split("; ")
-            for i, value in enumerate(values):
-                if i < len(cell):
-                    ws_sold_to[cell[i]] = value.strip()
-        elif isinstance(cell, str):
-            ws_sold_to[cell] = data.get(key)
-
-    # Aba Dados de entrega (endereço de entrega, se aplicável)
-    if data.get("shipping_address", False):
-        ws_ship_to = wb[sheet_ship_to]
-        for key, cell in cells_ship_to.items():
-            if key in image_keys and data.get(key) is not None:
-                temp_img_path = os.path.join(tempfile.gettempdir(), f"{key}_{uuid.uuid4()}.png")
-                with open(temp_img_path, "wb") as f:
-                    f.write(data[key].getvalue())
-                img = OpenpyxlImage(temp_img_path)
-                ws_ship_to.add_image(img, cell)
-                temp_files.append(temp_img_path)
-            else:
-                ws_ship_to[cell] = data.get(key)
-
-    wb.save(path)
-    for temp_file in temp_files:
-        if os.path.exists(temp_file):
-            os.remove(temp_file)
-
-# Função para enviar e-mail com anexos
-def send_email(sender_email, receiver_email, subject, body, files, password):
-    msg = MIMEMultipart()
-    msg['From'] = sender_email
-    msg['To'] = receiver_email
-    msg['Subject'] = subject
-    msg.attach(MIMEText(body, 'plain'))
-
-    for file_path in files:
-        with open(file_path, 'rb') as f:
-            part = MIMEBase('application', 'vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-            part.set_payload(f.read())
-            encoders.encode_base64(part)
-            filename = os.path.basename(file_path)
-            part.add_header('Content-Disposition', f'attachment; filename="{filename}"')
-            msg.attach(part)
-
-    try:
-        server = smtplib.SMTP('smtp.gmail.com', 587)
-        server.starttls()
-        server.login(sender_email, password)
-        server.send_message(msg)
-        server.quit()
-        return True
-    except Exception as e:
-        st.error(f"Erro ao enviar e-mail: {str(e)}")
-        return False
-
 # Logo
 st.logo(LOGO_PATH, size='large')
 
 # Título do formulário
 st.title("Formulário para Cadastro")
 
-with st.expander('Dados de Cadastro', expanded=True):
-    nome_empresa = st.text_input("Razão Social *", placeholder='Merck S/A')
-    col1, col2 = st.columns(2)
-    with col1:
-        cnpj = st.text_input("CNPJ/CPF *", placeholder='33.069.212/0038-76', help='CPF ou CNPJ, Formato: XX.XXX.XXX/XXXX-XX')
-        inscricao_estadual = st.text_input('Inscrição Estadual')
-        n_suframa = st.text_input('Número Suframa')
-        cod_df = st.text_input('Código DF')
-    with col2:
-        telefone_fixo = st.text_input("Telefone Fixo *", placeholder='(00) 0000-0000')
-        celular = st.text_input("Telefone Celular", placeholder='(00) 00000-0000')
-        email = st.text_input("Email para envio do XML *", help='No caso de pessoa física deverá ser o e-mail da pessoa que está sendo cadastrada.')
-
-with st.expander('Endereço'):
-    col3, col4 = st.columns(2)
-    with col3:
-        endereco = st.text_input("Endereço *", placeholder='Alameda Xingu')
-        endereco_n = st.text_input("Número *", placeholder='350')
-        endereco_bairro = st.text_input("Bairro *", placeholder='Alphaville Industrial')
-        cep = st.text_input("CEP *", placeholder='06455-030', help='Formato: 00000-000')
-    with col4:
-        cidade = st.text_input("Cidade *", placeholder='Barueri')
-        uf = st.text_input("Estado *", placeholder='SP')
-        caixa_postal = st.text_input("Caixa Postal")
-
-    complement = st.toggle('Endereço necessita de complemento?', key='complement', help='Complemento (Ex: Bloco, Sala, etc.)')
-    if complement:
-        st.write('Complementos')
-        col5, col6 = st.columns(2)
-        with col5:
-            sigla_universidade = st.text_input("Sigla da Universidade", key='sold_to_universidade')
-            sigla_instituto = st.text_input("Sigla do Instituto", key='sold_to_instituto')
-            departamento = st.text_input("Departamento", key='sold_to_departamento')
-            laboratorio = st.text_input("Laboratório", key='sold_to_laboratorio')
-        with col6:
-            bloco_predio = st.text_input("Bloco do Prédio", key='sold_to_bloco')
-            andar = st.text_input("Andar", key='sold_to_andar')
-            sala = st.text_input("Sala", key='sold_to_sala')
-    else:
-        sigla_universidade = sigla_instituto = departamento = laboratorio = bloco_predio = andar = sala = None
-
-    shipping_address = st.toggle('Endereço de entrega é em outro local?', key='shipping_address', help='Ative a opção caso o endereço de entrega seja diferente do endereço de faturamento.')
-    with st.container(border=True):
-        if shipping_address:
-            st.write('Endereço de Entrega')
-            col13, col14 = st.columns(2)
-            with col13:
-                shipping_endereco = st.text_input("Endereço", placeholder='Alameda Xingu', key='shipping_endereco')
-                shipping_endereco_n = st.text_input("Número", placeholder='350', key='shipping_endereco_n')
-                shipping_endereco_bairro = st.text_input("Bairro", placeholder='Alphaville Industrial', key='shipping_endereco_bairro')
-                shipping_cep = st.text_input("CEP", placeholder='06455-030', help='Formato: 00000-000', key='shipping_cep')
-            with col14:
-                shipping_cidade = st.text_input("Cidade", placeholder='Barueri', key='shipping_cidade')
-                shipping_uf = st.text_input("Estado", placeholder='SP', key='shipping_uf')
-                shipping_caixa_postal = st.text_input("Caixa Postal", key='shipping_caixa_postal')
-            shipping_address_complement = st.toggle('Endereço de entrega necessita de complemento?', key='shipping_address_complement', help='Complemento (Ex: Bloco, Sala, etc.)')
-            if shipping_address_complement:
-                st.write('Complementos')
-                col15, col16 = st.columns(2)
-                with col15:
-                    shipping_sigla_universidade = st.text_input("Sigla da Universidade", key='ship_to_universidade')
-                    shipping_sigla_instituto = st.text_input("Sigla do Instituto", key='ship_to_instituto')
-                    shipping_departamento = st.text_input("Departamento", key='ship_to_departamento')
-                    shipping_laboratorio = st.text_input("Laboratório", key='ship_to_laboratorio')
-                with col16:
-                    shipping_bloco_predio = st.text_input("Bloco do Prédio", key='ship_to_bloco')
-                    shipping_andar = st.text_input("Andar", key='ship_to_andar')
-                    shipping_sala = st.text_input("Sala", key='ship_to_sala')
-            else:
-                shipping_sigla_universidade = shipping_sigla_instituto = shipping_departamento = shipping_laboratorio = shipping_bloco_predio = shipping_andar = shipping_sala = None
-
-            # with st.container(border=True):
-            #     st.write("Comprovante de Endereço de Entrega")
-            #     shipping_comprovante_endereco = st.file_uploader("Comprovante de Endereço de Entrega", type=['jpg', 'jpeg', 'png'], key='shipping_comprovante_endereco')
-            #     st.caption("O comprovante de endereço deve ser obtido em https://buscacepinter.correios.com.br/app/endereco/index.php. Tire um print e anexe aqui.")
-        else:
-            shipping_endereco = shipping_endereco_n = shipping_endereco_bairro = shipping_cep = None
-            shipping_cidade = shipping_uf = shipping_caixa_postal = None
-            shipping_sigla_universidade = shipping_sigla_instituto = shipping_departamento = shipping_laboratorio = shipping_bloco_predio = shipping_andar = shipping_sala = None
-            shipping_comprovante_endereco = None
-
-with st.expander('Informações de contato - Solicitante do Cadastro'):
-    nome_contato = st.text_input("Nome", key='nome_contato')
-    cargo = st.text_input("Função", key='cargo')
-    email_contato = st.text_input("Email", key='email_contato')
-    telefone_contato = st.text_input("Telefone", placeholder='(00) 00000-0000', key='telefone_contato')
-
-with st.expander('Informações de Contribuição'):
-    col7, col8 = st.columns(2)
-    with col7:
-        tipo_empresa = st.selectbox("Tipo de Empresa *", ('Publica', 'Privada', 'Mista'), placeholder='Escolha uma opção.', index=None, key='tipo_empresa')
-        uso_produtos = st.selectbox("Uso dos Produtos *", (
-            'C3 = Consumidor Final: ICMS + IPI',
-            'I3 = Industrialização: ICMS + IPI',
-            'C5 = Consumidor Final: IPI',
-            'C0 = Consumidor Final: S/ Impostos',
-            'C1 = Consumidor Final: ICMS',
-            'C2 = Consumidor Final: ICMS + Sub.Trib.',
-            'C4 = Consumidor Final: ICMS + Sub.Trib. + IPI',
-            'CX = Consumidor Final: ICMS somente',
-            'I0 = Industrialização: S/ Impostos',
-            'I1 = Industrialização: ICMS',
-            'I2 = Industrialização: ICMS + Sub.Trib.',
-            'I4 = Industrialização: ICMS + Sub.Trib. + IPI',
-            'I5 = Industrialização: IPI',
-            'I9 = ISS',
-            'IX = Industrialização: ICMS somente'
-        ), placeholder='Escolha uma opção.', index=None, key='uso_produtos')
-    with col8:
-        area_atuacao_empresa = st.selectbox("Área de Atuação da Empresa *", (
-            'Customer Sold to Sales Office desc',
-            'Applied',
-            'Academy',
-        ), key='area_atuacao_empresa', placeholder='Escolha uma opção.', index=None)
-        tipo_contribuicao = st.text_input("Tipo de Contribuição", key='tipo_contribuicao')
-
-    # with st.container(border=True):
-    #     st.write('Incentivo Fiscal')
-    #     col9, col10 = st.columns(2)
-    #     with col9:
-    #         icms = st.selectbox("ICMS *", ('Isento', 'Contribuinte'), placeholder='Escolha uma opção.', index=None, key='icms')
-    #         ipi = st.selectbox("IPI *", ('Isento', 'Contribuinte'), placeholder='Escolha uma opção.', index=None, key='ipi')
-    #     with col10:
-    #         pis = st.selectbox("PIS *", ('Isento', 'Contribuinte'), placeholder='Escolha uma opção.', index=None, key='pis')
-    #         cofins = st.selectbox("COFINS *", ('Isento', 'Contribuinte'), placeholder='Escolha uma opção.', index=None, key='cofins')
-    #     observacao_incentivo_geral = st.text_area("Observação", placeholder='Observação(ões) sobre Incentivo Fiscal', key='observacao_incentivo_geral')
+# Índice compartilhado por todas as sessões; sem o arquivo o endereço é digitado normalmente
+@st.cache_resource
+def get_cep_index(path):
+    return CEPIndex(path) if os.path.exists(path) else None
+
+# Preenche o endereço a partir do CEP digitado (prefix "" para faturamento, "shipping_" para entrega)
+# Só substitui campos vazios ou que tinham sido preenchidos pelo CEP anterior
+def autofill_cep(prefix):
+    index = get_cep_index(CEP_INDEX_PATH)
+    address = index.lookup(st.session_state.get(f"{prefix}cep")) if index is not None else None
+    if address is None:
+        return
+    previous = st.session_state.get(f"{prefix}cep_autofill", {})
+    for field, value in address.items():
+        key = prefix + field
+        if value and (not st.session_state.get(key) or st.session_state[key] == previous.get(field)):
+            st.session_state[key] = value
+    st.session_state[f"{prefix}cep_autofill"] = address
+
+# Chave do widget de cada comprovante: o nome do campo e, depois que o arquivo é descartado, um sufixo com a versão
+# (o navegador só esvazia o file_uploader quando a chave do widget muda)
+def upload_key(field):
+    version = st.session_state.get("upload_versions", {}).get(field, 0)
+    return f"{field}_{version}" if version else field
+
+# Comprovantes anexados na sessão: {campo: UploadedFile ou None}
+def session_uploads():
+    return {field: st.session_state.get(upload_key(field)) for field in image_keys}
+
+# Descarta os comprovantes dos campos: remove os bytes do gerenciador de uploads do Streamlit e do session_state
+def release_uploads(fields):
+    ctx = get_script_run_ctx()
+    versions = st.session_state.setdefault("upload_versions", {})
+    for field in fields:
+        upload = st.session_state.pop(upload_key(field), None)
+        if upload is None:
+            continue
+        if ctx is not None:
+            ctx.uploaded_file_mgr.remove_file(ctx.session_id, upload.file_id)
+        versions[field] = versions.get(field, 0) + 1
+
+# Tamanho legível para mensagens: KB abaixo de 1 MB, senão MB com uma casa decimal (ex.: "500 KB", "1,5 MB")
+def format_size(size):
+    if size < 1024 * 1024:
+        return f"{size / 1024:.0f} KB"
+    return f"{size / (1024 * 1024):.1f}".replace(".", ",").removesuffix(",0") + " MB"
+
+# Recusa o comprovante que faria a sessão passar de MAX_SESSION_UPLOAD_BYTES
+def check_upload_limit(field):
+    uploads = session_uploads()
+    total = sum(upload.size for upload in uploads.values() if upload is not None)
+    if total > MAX_SESSION_UPLOAD_BYTES:
+        name = uploads[field].name
+        release_uploads([field])
+        metrics.incr("uploads_rejected_total")
+        st.session_state["upload_rejected"] = (
+            f"O arquivo {name} não foi anexado: o total dos comprovantes passaria de "
+            f"{format_size(MAX_SESSION_UPLOAD_BYTES)}. Envie uma versão menor (ex.: foto em resolução mais baixa).")
+
+# Após um envio concluído: libera os comprovantes e limpa os campos, para a sessão não manter os arquivos na memória
+def reset_form():
+    release_uploads([field for field, upload in session_uploads().items() if upload is not None])
+    for key in [*form_fields, "complement", "shipping_address_complement", "cep_autofill", "shipping_cep_autofill", "duplicate_confirmed"]:
+        if key not in image_keys:
+            st.session_state.pop(key, None)
+
+# Cada seção do formulário é um fragmento: digitar ou alternar um campo reexecuta só a seção, não o script inteiro.
+# Os valores ficam em st.session_state (a chave de cada widget é o nome do campo em data)
+# e o dicionário data só é montado quando "Enviar" é clicado.
+
+@st.fragment
+def secao_dados_cadastro():
+    with st.expander('Dados de Cadastro', expanded=True):
+        st.text_input("Razão Social *", placeholder='Merck S/A', key='nome_empresa')
+        col1, col2 = st.columns(2)
+        with col1:
+            st.text_input("CNPJ/CPF *", placeholder='33.069.212/0038-76', help='CPF ou CNPJ, Formato: XX.XXX.XXX/XXXX-XX', key='cnpj')
+            st.text_input('Inscrição Estadual', key='inscricao_estadual')
+            st.text_input('Número Suframa', key='n_suframa')
+            st.text_input('Código DF', key='cod_df')
+        with col2:
+            st.text_input("Telefone Fixo *", placeholder='(00) 0000-0000', key='telefone_fixo')
+            st.text_input("Telefone Celular", placeholder='(00) 00000-0000', key='celular')
+            st.text_input("Email para envio do XML *", help='No caso de pessoa física deverá ser o e-mail da pessoa que está sendo cadastrada.', key='email')
+
+@st.fragment
+def secao_endereco():
+    with st.expander('Endereço'):
+        col3, col4 = st.columns(2)
+        with col3:
+            st.text_input("CEP *", placeholder='06455-030', help='Formato: 00000-000', key='cep', on_change=autofill_cep, args=("",))
+            st.text_input("Endereço *", placeholder='Alameda Xingu', key='endereco')
+            st.text_input("Número *", placeholder='350', key='endereco_n')
+            st.text_input("Bairro *", placeholder='Alphaville Industrial', key='endereco_bairro')
+        with col4:
+            st.text_input("Cidade *", placeholder='Barueri', key='cidade')
+            st.text_input("Estado *", placeholder='SP', key='uf')
+            st.text_input("Caixa Postal", key='caixa_postal')
+
+        complement = st.toggle('Endereço necessita de complemento?', key='complement', help='Complemento (Ex: Bloco, Sala, etc.)')
+        if complement:
+            st.write('Complementos')
+            col5, col6 = st.columns(2)
+            with col5:
+                st.text_input("Sigla da Universidade", key='sigla_universidade')
+                st.text_input("Sigla do Instituto", key='sigla_instituto')
+                st.text_input("Departamento", key='departamento')
+                st.text_input("Laboratório", key='laboratorio')
+            with col6:
+                st.text_input("Bloco do Prédio", key='bloco_predio')
+                st.text_input("Andar", key='andar')
+                st.text_input("Sala", key='sala')
+
+        shipping_address = st.toggle('Endereço de entrega é em outro local?', key='shipping_address', help='Ative a opção caso o endereço de entrega seja diferente do endereço de faturamento.')
+        with st.container(border=True):
+            if shipping_address:
+                st.write('Endereço de Entrega')
+                col13, col14 = st.columns(2)
+                with col13:
+                    st.text_input("CEP", placeholder='06455-030', help='Formato: 00000-000', key='shipping_cep', on_change=autofill_cep, args=("shipping_",))
+                    st.text_input("Endereço", placeholder='Alameda Xingu', key='shipping_endereco')
+                    st.text_input("Número", placeholder='350', key='shipping_endereco_n')
+                    st.text_input("Bairro", placeholder='Alphaville Industrial', key='shipping_endereco_bairro')
+                with col14:
+                    st.text_input("Cidade", placeholder='Barueri', key='shipping_cidade')
+                    st.text_input("Estado", placeholder='SP', key='shipping_uf')
+                    st.text_input("Caixa Postal", key='shipping_caixa_postal')
+                shipping_address_complement = st.toggle('Endereço de entrega necessita de complemento?', key='shipping_address_complement', help='Complemento (Ex: Bloco, Sala, etc.)')
+                if shipping_address_complement:
+                    st.write('Complementos')
+                    col15, col16 = st.columns(2)
+                    with col15:
+                        st.text_input("Sigla da Universidade", key='shipping_sigla_universidade')
+                        st.text_input("Sigla do Instituto", key='shipping_sigla_instituto')
+                        st.text_input("Departamento", key='shipping_departamento')
+                        st.text_input("Laboratório", key='shipping_laboratorio')
+                    with col16:
+                        st.text_input("Bloco do Prédio", key='shipping_bloco_predio')
+                        st.text_input("Andar", key='shipping_andar')
+                        st.text_input("Sala", key='shipping_sala')
+
+                # with st.container(border=True):
+                #     st.write("Comprovante de Endereço de Entrega")
+                #     shipping_comprovante_endereco = st.file_uploader("Comprovante de Endereço de Entrega", type=['jpg', 'jpeg', 'png'], key='shipping_comprovante_endereco')
+                #     st.caption("O comprovante de endereço deve ser obtido em https://buscacepinter.correios.com.br/app/endereco/index.php. Tire um print e anexe aqui.")
+
+@st.fragment
+def secao_contato():
+    with st.expander('Informações de contato - Solicitante do Cadastro'):
+        st.text_input("Nome", key='nome_contato')
+        st.text_input("Função", key='cargo')
+        st.text_input("Email", key='email_contato')
+        st.text_input("Telefone", placeholder='(00) 00000-0000', key='telefone_contato')
+
+@st.fragment
+def secao_contribuicao():
+    with st.expander('Informações de Contribuição'):
+        col7, col8 = st.columns(2)
+        with col7:
+            st.selectbox("Tipo de Empresa *", ('Publica', 'Privada', 'Mista'), placeholder='Escolha uma opção.', index=None, key='tipo_empresa')
+            st.selectbox("Uso dos Produtos *", (
+                'C3 = Consumidor Final: ICMS + IPI',
+                'I3 = Industrialização: ICMS + IPI',
+                'C5 = Consumidor Final: IPI',
+                'C0 = Consumidor Final: S/ Impostos',
+                'C1 = Consumidor Final: ICMS',
+                'C2 = Consumidor Final: ICMS + Sub.Trib.',
+                'C4 = Consumidor Final: ICMS + Sub.Trib. + IPI',
+                'CX = Consumidor Final: ICMS somente',
+                'I0 = Industrialização: S/ Impostos',
+                'I1 = Industrialização: ICMS',
+                'I2 = Industrialização: ICMS + Sub.Trib.',
+                'I4 = Industrialização: ICMS + Sub.Trib. + IPI',
+                'I5 = Industrialização: IPI',
+                'I9 = ISS',
+                'IX = Industrialização: ICMS somente'
+            ), placeholder='Escolha uma opção.', index=None, key='uso_produtos')
+        with col8:
+            st.selectbox("Área de Atuação da Empresa *", (
+                'Customer Sold to Sales Office desc',
+                'Applied',
+                'Academy',
+            ), key='area_atuacao_empresa', placeholder='Escolha uma opção.', index=None)
+            st.text_input("Tipo de Contribuição", key='tipo_contribuicao')
+
+        # with st.container(border=True):
+        #     st.write('Incentivo Fiscal')
+        #     col9, col10 = st.columns(2)
+        #     with col9:
+        #         icms = st.selectbox("ICMS *", ('Isento', 'Contribuinte'), placeholder='Escolha uma opção.', index=None, key='icms')
+        #         ipi = st.selectbox("IPI *", ('Isento', 'Contribuinte'), placeholder='Escolha uma opção.', index=None, key='ipi')
+        #     with col10:
+        #         pis = st.selectbox("PIS *", ('Isento', 'Contribuinte'), placeholder='Escolha uma opção.', index=None, key='pis')
+        #         cofins = st.selectbox("COFINS *", ('Isento', 'Contribuinte'), placeholder='Escolha uma opção.', index=None, key='cofins')
+        #     observacao_incentivo_geral = st.text_area("Observação", placeholder='Observação(ões) sobre Incentivo Fiscal', key='observacao_incentivo_geral')
 
 # with st.expander('Empresas Coligadas (preencher somente se necessário)'):
 #     n_associated_companies = st.number_input("Quantidade de Empresas Coligadas", min_value=0, max_value=4, value=0, key='n_associated_companies', help='Pode-se adicionar até mais 4 empresas coligadas.')
@@ -244,255 +233,229 @@ with st.expander('Informações de Contribuição'):
 #             associated_names.append(associated_name)
 #             associated_tax_ids.append(associated_tax_id)
 
-with st.expander('Comprovantes'):
-    col11, col12 = st.columns(2)
-    with col11:
-        comprovante_endereco = st.file_uploader("Comprovante de Endereço *", type=['jpg', 'jpeg', 'png'], key='comprovante_endereco')
-        cartao_receita_federal = st.file_uploader("Cartão da Receita Federal *", type=['jpg', 'jpeg', 'png'], help='www.receita.fazenda.gov.br', key='cartao_receita_federal')
-        exclusivo_pessoa_fisica = st.file_uploader("Exclusivo para Pessoa Física - Vínculo com uma Instituição", type=['jpg', 'jpeg', 'png'], help='http://buscatextual.cnpq.br/buscatextual/busca.do?metodo=apresentar. Se a pessoa física não tiver um currículo Lattes, deverá apresentar outra comprovação.', key='exclusivo_pessoa_fisica')
-    with col12:
-        cartao_sintegra = st.file_uploader("Cartão do Sintegra", type=['jpg', 'jpeg', 'png'], help='Somente para empresas que possuem I.E. (www.sintegra.gov.br)', key='cartao_sintegra')
-        cartao_suframa = st.file_uploader("Cartão Suframa", type=['jpg', 'jpeg', 'png'], help='Somente para empresas que possuem Inscrição Suframa, https://servicos.suframa.gov.br/servicos', key='cartao_suframa')
-
-    with st.container(border=True):
-        st.write("Documentos Financeiros Obrigatórios")
-        col17, col18 = st.columns(2)
-        with col17:
-            contrato_social = st.file_uploader("Contrato Social *", type=['jpg', 'jpeg', 'png'], key='contrato_social')
-            cartao_cnpj = st.file_uploader("Cartão CNPJ *", type=['jpg', 'jpeg', 'png'], key='cartao_cnpj')
-        with col18:
-            balanco_patrimonial_ou_dre = st.file_uploader("Balanço Patrimonial e/ou DRE *", type=['jpg', 'jpeg', 'png'], key='balanco_patrimonial_ou_dre')
-
-# Dicionário com os dados do formulário
-data = {
-    "nome_empresa": nome_empresa,
-    "cnpj": cnpj,
-    "inscricao_estadual": inscricao_estadual,
-    "n_suframa": n_suframa,
-    "cod_df": cod_df,
-    "telefone_fixo": telefone_fixo,
-    "celular": celular,
-    "email": email,
-    "endereco": endereco,
-    "endereco_n": endereco_n,
-    "endereco_bairro": endereco_bairro,
-    "cep": cep,
-    "cidade": cidade,
-    "uf": uf,
-    "caixa_postal": caixa_postal,
-    "sigla_universidade": sigla_universidade,
-    "sigla_instituto": sigla_instituto,
-    "departamento": departamento,
-    "laboratorio": laboratorio,
-    "bloco_predio": bloco_predio,
-    "andar": andar,
-    "sala": sala,
-    "shipping_address": shipping_address,
-    "shipping_endereco": shipping_endereco,
-    "shipping_endereco_n": shipping_endereco_n,
-    "shipping_endereco_bairro": shipping_endereco_bairro,
-    "shipping_cep": shipping_cep,
-    "shipping_cidade": shipping_cidade,
-    "shipping_uf": shipping_uf,
-    "shipping_caixa_postal": shipping_caixa_postal,
-    "shipping_sigla_universidade": shipping_sigla_universidade,
-    "shipping_sigla_instituto": shipping_sigla_instituto,
-    "shipping_departamento": shipping_departamento,
-    "shipping_laboratorio": shipping_laboratorio,
-    "shipping_bloco_predio": shipping_bloco_predio,
-    "shipping_andar": shipping_andar,
-    "shipping_sala": shipping_sala,
-    # "shipping_comprovante_endereco": shipping_comprovante_endereco,
-    "nome_contato": nome_contato,
-    "cargo": cargo,
-    "email_contato": email_contato,
-    "telefone_contato": telefone_contato,
-    "tipo_empresa": tipo_empresa,
-    "uso_produtos": uso_produtos,
-    "area_atuacao_empresa": area_atuacao_empresa,
-    "tipo_contribuicao": tipo_contribuicao,
-    # "icms": icms,
-    # "ipi": ipi,
-    # "pis": pis,
-    # "cofins": cofins,
-    # "observacao_incentivo_geral": observacao_incentivo_geral,
-    # "associated_names": "; ".join(associated_names) if associated_names else None,
-    # "associated_tax_ids": "; ".join(associated_tax_ids) if associated_tax_ids else None,
-    "comprovante_endereco": comprovante_endereco,
-    "cartao_receita_federal": cartao_receita_federal,
-    "exclusivo_pessoa_fisica": exclusivo_pessoa_fisica,
-    "cartao_sintegra": cartao_sintegra,
-    "cartao_suframa": cartao_suframa,
-    "contrato_social": contrato_social,
-    "cartao_cnpj": cartao_cnpj,
-    "balanco_patrimonial_ou_dre": balanco_patrimonial_ou_dre
-}
-
-# Dicionários com as células correspondentes para cada aba
-cells_ship_to = {
-    "nome_empresa": "C11",
-    "cnpj": "H11",
-    "inscricao_estadual": "I11",
-    "n_suframa": "J11",
-    "cod_df": "K11",
-    "telefone_fixo": "D15",
-    "celular": "E15",
-    "email": "F15",
-    "endereco": "C13",
-    "endereco_n": "G13",
-    "endereco_bairro": "H13",
-    "cep": "I13",
-    "cidade": "J13",
-    "uf": "L13",
-    "caixa_postal": "C15",
-    "sigla_universidade": "C19",
-    "sigla_instituto": "E19",
-    "departamento": "F19",
-    "laboratorio": "H19",
-    "bloco_predio": "J19",
-    "andar": "K19",
-    "sala": "L19",
-    "nome_contato": "C22",
-    "cargo": "F22",
-    "email_contato": "G22",
-    "telefone_contato": "J22",
-    "tipo_empresa": "C27",
-    "uso_produtos": "D27",
-    "area_atuacao_empresa": "F27",
-    "tipo_contribuicao": "H27",
-    # "icms": "C31",
-    # "ipi": "D31",
-    # "pis": "E31",
-    # "cofins": "F31",
-    # "observacao_incentivo_geral": "G29",
-    # "associated_names": ["C35", "C36", "C37", "C38"],
-    # "associated_tax_ids": ["I35", "I36", "I37", "I38"],
-}
-
-cells_sold_to = {
-    "nome_empresa": "C11",
-    "cnpj": "H11",
-    "inscricao_estadual": "I11",
-    "n_suframa": "J11",
-    "cod_df": "K11",
-    "telefone_fixo": "D15",
-    "celular": "E15",
-    "email": "F15",
-    "endereco": "C13",
-    "endereco_n": "G13",
-    "endereco_bairro": "H13",
-    "cep": "I13",
-    "cidade": "J13",
-    "uf": "L13",
-    "caixa_postal": "C15",
-    "sigla_universidade": "C19",
-    "sigla_instituto": "E19",
-    "departamento": "F19",
-    "laboratorio": "H19",
-    "bloco_predio": "J19",
-    "andar": "K19",
-    "sala": "L19",
-    "nome_contato": "C22",
-    "cargo": "F22",
-    "email_contato": "G22",
-    "telefone_contato": "J22",
-    "comprovante_endereco": "C165",
-    "cartao_receita_federal": "C175",
-    "exclusivo_pessoa_fisica": "C185",
-    "cartao_sintegra": "C195",
-    "cartao_suframa": "C205",
-    "contrato_social": "C215",
-    "cartao_cnpj": "C225",
-    "balanco_patrimonial_ou_dre": "C235"
-}
-
-# Lista de chaves que correspondem a imagens
-image_keys = [
-    "comprovante_endereco",
-    "cartao_receita_federal",
-    "exclusivo_pessoa_fisica",
-    "cartao_sintegra",
-    "cartao_suframa",
-    "shipping_comprovante_endereco",
-    "contrato_social",
-    "cartao_cnpj",
-    "balanco_patrimonial_ou_dre"
-]
+@st.fragment
+def secao_comprovantes():
+    with st.expander('Comprovantes', expanded="upload_rejected" in st.session_state):
+        if "upload_rejected" in st.session_state:
+            st.error(st.session_state.pop("upload_rejected"))
+        col11, col12 = st.columns(2)
+        with col11:
+            st.file_uploader("Comprovante de Endereço *", type=['jpg', 'jpeg', 'png'], key=upload_key('comprovante_endereco'), on_change=check_upload_limit, args=('comprovante_endereco',))
+            st.file_uploader("Cartão da Receita Federal *", type=['jpg', 'jpeg', 'png'], help='www.receita.fazenda.gov.br', key=upload_key('cartao_receita_federal'), on_change=check_upload_limit, args=('cartao_receita_federal',))
+            st.file_uploader("Exclusivo para Pessoa Física - Vínculo com uma Instituição", type=['jpg', 'jpeg', 'png'], help='http://buscatextual.cnpq.br/buscatextual/busca.do?metodo=apresentar. Se a pessoa física não tiver um currículo Lattes, deverá apresentar outra comprovação.', key=upload_key('exclusivo_pessoa_fisica'), on_change=check_upload_limit, args=('exclusivo_pessoa_fisica',))
+        with col12:
+            st.file_uploader("Cartão do Sintegra", type=['jpg', 'jpeg', 'png'], help='Somente para empresas que possuem I.E. (www.sintegra.gov.br)', key=upload_key('cartao_sintegra'), on_change=check_upload_limit, args=('cartao_sintegra',))
+            st.file_uploader("Cartão Suframa", type=['jpg', 'jpeg', 'png'], help='Somente para empresas que possuem Inscrição Suframa, https://servicos.suframa.gov.br/servicos', key=upload_key('cartao_suframa'), on_change=check_upload_limit, args=('cartao_suframa',))
+
+        with st.container(border=True):
+            st.write("Documentos Financeiros Obrigatórios")
+            col17, col18 = st.columns(2)
+            with col17:
+                st.file_uploader("Contrato Social *", type=['jpg', 'jpeg', 'png'], key=upload_key('contrato_social'), on_change=check_upload_limit, args=('contrato_social',))
+                st.file_uploader("Cartão CNPJ *", type=['jpg', 'jpeg', 'png'], key=upload_key('cartao_cnpj'), on_change=check_upload_limit, args=('cartao_cnpj',))
+            with col18:
+                st.file_uploader("Balanço Patrimonial e/ou DRE *", type=['jpg', 'jpeg', 'png'], key=upload_key('balanco_patrimonial_ou_dre'), on_change=check_upload_limit, args=('balanco_patrimonial_ou_dre',))
+
+secao_dados_cadastro()
+secao_endereco()
+secao_contato()
+secao_contribuicao()
+secao_comprovantes()
 
 # Configurações de e-mail usando st.secrets
 SENDER_EMAIL = st.secrets["SENDER_EMAIL"]
 RECEIVER_EMAIL = st.secrets["RECEIVER_EMAIL"]
 EMAIL_PASSWORD = st.secrets["EMAIL_PASSWORD"]
+# Cache do template em memória (desative com TEMPLATE_CACHE = false para comparar)
+TEMPLATE_CACHE = st.secrets.get("TEMPLATE_CACHE", True)
+# Engine usada para preencher o Excel: "openpyxl" ou "xml"
+EXCEL_ENGINE = st.secrets.get("EXCEL_ENGINE", "openpyxl")
+# Templates gerados em cada envio (nomes do registro TEMPLATES em ficha.py), todos anexados ao mesmo e-mail,
+# e quantos são gerados ao mesmo tempo (RENDER_WORKERS = 1 gera um de cada vez). Por padrão só a FICHA CADASTRAL;
+# Merck e Sigma são opcionais (ex.: TEMPLATES = ["ficha", "merck", "sigma"])
+TEMPLATE_NAMES = st.secrets.get("TEMPLATES", ["ficha"])
+RENDER_WORKERS = st.secrets.get("RENDER_WORKERS", 3)
+# Processamento em segundo plano: número de workers, tamanho máximo da fila e novas tentativas de SMTP
+SUBMIT_WORKERS = st.secrets.get("SUBMIT_WORKERS", 2)
+SUBMIT_QUEUE_SIZE = st.secrets.get("SUBMIT_QUEUE_SIZE", 20)
+SMTP_MAX_ATTEMPTS = st.secrets.get("SMTP_MAX_ATTEMPTS", 3)
+SMTP_RETRY_BACKOFF = st.secrets.get("SMTP_RETRY_BACKOFF", 2.0)
+
+# Normalização dos comprovantes (orientação, dimensão máxima em pixels e orçamento de bytes por imagem)
+IMAGE_NORMALIZE = st.secrets.get("IMAGE_NORMALIZE", True)
+IMAGE_MAX_DIMENSION = st.secrets.get("IMAGE_MAX_DIMENSION", 2000)
+IMAGE_MAX_BYTES = st.secrets.get("IMAGE_MAX_BYTES", 800_000)
+IMAGE_WORKERS = st.secrets.get("IMAGE_WORKERS", 4)
+
+# Servidor SMTP e pool de conexões autenticadas (SMTP_STARTTLS = false para um servidor local de testes)
+SMTP_SERVER = st.secrets.get("SMTP_HOST", SMTP_HOST)
+SMTP_SERVER_PORT = st.secrets.get("SMTP_PORT", SMTP_PORT)
+SMTP_STARTTLS = st.secrets.get("SMTP_STARTTLS", True)
+SMTP_POOL_SIZE = st.secrets.get("SMTP_POOL_SIZE", 2)
+SMTP_IDLE_TIMEOUT = st.secrets.get("SMTP_IDLE_TIMEOUT", 60)
+
+# Anexos: "separate" (um por arquivo) ou "zip" (um único .zip); envios acima de MAX_MESSAGE_BYTES viram vários e-mails
+ATTACHMENT_MODE = st.secrets.get("ATTACHMENT_MODE", "separate")
+MESSAGE_SIZE_LIMIT = st.secrets.get("MAX_MESSAGE_BYTES", MAX_MESSAGE_BYTES)
+
+# Caixa de saída durável (SQLite): evita e-mails duplicados e reenvia pendentes após reinício (OUTBOX_PATH = "" desativa)
+OUTBOX_PATH = st.secrets.get("OUTBOX_PATH", "outbox.db")
+OUTBOX_INTERVAL = st.secrets.get("OUTBOX_INTERVAL", 30)
+OUTBOX_BATCH_SIZE = st.secrets.get("OUTBOX_BATCH_SIZE", 20)
+
+# Índice de clientes já cadastrados, para avisar sobre cadastros duplicados (CUSTOMER_INDEX = "" desativa)
+CUSTOMER_INDEX_PATH = st.secrets.get("CUSTOMER_INDEX", "customers.db")
+
+# Arquivo Parquet dos cadastros enviados, para relatórios (ARCHIVE_PATH = "" desativa), gravado em lotes
+ARCHIVE_PATH = st.secrets.get("ARCHIVE_PATH", "archive")
+ARCHIVE_BATCH_SIZE = st.secrets.get("ARCHIVE_BATCH_SIZE", 200)
+ARCHIVE_INTERVAL = st.secrets.get("ARCHIVE_INTERVAL", 60)
+
+# Medições por etapa do envio: um log JSON por envio e, se METRICS_FILE for informado, um snapshot Prometheus
+METRICS_ENABLED = st.secrets.get("METRICS_ENABLED", False)
+METRICS_FILE = st.secrets.get("METRICS_FILE", None)
+metrics.configure(METRICS_ENABLED)
+
+# Pool compartilhado por todas as sessões do processo
+@st.cache_resource
+def get_smtp_pool(host, port, username, password, size, idle_timeout, starttls):
+    return SMTPPool(host, port, username, password, size=size, idle_timeout=idle_timeout, starttls=starttls)
+
+smtp_pool = get_smtp_pool(SMTP_SERVER, SMTP_SERVER_PORT, SENDER_EMAIL, EMAIL_PASSWORD, SMTP_POOL_SIZE, SMTP_IDLE_TIMEOUT, SMTP_STARTTLS)
+
+# Fila compartilhada por todas as sessões do processo
+@st.cache_resource
+def get_job_queue(workers, max_pending):
+    return JobQueue(process_submission, workers=workers, max_pending=max_pending)
+
+job_queue = get_job_queue(SUBMIT_WORKERS, SUBMIT_QUEUE_SIZE)
+
+# Caixa de saída e Dispatcher compartilhados por todas as sessões do processo
+@st.cache_resource
+def get_outbox(path, interval, batch_size, attachment_mode, max_message_bytes, _pool):
+    outbox = Outbox(path, attachment_mode=attachment_mode, max_message_bytes=max_message_bytes)
+    Dispatcher(outbox, _pool, interval=interval, batch_size=batch_size)
+    return outbox
+
+outbox = get_outbox(OUTBOX_PATH, OUTBOX_INTERVAL, OUTBOX_BATCH_SIZE, ATTACHMENT_MODE, MESSAGE_SIZE_LIMIT, smtp_pool) if OUTBOX_PATH else None
+
+# Índice de clientes compartilhado por todas as sessões do processo
+@st.cache_resource
+def get_customer_index(path):
+    return CustomerIndex(path)
+
+customer_index = get_customer_index(CUSTOMER_INDEX_PATH) if CUSTOMER_INDEX_PATH else None
+
+# Arquivo de cadastros compartilhado por todas as sessões do processo
+@st.cache_resource
+def get_archive(path, batch_size, interval):
+    return SubmissionArchive(path, batch_size=batch_size, interval=interval)
+
+archive = get_archive(ARCHIVE_PATH, ARCHIVE_BATCH_SIZE, ARCHIVE_INTERVAL) if ARCHIVE_PATH else None
+
+settings = {
+    "sender_email": SENDER_EMAIL,
+    "receiver_email": RECEIVER_EMAIL,
+    "password": EMAIL_PASSWORD,
+    "template_path": TEMPLATE_PATH,
+    "template_cache": TEMPLATE_CACHE,
+    "excel_engine": EXCEL_ENGINE,
+    "templates": TEMPLATE_NAMES,
+    "render_workers": RENDER_WORKERS,
+    "cells_sold_to": cells_sold_to,
+    "cells_ship_to": cells_ship_to,
+    "image_keys": image_keys,
+    "smtp_max_attempts": SMTP_MAX_ATTEMPTS,
+    "smtp_retry_backoff": SMTP_RETRY_BACKOFF,
+    "smtp_pool": smtp_pool,
+    "attachment_mode": ATTACHMENT_MODE,
+    "max_message_bytes": MESSAGE_SIZE_LIMIT,
+    "image_normalize": IMAGE_NORMALIZE,
+    "image_max_dimension": IMAGE_MAX_DIMENSION,
+    "image_max_bytes": IMAGE_MAX_BYTES,
+    "image_workers": IMAGE_WORKERS,
+    "metrics_file": METRICS_FILE,
+    "outbox": outbox,
+    "customers": customer_index,
+    "archive": archive,
+}
 
-# Botão para enviar os dados
-if st.button("Enviar"):
-    # Lista de campos obrigatórios
-    required_fields = {
-        "nome_empresa": "Razão Social",
-        "cnpj": "CNPJ/CPF",
-        "telefone_fixo": "Telefone Fixo",
-        "email": "Email para envio do XML",
-        "endereco": "Endereço",
-        "endereco_n": "Número",
-        "endereco_bairro": "Bairro",
-        "cep": "CEP",
-        "cidade": "Cidade",
-        "uf": "Estado",
-        "tipo_empresa": "Tipo de Empresa",
-        "uso_produtos": "Uso dos Produtos",
-        "area_atuacao_empresa": "Área de Atuação da Empresa",
-        # "icms": "ICMS",
-        # "ipi": "IPI",
-        # "pis": "PIS",
-        # "cofins": "COFINS",
-        "comprovante_endereco": "Comprovante de Endereço",
-        "cartao_receita_federal": "Cartão da Receita Federal",
-        "contrato_social": "Contrato Social",
-        "cartao_cnpj": "Cartão CNPJ",
-        "balanco_patrimonial_ou_dre": "Balanço Patrimonial e/ou DRE"
-    }
+# Acompanha o envio em segundo plano; quando termina, guarda o resultado e recarrega a página
+@st.fragment(run_every=1)
+def show_job_status():
+    job = job_queue.get(st.session_state["job_id"])
+    if job is None:
+        del st.session_state["job_id"]
+        st.rerun()
+    if not job.finished:
+        if job.status == RETRYING:
+            st.warning(f"Servidor de e-mail indisponível, tentando novamente (tentativa {job.attempts + 1})...")
+        else:
+            st.info("Processando e enviando os dados...")
+        return
+    del st.session_state["job_id"]
+    st.session_state["job_finished"] = (job.status, job.error, job.result)
+    if job.status == DONE and job.result != SENDING:
+        reset_form()
+    st.rerun()
 
+# Botão para enviar os dados
+if st.button("Enviar", disabled="job_id" in st.session_state):
+    data = collect_form_data(st.session_state, uploads=session_uploads())
     # Verificar se todos os campos obrigatórios estão preenchidos
-    missing_fields = []
-    for field, label in required_fields.items():
-        value = data.get(field)
-        if value is None or (isinstance(value, str) and not value.strip()):
-            missing_fields.append(label)
+    with metrics.stage("form.validate"):
+        missing_fields = find_missing_fields(data, required_fields)
+        # Verificar o formato dos campos preenchidos (CNPJ/CPF, CEP, UF, telefones e e-mails)
+        invalid_fields = validate_fields(data)
 
     if missing_fields:
+        metrics.incr("validation_failures_total")
         st.error(f"Por favor, preencha os seguintes campos obrigatórios: {', '.join(missing_fields)}")
+    elif invalid_fields:
+        metrics.incr("validation_failures_total")
+        st.error("Por favor, corrija os seguintes campos:\n\n" + "\n".join(f"- {message}" for message in invalid_fields.values()))
+    else:
+        # Avisar antes de gerar a ficha se o cliente já foi cadastrado; um novo clique em Enviar confirma o envio
+        with metrics.stage("form.duplicates"):
+            duplicates = customer_index.find(data) if customer_index is not None else []
+        confirmation = (data["cnpj"], data["nome_empresa"])
+        if duplicates and st.session_state.get("duplicate_confirmed") != confirmation:
+            st.session_state["duplicate_confirmed"] = confirmation
+            metrics.incr("duplicate_warnings_total")
+            st.warning(f"Este cliente parece já ter sido cadastrado ({describe_matches(duplicates)}). Se for mesmo um novo cadastro, clique em Enviar novamente.")
+        else:
+            try:
+                with metrics.stage("form.enqueue"):
+                    st.session_state["job_id"] = job_queue.submit(data, settings)
+                st.session_state.pop("duplicate_confirmed", None)
+                st.rerun()
+            except QueueFull:
+                metrics.incr("queue_full_total")
+                st.warning("Muitos cadastros sendo processados no momento. Aguarde alguns instantes e clique em Enviar novamente.")
+
+if "job_id" in st.session_state:
+    show_job_status()
+
+job_finished = st.session_state.pop("job_finished", None)
+if job_finished is not None:
+    status, error, result = job_finished
+    if status == DONE and result == SENDING:
+        # O mesmo cadastro (ex.: clique duplo) está sendo enviado por outro envio, que ainda pode falhar
+        st.info("Este cadastro já está sendo enviado. Aguarde alguns instantes; se não receber a confirmação, clique em Enviar novamente.")
+    elif status == DONE:
+        st.success("Formulário enviado com sucesso!")
+        st.markdown(
+            """
+            <div style='text-align: center; padding: 20px; border: 2px solid rgb(235, 60, 150); border-radius: 10px; background-color: rgb(79, 53, 140);'>
+                <h2 style='color: white;'>Formulário de cadastro enviado com sucesso!</h2>
+                <p style='color: white;'>Obrigada pelo interesse em nossos produtos!<br>Estamos comprometidos com a sustentabilidade e impulsionados pela paixão por inovação.<br>Obrigado por fazer parte dessa jornada conosco!<br>Seu formulário está nas mãos do nosso Time de Cadastros. Assim que o cadastro for concluído, entraremos em contato.</p>
+                <h1 style='color: #2dbecd; font-size: 40px;'>TWC</h1>
+                <p style='color: white;'>Aproveite seu desconto em nossa loja online: <a href='https://www.sigmaaldrich.com/BR/pt' target='_blank' style='color: #2dbecd;'>https://www.sigmaaldrich.com/BR/pt</a></p>
+            </div>
+            """,
+            unsafe_allow_html=True
+        )
+        st.balloons()
     else:
-        with st.spinner("Processando e enviando os dados..."):
-            with tempfile.TemporaryDirectory() as temp_dir:
-                filename = generate_unique_name("FICHA_CADASTRAL", nome_empresa)
-                temp_path = os.path.join(temp_dir, filename)
-
-                shutil.copy(TEMPLATE_PATH, temp_path)
-                save_to_excel(temp_path, data, cells_sold_to, cells_ship_to, image_keys)
-
-                files = [temp_path]
-                for doc in ["contrato_social", "cartao_cnpj", "balanco_patrimonial_ou_dre"]:
-                    if data.get(doc) is not None:
-                        temp_doc_path = os.path.join(temp_dir, f"{doc}_{uuid.uuid4()}.png")
-                        with open(temp_doc_path, "wb") as f:
-                            f.write(data[doc].getvalue())
-                        files.append(temp_doc_path)
-
-                subject = f"Formulário de Cadastro - {nome_empresa}"
-                body = f"Segue em anexo o arquivo preenchido para {nome_empresa}.\n\nEnviado automaticamente pelo formulário Streamlit."
-                if send_email(SENDER_EMAIL, RECEIVER_EMAIL, subject, body, files, EMAIL_PASSWORD):
-                    st.success("Formulário enviado com sucesso!")
-                    st.markdown(
-                        """
-                        <div style='text-align: center; padding: 20px; border: 2px solid rgb(235, 60, 150); border-radius: 10px; background-color: rgb(79, 53, 140);'>
-                            <h2 style='color: white;'>Formulário de cadastro enviado com sucesso!</h2>
-                            <p style='color: white;'>Obrigada pelo interesse em nossos produtos!<br>Estamos comprometidos com a sustentabilidade e impulsionados pela paixão por inovação.<br>Obrigado por fazer parte dessa jornada conosco!<br>Seu formulário está nas mãos do nosso Time de Cadastros. Assim que o cadastro for concluído, entraremos em contato.</p>
-                            <h1 style='color: #2dbecd; font-size: 40px;'>TWC</h1>
-                            <p style='color: white;'>Aproveite seu desconto em nossa loja online: <a href='https://www.sigmaaldrich.com/BR/pt' target='_blank' style='color: #2dbecd;'>https://www.sigmaaldrich.com/BR/pt</a></p>
-                        </div>
-                        """,
-                        unsafe_allow_html=True
-                    )
-                    st.balloons()
-                else:
-                    st.error("Falha ao enviar o e-mail. Verifique as credenciais ou a conexão.")
+        st.error(f"Erro ao enviar e-mail: {error}")
+        st.error("Falha ao enviar o e-mail. Verifique as credenciais ou a conexão.")
@@ -0,0 +1,134 @@
+import io
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image as PILImage, ImageOps
+
+# Normalização dos comprovantes antes de embutir na ficha e anexar ao e-mail:
+# corrige a orientação EXIF, limita as dimensões e recomprime para caber no orçamento de bytes.
+
+logger = logging.getLogger(__name__)
+
+MAX_DIMENSION = 2000
+MAX_BYTES = 800_000
+JPEG_QUALITIES = (85, 75, 65, 55)
+# Fator de redução aplicado quando nem a menor qualidade cabe no orçamento
+SHRINK_FACTOR = 0.75
+MIN_DIMENSION = 400
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+# Pool de threads compartilhado (o Pillow libera o GIL ao decodificar/codificar)
+def get_executor(max_workers=4):
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="image-normalize")
+        return _executor
+
+
+def _has_transparency(img):
+    if img.mode in ("RGBA", "LA"):
+        return img.getchannel("A").getextrema()[0] < 255
+    return img.mode == "P" and "transparency" in img.info
+
+
+# Orientação EXIF sem decodificar a imagem: no PNG, getexif() carrega a imagem inteira (o eXIf pode vir depois
+# dos dados), então só o eXIf do cabeçalho é considerado
+def _orientation(img, fmt):
+    if fmt != "png":
+        return img.getexif().get(0x0112, 1)
+    if not img.info.get("exif"):
+        return 1
+    exif = PILImage.Exif()
+    exif.load(img.info["exif"])
+    return exif.get(0x0112, 1)
+
+
+def _encode(img, fmt, quality=None):
+    buffer = io.BytesIO()
+    if fmt == "jpeg":
+        img.save(buffer, format="jpeg", quality=quality, optimize=True)
+    else:
+        img.save(buffer, format="png", optimize=True)
+    return buffer.getvalue()
+
+
+# Função para descobrir o formato real de uma imagem ("jpeg", "png", ...) lendo só o cabeçalho; None se não for imagem
+def image_format(blob):
+    try:
+        with PILImage.open(io.BytesIO(blob)) as img:
+            return (img.format or "").lower() or None
+    except Exception:
+        return None
+
+
+# Função para normalizar uma imagem; retorna (bytes, formato, relatório)
+def normalize_image(blob, max_dimension=MAX_DIMENSION, max_bytes=MAX_BYTES):
+    start = time.perf_counter()
+    with PILImage.open(io.BytesIO(blob)) as original:
+        source_format = (original.format or "").lower()
+        original_size = size = original.size
+        orientation = _orientation(original, source_format)
+
+        if orientation == 1 and max(size) <= max_dimension and len(blob) <= max_bytes and source_format in ("jpeg", "png"):
+            # Já está dentro dos limites: mantém os bytes originais, sem decodificar a imagem
+            result, fmt = blob, source_format
+        else:
+            if source_format == "jpeg":
+                # Decodifica o JPEG já reduzido (escala DCT), bem mais barato que decodificar em tamanho cheio
+                original.draft(None, (max_dimension, max_dimension))
+            img = ImageOps.exif_transpose(original)
+            img.thumbnail((max_dimension, max_dimension), PILImage.LANCZOS)
+            if _has_transparency(img):
+                img = img.convert("RGBA")
+                fmt = "png"
+            else:
+                img = img.convert("L" if img.mode in ("1", "L", "LA") else "RGB")
+                fmt = "jpeg"
+            while True:
+                if fmt == "png":
+                    result = _encode(img, fmt)
+                else:
+                    for quality in JPEG_QUALITIES:
+                        result = _encode(img, fmt, quality)
+                        if len(result) <= max_bytes:
+                            break
+                if len(result) <= max_bytes or max(img.size) <= MIN_DIMENSION:
+                    break
+                img = img.resize((max(1, int(img.width * SHRINK_FACTOR)), max(1, int(img.height * SHRINK_FACTOR))), PILImage.LANCZOS)
+            size = img.size
+
+        report = {
+            "original_bytes": len(blob),
+            "bytes": len(result),
+            "saved_bytes": len(blob) - len(result),
+            "original_size": original_size,
+            "size": size,
+            "format": fmt,
+            "seconds": round(time.perf_counter() - start, 4),
+        }
+    return result, fmt, report
+
+
+# Função para normalizar, em paralelo, os comprovantes de um envio
+# Retorna o novo dicionário de dados, os formatos ({chave: "jpeg"|"png"}) e o relatório por imagem
+def normalize_uploads(data, image_keys, max_dimension=MAX_DIMENSION, max_bytes=MAX_BYTES, executor=None):
+    keys = [key for key in image_keys if data.get(key) is not None]
+    executor = executor or get_executor()
+    futures = {key: executor.submit(normalize_image, data[key], max_dimension, max_bytes) for key in keys}
+
+    data = dict(data)
+    formats = {}
+    report = {}
+    for key, future in futures.items():
+        data[key], formats[key], report[key] = future.result()
+        logger.info("Imagem %s: %d -> %d bytes (%d economizados) em %.3fs",
+                    key, report[key]["original_bytes"], report[key]["bytes"], report[key]["saved_bytes"], report[key]["seconds"])
+    if report:
+        logger.info("Imagens normalizadas: %d, %d bytes economizados no total",
+                    len(report), sum(r["saved_bytes"] for r in report.values()))
+    return data, formats, report
@@ -0,0 +1,109 @@
+import queue
+import threading
+import time
+import uuid
+
+# Fila de processamento em segundo plano: os envios entram numa fila limitada e são
+# processados por um número fixo de threads. Cada envio recebe um job_id consultável.
+
+QUEUED = "queued"
+RUNNING = "running"
+RETRYING = "retrying"
+DONE = "done"
+FAILED = "failed"
+
+
+class QueueFull(Exception):
+    pass
+
+
+class Job:
+    def __init__(self, job_id):
+        self.job_id = job_id
+        self.status = QUEUED
+        self.attempts = 0
+        self.error = None
+        self.result = None
+        self.image_report = {}
+        self.created_at = time.time()
+        self.finished_at = None
+
+    @property
+    def finished(self):
+        return self.status in (DONE, FAILED)
+
+
+# Função para executar fn com novas tentativas e espera exponencial entre elas
+# on_retry(tentativa, exceção, espera) é chamado antes de cada nova tentativa
+def retry_call(fn, is_transient, max_attempts=3, backoff=2.0, on_retry=None, sleep=time.sleep):
+    attempt = 1
+    while True:
+        try:
+            return fn()
+        except Exception as e:
+            if attempt >= max_attempts or not is_transient(e):
+                raise
+            delay = backoff * (2 ** (attempt - 1))
+            if on_retry is not None:
+                on_retry(attempt, e, delay)
+            sleep(delay)
+            attempt += 1
+
+
+class JobQueue:
+    # handler(job, *args) faz o trabalho; o retorno vai para job.result e exceções marcam o job como FAILED
+    def __init__(self, handler, workers=2, max_pending=20, keep_finished=3600):
+        self.handler = handler
+        self.keep_finished = keep_finished
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._threads = []
+        for i in range(workers):
+            thread = threading.Thread(target=self._worker, name=f"submission-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    # Enfileira um envio; levanta QueueFull se a fila estiver cheia
+    def submit(self, *args):
+        job = Job(uuid.uuid4().hex)
+        with self._lock:
+            self._prune()
+            self._jobs[job.job_id] = job
+        try:
+            self._queue.put_nowait((job, args))
+        except queue.Full:
+            with self._lock:
+                del self._jobs[job.job_id]
+            raise QueueFull("Fila de envios cheia")
+        return job.job_id
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def pending(self):
+        return self._queue.qsize()
+
+    def _worker(self):
+        while True:
+            job, args = self._queue.get()
+            job.status = RUNNING
+            try:
+                job.result = self.handler(job, *args)
+                job.error = None
+                job.status = DONE
+            except Exception as e:
+                job.error = str(e)
+                job.status = FAILED
+            finally:
+                job.finished_at = time.time()
+                # Não manter os dados do último envio (comprovantes) vivos enquanto a thread espera o próximo
+                job = args = None
+                self._queue.task_done()
+
+    # Remove jobs concluídos há mais de keep_finished segundos
+    def _prune(self):
+        limit = time.time() - self.keep_finished
+        for job_id in [j for j, job in self._jobs.items() if job.finished and job.finished_at < limit]:
+            del self._jobs[job_id]
@@ -0,0 +1,392 @@
+import base64
+import hashlib
+import mimetypes
+import os
+import re
+import secrets
+import smtplib
+import tempfile
+import threading
+import time
+import zipfile
+from contextlib import contextmanager
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from email.mime.base import MIMEBase
+from email import encoders, policy
+from email.utils import getaddresses
+import streamlit as st
+import metrics
+
+SMTP_HOST = "smtp.gmail.com"
+SMTP_PORT = 587
+
+# Empacotamento dos anexos: "separate" (um anexo por arquivo) ou "zip" (um único .zip compactado com deflate)
+ATTACHMENT_MODES = ("separate", "zip")
+# Tamanho máximo de cada e-mail (já em base64); envios maiores são divididos em vários e-mails
+# (o Gmail recusa mensagens acima de 25 MB)
+MAX_MESSAGE_BYTES = 20 * 1024 * 1024
+# Bytes lidos por vez ao codificar um anexo em base64 (múltiplo de 57: cada 57 bytes viram uma linha de 76 caracteres)
+CHUNK_SIZE = 57 * 1024
+# Zips menores que isso ficam em memória; maiores vão para um arquivo temporário
+SPOOL_BYTES = 1024 * 1024
+HEADER_POLICY = policy.compat32.clone(linesep="\r\n")
+
+# Função para montar a mensagem com anexos
+# Cada item de files é um caminho de arquivo ou uma tupla (nome, bytes) com o conteúdo já em memória
+def build_message(sender_email, receiver_email, subject, body, files):
+    msg = MIMEMultipart()
+    msg['From'] = sender_email
+    msg['To'] = receiver_email
+    msg['Subject'] = subject
+    msg.attach(MIMEText(body, 'plain'))
+
+    for item in files:
+        if isinstance(item, tuple):
+            filename, content = item
+        else:
+            with open(item, 'rb') as f:
+                content = f.read()
+            filename = os.path.basename(item)
+        part = MIMEBase('application', 'vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+        part.set_payload(content)
+        encoders.encode_base64(part)
+        # filename como parâmetro: nomes com acento são codificados (RFC 2231) em vez de quebrar o cabeçalho
+        part.add_header('Content-Disposition', 'attachment', filename=filename)
+        msg.attach(part)
+        metrics.incr("attachment_bytes_total", len(content))
+    metrics.incr("attachments_total", len(files))
+    return msg
+
+# Função para remover anexos repetidos (mesmo conteúdo com outro nome, ex.: o mesmo PDF enviado como contrato social
+# e como cartão CNPJ); retorna (arquivos, notas), com uma nota para o corpo do e-mail por arquivo removido
+def dedupe_files(files):
+    unique, notes, seen = [], [], {}
+    for filename, content in files:
+        digest = hashlib.sha256(content).digest()
+        if digest in seen:
+            notes.append(f"{filename}: idêntico a {seen[digest]}, enviado uma única vez")
+            metrics.incr("attachments_deduplicated_total")
+            continue
+        seen[digest] = filename
+        unique.append((filename, content))
+    return unique, notes
+
+
+# Tamanho de um anexo depois de codificado em base64 (linhas de 76 caracteres + CRLF)
+def _encoded_size(size):
+    return (size + 56) // 57 * 78
+
+
+# Função para dividir os anexos em grupos que cabem em um e-mail de até max_bytes (ordem preservada)
+# Um arquivo maior que o limite sozinho vai em um e-mail próprio
+def _split(files, max_bytes, size=lambda item: _encoded_size(len(item[1]))):
+    groups, current, current_size = [], [], 0
+    for item in files:
+        item_size = size(item) + 1024  # cabeçalhos da parte
+        if current and current_size + item_size > max_bytes:
+            groups.append(current)
+            current, current_size = [], 0
+        current.append(item)
+        current_size += item_size
+    if current or not groups:
+        groups.append(current)
+    return groups
+
+
+# Função para compactar os arquivos em um zip (deflate) sem montar o zip inteiro na memória
+def _zip_bundle(files):
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_BYTES)
+    with zipfile.ZipFile(spool, "w", zipfile.ZIP_DEFLATED) as archive:
+        for filename, content in files:
+            with archive.open(filename, "w") as entry:
+                view = memoryview(content)
+                for start in range(0, len(view), CHUNK_SIZE):
+                    entry.write(view[start:start + CHUNK_SIZE])
+    spool.seek(0)
+    return spool
+
+
+# Função para empacotar os anexos em e-mails: retorna uma lista (um item por e-mail) de listas (nome, conteúdo),
+# em que o conteúdo são bytes ou, no modo "zip", um arquivo com o zip
+# O zip recebe o nome do primeiro arquivo (a ficha); seu tamanho é estimado pelo tamanho dos arquivos
+# (xlsx, PDF e imagens quase não diminuem com deflate)
+def package_files(files, mode="separate", max_bytes=MAX_MESSAGE_BYTES, bundle_name=None):
+    if mode not in ATTACHMENT_MODES:
+        raise ValueError(f"Modo de anexos inválido: {mode} (use {' ou '.join(ATTACHMENT_MODES)})")
+    groups = _split(files, max_bytes)
+    if mode == "separate" or not files:
+        return groups
+    base = os.path.splitext(bundle_name or files[0][0])[0]
+    return [[(f"{base}.zip" if len(groups) == 1 else f"{base}_parte{i}.zip", _zip_bundle(group))]
+            for i, group in enumerate(groups, 1)]
+
+
+# Lê o conteúdo de um anexo em blocos: bytes, memoryview ou arquivo aberto (zip)
+def _chunks(content):
+    if hasattr(content, "read"):
+        while chunk := content.read(CHUNK_SIZE * 16):
+            yield chunk
+        return
+    view = memoryview(content)
+    for start in range(0, len(view), CHUNK_SIZE * 16):
+        yield view[start:start + CHUNK_SIZE * 16]
+
+
+def _headers(msg):
+    return b"".join(HEADER_POLICY.fold_binary(name, value) for name, value in msg.items()) + b"\r\n"
+
+
+# Função para gerar a mensagem MIME em blocos de bytes, já no formato do comando DATA do SMTP
+# (CRLF e pontos no início de linha duplicados); cada anexo é codificado em base64 aos poucos,
+# então a mensagem nunca fica inteira na memória
+def iter_message(sender_email, receiver_email, subject, body, files):
+    boundary = f"==============={secrets.token_hex(16)}=="
+    msg = MIMEMultipart(boundary=boundary)
+    msg['From'] = sender_email
+    msg['To'] = receiver_email
+    msg['Subject'] = subject
+    yield _headers(msg)
+
+    text = MIMEText(body, 'plain').as_bytes(policy=HEADER_POLICY)
+    yield f"--{boundary}\r\n".encode() + re.sub(rb"(?m)^\.", b"..", text) + b"\r\n"
+    for filename, content in files:
+        content_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+        part = MIMEBase(*content_type.split("/"))
+        part['Content-Transfer-Encoding'] = 'base64'
+        part.add_header('Content-Disposition', 'attachment', filename=filename)
+        yield f"--{boundary}\r\n".encode() + _headers(part)
+        size = 0
+        pending = b""
+        for chunk in _chunks(content):
+            size += len(chunk)
+            data = pending + chunk
+            cut = len(data) - len(data) % 57
+            pending = bytes(data[cut:])
+            if cut:
+                # Linhas em base64 nunca começam com ".", então não precisam de escape
+                yield base64.encodebytes(data[:cut]).replace(b"\n", b"\r\n")
+        if pending:
+            yield base64.encodebytes(pending).replace(b"\n", b"\r\n")
+        metrics.incr("attachment_bytes_total", size)
+    metrics.incr("attachments_total", len(files))
+    yield f"--{boundary}--\r\n".encode()
+
+
+# Função para enviar uma mensagem gerada por iter_message em uma conexão SMTP já aberta, escrevendo os blocos
+# direto no socket (server.send_message montaria a mensagem inteira e ainda faria cópias dela)
+def stream_message(server, sender_email, receiver_email, subject, body, files):
+    receivers = [address for _, address in getaddresses([receiver_email])]
+    server.ehlo_or_helo_if_needed()
+    code, response = server.mail(sender_email)
+    if code != 250:
+        server.rset()
+        raise smtplib.SMTPSenderRefused(code, response, sender_email)
+    refused = {}
+    for address in receivers:
+        code, response = server.rcpt(address)
+        if code not in (250, 251):
+            refused[address] = (code, response)
+    if len(refused) == len(receivers):
+        server.rset()
+        raise smtplib.SMTPRecipientsRefused(refused)
+    code, response = server.docmd("data")
+    if code != 354:
+        server.rset()
+        raise smtplib.SMTPDataError(code, response)
+    size = 0
+    for chunk in iter_message(sender_email, receiver_email, subject, body, files):
+        server.send(chunk)
+        size += len(chunk)
+    server.send(b".\r\n")
+    code, response = server.getreply()
+    if code != 250:
+        raise smtplib.SMTPDataError(code, response)
+    metrics.incr("email_bytes_total", size)
+    return refused
+
+
+# Função para enviar os anexos empacotados em uma ou mais mensagens pela mesma conexão; com mais de uma,
+# o assunto recebe "(parte i/n)"; retorna quantas mensagens foram enviadas
+def send_packaged(server, sender_email, receiver_email, subject, body, files, mode="separate",
+                  max_bytes=MAX_MESSAGE_BYTES, bundle_name=None):
+    groups = package_files(files, mode, max_bytes, bundle_name)
+    try:
+        for i, group in enumerate(groups, 1):
+            part_subject = subject if len(groups) == 1 else f"{subject} (parte {i}/{len(groups)})"
+            part_body = body if i == 1 else f"Continuação do envio \"{subject}\" (parte {i}/{len(groups)})."
+            stream_message(server, sender_email, receiver_email, part_subject, part_body, group)
+    finally:
+        for group in groups:
+            for _, content in group:
+                if hasattr(content, "close"):
+                    content.close()
+    return len(groups)
+
+
+# Função para enviar e-mail com anexos
+# Com raise_errors=True a exceção do SMTP é propagada (usado pelos workers, que decidem se tentam de novo)
+# Com pool, a mensagem sai por uma conexão já autenticada do SMTPPool; sem pool, abre uma conexão
+# em host/port (com STARTTLS se starttls) só para este envio
+# mode e max_bytes definem o empacotamento dos anexos (ver package_files)
+def send_email(sender_email, receiver_email, subject, body, files, password, raise_errors=False, pool=None,
+               mode="separate", max_bytes=MAX_MESSAGE_BYTES, host=SMTP_HOST, port=SMTP_PORT, starttls=True):
+    files = [_read_file(item) for item in files]
+    try:
+        with metrics.stage("smtp.send"):
+            if pool is not None:
+                with pool.connection() as server:
+                    send_packaged(server, sender_email, receiver_email, subject, body, files, mode, max_bytes)
+            else:
+                server = connect(host, port, sender_email, password, starttls)
+                sent = False
+                try:
+                    send_packaged(server, sender_email, receiver_email, subject, body, files, mode, max_bytes)
+                    sent = True
+                finally:
+                    # Como no pool: depois de um erro no meio do DATA o QUIT ficaria esperando, então só fecha o socket
+                    if sent:
+                        _close_quietly(server)
+                    else:
+                        _close_socket(server)
+        metrics.incr("emails_sent_total")
+        return True
+    except Exception as e:
+        metrics.incr("email_errors_total", error=type(e).__name__)
+        if raise_errors:
+            raise
+        st.error(f"Erro ao enviar e-mail: {str(e)}")
+        return False
+
+
+# Item de files: caminho de arquivo ou tupla (nome, bytes)
+def _read_file(item):
+    if isinstance(item, tuple):
+        return item
+    with open(item, 'rb') as f:
+        return os.path.basename(item), f.read()
+
+# Função para identificar falhas de SMTP que valem uma nova tentativa (rede, timeout, respostas 4xx)
+def is_transient_smtp_error(exc):
+    if isinstance(exc, smtplib.SMTPRecipientsRefused):
+        return all(400 <= code < 500 for code, _ in exc.recipients.values())
+    if isinstance(exc, smtplib.SMTPResponseException):
+        return 400 <= exc.smtp_code < 500
+    if isinstance(exc, smtplib.SMTPServerDisconnected):
+        return True
+    if isinstance(exc, smtplib.SMTPException):
+        return False
+    return isinstance(exc, OSError)
+
+
+# Função para abrir uma conexão SMTP (com STARTTLS se starttls) e autenticar quando há senha
+def connect(host=SMTP_HOST, port=SMTP_PORT, username=None, password=None, starttls=True, timeout=30):
+    with metrics.stage("smtp.connect"):
+        server = smtplib.SMTP(host, port, timeout=timeout)
+        try:
+            if starttls:
+                server.starttls()
+            if password:
+                server.login(username, password)
+        except Exception:
+            _close_quietly(server)
+            raise
+    metrics.incr("smtp_connections_total")
+    return server
+
+
+# Pool de conexões SMTP autenticadas, reaproveitadas entre envios.
+# Conexões ociosas por mais de idle_timeout segundos são fechadas; antes de reutilizar
+# uma conexão é enviado um NOOP e, se ela tiver caído, outra é aberta no lugar.
+class SMTPPool:
+    def __init__(self, host=SMTP_HOST, port=SMTP_PORT, username=None, password=None, size=2,
+                 idle_timeout=60, starttls=True, timeout=30):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self.starttls = starttls
+        self.timeout = timeout
+        self._idle = []  # (conexão, instante em que ficou ociosa)
+        self._in_use = 0
+        self._cond = threading.Condition()
+
+    def _connect(self):
+        return connect(self.host, self.port, self.username, self.password, self.starttls, self.timeout)
+
+    # Fecha as conexões ociosas expiradas; chamado com o lock adquirido
+    def _reap(self):
+        limit = time.monotonic() - self.idle_timeout
+        expired = [server for server, since in self._idle if since < limit]
+        self._idle = [(server, since) for server, since in self._idle if since >= limit]
+        return expired
+
+    def _acquire(self):
+        with self._cond:
+            expired = self._reap()
+            while not self._idle and self._in_use >= self.size:
+                self._cond.wait()
+            server = self._idle.pop()[0] if self._idle else None
+            self._in_use += 1
+        for old in expired:
+            _close_quietly(old)
+
+        try:
+            if server is not None:
+                try:
+                    if server.noop()[0] == 250:
+                        return server
+                except (smtplib.SMTPException, OSError):
+                    pass
+                _close_quietly(server)
+            return self._connect()
+        except BaseException:
+            self._release(None)
+            raise
+
+    def _release(self, server):
+        with self._cond:
+            self._in_use -= 1
+            if server is not None:
+                self._idle.append((server, time.monotonic()))
+            self._cond.notify()
+
+    # Qualquer exceção dentro do bloco descarta a conexão: ela pode ter parado no meio de uma mensagem
+    # (DATA), e o próximo comando seria lido como corpo do e-mail. O lugar no pool é sempre devolvido
+    @contextmanager
+    def connection(self):
+        server = self._acquire()
+        reusable = False
+        try:
+            yield server
+            reusable = True
+        finally:
+            if not reusable:
+                # Sem QUIT, que também ficaria preso no DATA até o timeout
+                _close_socket(server)
+            self._release(server if reusable else None)
+
+    def close(self):
+        with self._cond:
+            idle, self._idle = self._idle, []
+        for server, _ in idle:
+            _close_quietly(server)
+
+
+def _close_socket(server):
+    try:
+        server.close()
+    except Exception:
+        pass
+
+
+def _close_quietly(server):
+    try:
+        server.quit()
+    except Exception:
+        try:
+            server.close()
+        except Exception:
+            pass
@@ -0,0 +1,181 @@
+import contextvars
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import nullcontext
+
+# Medições por etapa do envio (validação, template, Excel, imagens, SMTP) e contadores.
+# Desligado por padrão: nesse caso stage() devolve um contexto vazio compartilhado e incr() retorna
+# na primeira linha, então os pontos de medição custam praticamente nada.
+#
+# Exportação:
+# - um log JSON por envio (logger "metrics"), com o tempo de cada etapa;
+# - snapshot no formato texto do Prometheus (prometheus_text / write_prometheus).
+
+logger = logging.getLogger("metrics")
+
+PREFIX = "forms_"
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_enabled = False
+_lock = threading.Lock()
+_counters = {}    # (nome, labels) -> valor
+_histograms = {}  # etapa -> [contagens por bucket, soma, total]
+_NOOP = nullcontext()
+_trace = contextvars.ContextVar("metrics_trace", default=None)
+
+
+# Função para ligar/desligar as medições; json_logs adiciona um handler que escreve uma linha JSON por envio
+def configure(enabled=True, json_logs=True, stream=None):
+    global _enabled
+    _enabled = enabled
+    if enabled and json_logs and not logger.handlers:
+        handler = logging.StreamHandler(stream or sys.stderr)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+
+
+def enabled():
+    return _enabled
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+
+
+class _Stage:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        observe(self.name, time.perf_counter() - self.start)
+        return False
+
+
+# Função para medir uma etapa: with metrics.stage("excel.save"): ...
+def stage(name):
+    if not _enabled:
+        return _NOOP
+    return _Stage(name)
+
+
+# Função para registrar a duração de uma etapa medida fora de stage()
+def observe(name, seconds):
+    if not _enabled:
+        return
+    with _lock:
+        histogram = _histograms.get(name)
+        if histogram is None:
+            histogram = _histograms[name] = [[0] * len(BUCKETS), 0.0, 0]
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                histogram[0][i] += 1
+        histogram[1] += seconds
+        histogram[2] += 1
+    current = _trace.get()
+    if current is not None:
+        current["stages"][name] = round(current["stages"].get(name, 0.0) + seconds, 6)
+
+
+# Função para incrementar um contador, ex.: incr("submissions_total", status="ok")
+def incr(name, amount=1, **labels):
+    if not _enabled:
+        return
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+    current = _trace.get()
+    if current is not None:
+        current["counters"][name] = current["counters"].get(name, 0) + amount
+
+
+class _Trace:
+    def __init__(self, event, fields):
+        self.record = {"event": event, **fields, "stages": {}, "counters": {}}
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        self.token = _trace.set(self.record)
+        return self.record
+
+    def __exit__(self, exc_type, exc, tb):
+        _trace.reset(self.token)
+        self.record["status"] = "ok" if exc_type is None else "error"
+        if exc_type is not None:
+            self.record["error"] = exc_type.__name__
+        self.record["total_seconds"] = round(time.perf_counter() - self.start, 6)
+        self.record["timestamp"] = time.strftime("%Y-%m-%dT%H:%M:%S%z")
+        logger.info(json.dumps(self.record, ensure_ascii=False, default=str))
+        return False
+
+
+# Função para agrupar as etapas de um envio em uma única linha de log JSON
+def trace(event, **fields):
+    if not _enabled:
+        return _NOOP
+    return _Trace(event, fields)
+
+
+def snapshot():
+    with _lock:
+        return {
+            "counters": [{"name": name, "labels": dict(labels), "value": value}
+                         for (name, labels), value in sorted(_counters.items())],
+            "stages": {name: {"count": count, "sum": round(total, 6),
+                              "buckets": dict(zip([str(b) for b in BUCKETS], buckets))}
+                       for name, (buckets, total, count) in sorted(_histograms.items())},
+        }
+
+
+def _labels(pairs):
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, value in pairs)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(pairs, escaped)) + "}"
+
+
+# Função para gerar o snapshot no formato texto do Prometheus
+def prometheus_text(prefix=PREFIX):
+    lines = []
+    with _lock:
+        counters = sorted(_counters.items())
+        histograms = sorted((name, (list(b), s, c)) for name, (b, s, c) in _histograms.items())
+    declared = set()
+    for (name, labels), value in counters:
+        if name not in declared:
+            lines.append(f"# TYPE {prefix}{name} counter")
+            declared.add(name)
+        lines.append(f"{prefix}{name}{_labels(labels)} {value}")
+    if histograms:
+        metric = f"{prefix}stage_seconds"
+        lines.append(f"# HELP {metric} Duração de cada etapa do envio em segundos.")
+        lines.append(f"# TYPE {metric} histogram")
+        for name, (buckets, total, count) in histograms:
+            for bound, value in zip(BUCKETS, buckets):
+                lines.append(f'{metric}_bucket{{stage="{name}",le="{bound}"}} {value}')
+            lines.append(f'{metric}_bucket{{stage="{name}",le="+Inf"}} {count}')
+            lines.append(f'{metric}_sum{{stage="{name}"}} {total:.6f}')
+            lines.append(f'{metric}_count{{stage="{name}"}} {count}')
+    return "\n".join(lines) + "\n"
+
+
+# Função para gravar o snapshot em arquivo (ex.: diretório do textfile collector do node_exporter)
+# A escrita é atômica para que o coletor nunca leia um arquivo pela metade
+def write_prometheus(path, prefix=PREFIX):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(prometheus_text(prefix))
+    os.replace(tmp, path)
@@ -0,0 +1,234 @@
+import hashlib
+import json
+import logging
+import smtplib
+import sqlite3
+import threading
+import time
+import metrics
+from mailer import MAX_MESSAGE_BYTES, is_transient_smtp_error, send_packaged
+
+# Caixa de saída durável (SQLite em modo WAL): cada ficha gerada e seus anexos são gravados antes do envio.
+# A chave de cada envio é um hash do conteúdo do formulário, então envios repetidos (duplo clique,
+# reenvio após erro) não geram e-mails duplicados nem uma nova ficha. Um Dispatcher em segundo plano
+# envia em lotes o que ficou pendente, inclusive depois de reiniciar o processo.
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+SENDING = "sending"
+SENT = "sent"
+FAILED = "failed"
+
+# Um envio em "sending" há mais que isso (processo caiu no meio) volta a poder ser enviado
+LEASE_SECONDS = 300
+KEEP_FILES = 7 * 24 * 3600
+KEEP_KEYS = 90 * 24 * 3600
+# Envios com falha definitiva que ninguém reenviou são apagados (com os anexos) depois disso
+KEEP_FAILED = 30 * 24 * 3600
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    key TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    sender TEXT NOT NULL,
+    receiver TEXT NOT NULL,
+    subject TEXT NOT NULL,
+    body TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    created_at REAL NOT NULL,
+    claimed_at REAL,
+    sent_at REAL
+);
+CREATE INDEX IF NOT EXISTS outbox_status ON outbox (status, created_at);
+CREATE TABLE IF NOT EXISTS outbox_files (
+    key TEXT NOT NULL REFERENCES outbox (key) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    filename TEXT NOT NULL,
+    content BLOB NOT NULL,
+    PRIMARY KEY (key, position)
+);
+"""
+
+
+# Função para calcular a chave de um envio: hash do formulário normalizado e do conteúdo de cada imagem
+# Textos são comparados sem espaços nas pontas e "" equivale a campo não preenchido
+def submission_key(data, image_keys):
+    normalized = {}
+    for key, value in data.items():
+        if key in image_keys:
+            value = hashlib.sha256(value).hexdigest() if value is not None else None
+        elif isinstance(value, str):
+            value = value.strip() or None
+        normalized[key] = value
+    payload = json.dumps(normalized, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class Outbox:
+    # attachment_mode e max_message_bytes: empacotamento dos anexos no envio (ver mailer.package_files)
+    def __init__(self, path="outbox.db", lease=LEASE_SECONDS, attachment_mode="separate", max_message_bytes=MAX_MESSAGE_BYTES):
+        self.path = path
+        self.lease = lease
+        self.attachment_mode = attachment_mode
+        self.max_message_bytes = max_message_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        self._conn.executescript(SCHEMA)
+
+    def _transaction(self, fn):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn(self._conn)
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+            return result
+
+    def status(self, key):
+        with self._lock:
+            row = self._conn.execute("SELECT status FROM outbox WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    # Grava a mensagem e os anexos; retorna False se a chave já existir
+    # files: lista de tuplas (nome, bytes), como em mailer.send_email
+    def add(self, key, sender, receiver, subject, body, files):
+        def insert(conn):
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO outbox (key, status, sender, receiver, subject, body, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, PENDING, sender, receiver, subject, body, time.time()))
+            if cursor.rowcount == 0:
+                return False
+            conn.executemany("INSERT INTO outbox_files (key, position, filename, content) VALUES (?, ?, ?, ?)",
+                             [(key, i, filename, content) for i, (filename, content) in enumerate(files)])
+            return True
+
+        with metrics.stage("outbox.write"):
+            return self._transaction(insert)
+
+    # Reserva envios para quem chamou; keys=None pega os pendentes mais antigos
+    # Envios com falha definitiva só são reservados quando pedidos pela chave (reenvio pelo formulário)
+    def claim(self, keys=None, limit=20):
+        def update(conn):
+            now = time.time()
+            stale = now - self.lease
+            if keys is None:
+                rows = conn.execute(
+                    "SELECT key FROM outbox WHERE status = ? OR (status = ? AND claimed_at < ?) ORDER BY created_at LIMIT ?",
+                    (PENDING, SENDING, stale, limit)).fetchall()
+            else:
+                rows = conn.execute(
+                    f"SELECT key FROM outbox WHERE key IN ({','.join('?' * len(keys))}) "
+                    "AND (status IN (?, ?) OR (status = ? AND claimed_at < ?))",
+                    (*keys, PENDING, FAILED, SENDING, stale)).fetchall()
+            claimed = [row[0] for row in rows]
+            conn.executemany("UPDATE outbox SET status = ?, claimed_at = ?, attempts = attempts + 1 WHERE key = ?",
+                             [(SENDING, now, key) for key in claimed])
+            return claimed
+
+        return self._transaction(update)
+
+    # Carrega a mensagem gravada: (remetente, destinatário, assunto, corpo, [(nome, bytes)])
+    def message(self, key):
+        with self._lock:
+            sender, receiver, subject, body = self._conn.execute(
+                "SELECT sender, receiver, subject, body FROM outbox WHERE key = ?", (key,)).fetchone()
+            files = self._conn.execute(
+                "SELECT filename, content FROM outbox_files WHERE key = ? ORDER BY position", (key,)).fetchall()
+        return sender, receiver, subject, body, files
+
+    def _set_status(self, keys, status, error=None):
+        sent_at = time.time() if status == SENT else None
+        self._transaction(lambda conn: conn.executemany(
+            "UPDATE outbox SET status = ?, last_error = ?, sent_at = ?, claimed_at = NULL WHERE key = ?",
+            [(status, error, sent_at, key) for key in keys]))
+
+    # Envia os envios reservados por uma única conexão do pool, marcando cada um como enviado
+    # Em caso de erro o envio atual volta a pendente (erro temporário) ou fica como falha, os demais
+    # voltam a pendente e a exceção é propagada
+    def deliver(self, keys, pool):
+        keys = list(keys)
+        done = 0
+        try:
+            with pool.connection() as server:
+                for key in keys:
+                    sender, receiver, subject, body, files = self.message(key)
+                    with metrics.stage("smtp.send"):
+                        send_packaged(server, sender, receiver, subject, body, files, self.attachment_mode,
+                                      self.max_message_bytes)
+                    self._set_status([key], SENT)
+                    done += 1
+                    metrics.incr("emails_sent_total")
+        except Exception as e:
+            if done < len(keys):
+                self._set_status([keys[done]], PENDING if is_transient_smtp_error(e) else FAILED, str(e))
+                self._set_status(keys[done + 1:], PENDING)
+            raise
+        return done
+
+    # Envia até batch_size pendentes; retorna quantos foram enviados
+    def dispatch(self, pool, batch_size=20):
+        keys = self.claim(limit=batch_size)
+        if not keys:
+            return 0
+        return self.deliver(keys, pool)
+
+    # Remove os anexos de envios já feitos há mais de keep_files segundos; a chave é mantida por
+    # keep_keys segundos para continuar evitando duplicados. Envios com falha criados há mais de keep_failed
+    # segundos são removidos por inteiro (um reenvio pelo formulário grava um novo)
+    def purge(self, keep_files=KEEP_FILES, keep_keys=KEEP_KEYS, keep_failed=KEEP_FAILED):
+        now = time.time()
+
+        def delete(conn):
+            conn.execute("DELETE FROM outbox_files WHERE key IN (SELECT key FROM outbox WHERE status = ? AND sent_at < ?)",
+                         (SENT, now - keep_files))
+            conn.execute("DELETE FROM outbox WHERE status = ? AND sent_at < ?", (SENT, now - keep_keys))
+            conn.execute("DELETE FROM outbox_files WHERE key IN (SELECT key FROM outbox WHERE status = ? AND created_at < ?)",
+                         (FAILED, now - keep_failed))
+            conn.execute("DELETE FROM outbox WHERE status = ? AND created_at < ?", (FAILED, now - keep_failed))
+
+        self._transaction(delete)
+
+    def counts(self):
+        with self._lock:
+            return dict(self._conn.execute("SELECT status, COUNT(*) FROM outbox GROUP BY status").fetchall())
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+# Thread que esvazia a caixa de saída em lotes a cada interval segundos (e logo ao iniciar,
+# para enviar o que ficou pendente antes de o processo reiniciar)
+class Dispatcher:
+    def __init__(self, outbox, pool, interval=30, batch_size=20):
+        self.outbox = outbox
+        self.pool = pool
+        self.interval = interval
+        self.batch_size = batch_size
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="outbox-dispatcher", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                while self.outbox.dispatch(self.pool, self.batch_size) == self.batch_size:
+                    pass
+                self.outbox.purge()
+            except (smtplib.SMTPException, OSError) as e:
+                logger.warning("Falha ao enviar pendentes da caixa de saída: %s", e)
+            except Exception:
+                logger.exception("Erro no dispatcher da caixa de saída")
+            if self._stop.wait(self.interval):
+                return
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
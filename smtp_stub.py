@@ -0,0 +1,79 @@
+import socketserver
+import threading
+
+# Servidor SMTP mínimo, em processo, para benchmarks e testes locais.
+# Aceita qualquer remetente/destinatário, não exige TLS nem login e guarda só o tamanho das mensagens.
+#
+# Uso:
+#     with SMTPStub() as stub:
+#         pool = SMTPPool("127.0.0.1", stub.port, starttls=False)
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        stub = self.server.stub
+        with stub.lock:
+            stub.connections += 1
+        self._reply("220 smtp-stub ready")
+        in_data = False
+        size = 0
+        for line in self.rfile:
+            if in_data:
+                if line in (b".\r\n", b".\n"):
+                    with stub.lock:
+                        stub.messages += 1
+                        stub.bytes_received += size
+                    in_data = False
+                    self._reply("250 OK")
+                else:
+                    size += len(line)
+                continue
+            command = line[:4].upper()
+            if command in (b"EHLO", b"HELO"):
+                self._reply("250-smtp-stub", "250-8BITMIME", "250 SIZE 104857600")
+            elif command == b"DATA":
+                in_data = True
+                size = 0
+                self._reply("354 End data with <CR><LF>.<CR><LF>")
+            elif command == b"QUIT":
+                self._reply("221 Bye")
+                return
+            else:
+                # MAIL, RCPT, RSET, NOOP
+                self._reply("250 OK")
+
+    def _reply(self, *lines):
+        self.wfile.write("".join(f"{line}\r\n" for line in lines).encode("ascii"))
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class SMTPStub:
+    def __init__(self, host="127.0.0.1", port=0):
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.messages = 0
+        self.bytes_received = 0
+        self._server = _Server((host, port), _Handler)
+        self._server.stub = self
+        self.host, self.port = self._server.server_address
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="smtp-stub", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+        return False
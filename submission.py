@@ -0,0 +1,177 @@
+import logging
+import time
+import jobs
+import metrics
+from concurrent.futures.process import BrokenProcessPool
+from ficha import TEMPLATES, freeze_uploads, get_render_executor, render_templates, shutdown_render_executors
+from images import image_format, normalize_uploads, get_executor, MAX_DIMENSION, MAX_BYTES
+from mailer import MAX_MESSAGE_BYTES, dedupe_files, send_email, is_transient_smtp_error
+from outbox import SENT, SENDING, submission_key
+
+logger = logging.getLogger(__name__)
+
+# Documentos que, além de embutidos na ficha, vão como anexos separados no e-mail
+ATTACHED_DOCS = ["contrato_social", "cartao_cnpj", "balanco_patrimonial_ou_dre"]
+
+
+# Função para processar um envio completo: gera a ficha, monta os anexos e envia o e-mail
+# settings: dicionário com credenciais, template, engine, mapas de células e política de novas tentativas
+# Retorna SENT, ou SENDING quando o mesmo cadastro já está sendo enviado por outro worker (o envio ainda pode falhar)
+def process_submission(job, data, settings):
+    try:
+        with metrics.trace("submission", job_id=job.job_id if job is not None else None,
+                           engine=settings.get("excel_engine", "openpyxl")):
+            if job is not None:
+                metrics.observe("queue.wait", time.time() - job.created_at)
+            result, delivered = _process(job, data, settings)
+        metrics.incr("submissions_total", status="ok")
+        # Só um envio que gerou e enviou o e-mail agora entra no índice e no arquivo; um envio repetido
+        # (já enviado ou sendo enviado por outro worker) não gera uma segunda linha
+        if delivered:
+            _record_customer(data, settings)
+            _archive_submission(data, settings)
+        return result
+    except Exception:
+        metrics.incr("submissions_total", status="failed")
+        raise
+    finally:
+        if metrics.enabled() and settings.get("metrics_file"):
+            metrics.write_prometheus(settings["metrics_file"])
+
+
+# Função para registrar o cliente no índice de cadastros após o envio; uma falha aqui não invalida o envio
+def _record_customer(data, settings):
+    customers = settings.get("customers")
+    if customers is None:
+        return
+    try:
+        customers.add(data)
+    except Exception:
+        logger.exception("Falha ao registrar o cliente no índice de cadastros")
+
+
+# Função para guardar os campos do cadastro no arquivo de relatórios (gravado em lotes por outra thread)
+def _archive_submission(data, settings):
+    archive = settings.get("archive")
+    if archive is None:
+        return
+    try:
+        archive.append(data)
+    except Exception:
+        logger.exception("Falha ao guardar o cadastro no arquivo de relatórios")
+
+
+# Retorna (resultado, delivered): delivered indica se o e-mail foi enviado nesta chamada
+def _process(job, data, settings):
+    nome_empresa = data["nome_empresa"]
+    # Os bytes de cada upload são copiados uma vez e compartilhados entre a ficha e os anexos
+    with metrics.stage("uploads.freeze"):
+        data = freeze_uploads(data, settings["image_keys"])
+
+    # Com a caixa de saída, um envio repetido reaproveita a ficha já gerada (ou não é reenviado)
+    outbox = settings.get("outbox")
+    if outbox is not None:
+        key = submission_key(data, settings["image_keys"])
+        status = outbox.status(key)
+        if status == SENT:
+            metrics.incr("outbox_duplicates_total")
+            return SENT, False
+        if status is not None:
+            # Pendente, com falha ou sendo enviado: só é enviado aqui se não estiver reservado por outro worker
+            # (ou se a reserva expirou)
+            return _outcome(_send(job, settings, lambda: _deliver(outbox, key, settings["smtp_pool"])))
+
+    formats = {}
+    if settings.get("image_normalize", True):
+        with metrics.stage("images.normalize"):
+            data, formats, report = normalize_uploads(data, settings["image_keys"],
+                                                      max_dimension=settings.get("image_max_dimension", MAX_DIMENSION),
+                                                      max_bytes=settings.get("image_max_bytes", MAX_BYTES),
+                                                      executor=get_executor(settings.get("image_workers", 4)))
+        if job is not None:
+            job.image_report = report
+
+    engine = settings.get("excel_engine", "openpyxl")
+    specs = _selected_templates(settings)
+    workers = settings.get("render_workers", len(specs))
+    with metrics.stage("excel.total"):
+        try:
+            files = render_templates(specs, data, settings["image_keys"], engine=engine,
+                                     use_cache=settings.get("template_cache", True),
+                                     executor=get_render_executor(engine, workers) if workers > 1 else None)
+        except BrokenProcessPool:
+            shutdown_render_executors(engine)
+            raise
+    for doc in ATTACHED_DOCS:
+        if data.get(doc) is not None:
+            # Sem normalização o arquivo vai como foi enviado: a extensão vem do formato real, não do campo
+            fmt = formats.get(doc) or image_format(data[doc])
+            extension = {"jpeg": "jpg"}.get(fmt, fmt or "bin")
+            files.append((f"{doc}.{extension}", data[doc]))
+
+    # O mesmo arquivo enviado em mais de um campo vai anexado uma única vez
+    files, duplicates = dedupe_files(files)
+
+    subject = f"Formulário de Cadastro - {nome_empresa}"
+    body = f"Segue em anexo o arquivo preenchido para {nome_empresa}.\n\nEnviado automaticamente pelo formulário Streamlit."
+    if duplicates:
+        body += "\n\nArquivos repetidos:\n" + "\n".join(f"- {note}" for note in duplicates)
+
+    if outbox is not None:
+        outbox.add(key, settings["sender_email"], settings["receiver_email"], subject, body, files)
+        return _outcome(_send(job, settings, lambda: _deliver(outbox, key, settings["smtp_pool"])))
+    _send(job, settings, lambda: send_email(settings["sender_email"], settings["receiver_email"], subject, body,
+                                            files, settings["password"], raise_errors=True,
+                                            pool=settings.get("smtp_pool"),
+                                            mode=settings.get("attachment_mode", "separate"),
+                                            max_bytes=settings.get("max_message_bytes", MAX_MESSAGE_BYTES)))
+    return SENT, True
+
+
+def _outcome(delivered):
+    if not delivered:
+        metrics.incr("outbox_duplicates_total")
+    return (SENT if delivered else SENDING), delivered
+
+
+# Função para obter os templates do envio: settings["templates"] lista nomes do registro (ou dicionários de
+# template); sem ela é usado um único template montado a partir de template_path e dos mapas de células
+def _selected_templates(settings):
+    if settings.get("templates"):
+        return [TEMPLATES[template] if isinstance(template, str) else template for template in settings["templates"]]
+    return [{
+        "path": settings["template_path"],
+        "prefix": "FICHA_CADASTRAL",
+        "sheet_sold_to": settings.get("sheet_sold_to", "Dados de faturamento"),
+        "sheet_ship_to": settings.get("sheet_ship_to", "Dados de entrega"),
+        "cells_sold_to": settings["cells_sold_to"],
+        "cells_ship_to": settings["cells_ship_to"],
+    }]
+
+
+# Função para enviar um envio da caixa de saída; se outro worker (ou o Dispatcher) já o reservou, não faz nada
+# Retorna True se o e-mail foi enviado nesta chamada
+def _deliver(outbox, key, pool):
+    keys = outbox.claim([key])
+    if keys:
+        outbox.deliver(keys, pool)
+    return bool(keys)
+
+
+# Função para executar o envio com novas tentativas, atualizando o job
+def _send(job, settings, deliver):
+    def send():
+        if job is not None:
+            job.attempts += 1
+        return deliver()
+
+    def on_retry(attempt, exc, delay):
+        metrics.incr("smtp_retries_total")
+        if job is not None:
+            job.status = jobs.RETRYING
+            job.error = str(exc)
+
+    return jobs.retry_call(send, is_transient_smtp_error,
+                           max_attempts=settings.get("smtp_max_attempts", 3),
+                           backoff=settings.get("smtp_retry_backoff", 2.0),
+                           on_retry=on_retry)
@@ -0,0 +1,106 @@
+import io
+import json
+import random
+from validation import UFS
+
+# Dados sintéticos para os benchmarks e os testes: imagens parecidas com fotos de documentos, o dicionário data do
+# formulário, uma base de CEPs no formato dos Correios e o corpo multipart enviado por um parceiro à API.
+
+IMAGE_SIZES = {
+    "small": (640, 480),
+    "medium": (1600, 1200),
+    "large": (4000, 3000),
+}
+
+
+# Função para gerar uma imagem sintética parecida com a foto de um documento (ruído + texto claro/escuro)
+def synthetic_image(size, seed=0, fmt="JPEG"):
+    from PIL import Image, ImageDraw
+    rng = random.Random(seed)
+    width, height = IMAGE_SIZES[size]
+    img = Image.effect_noise((width, height), 24).convert("RGB")
+    draw = ImageDraw.Draw(img)
+    for y in range(0, height, 24):
+        draw.line((rng.randrange(width // 4), y, rng.randrange(width // 2, width), y), fill=(20, 20, 20), width=3)
+    buffer = io.BytesIO()
+    img.save(buffer, format=fmt, quality=92)
+    return buffer.getvalue()
+
+
+# Função para gerar um dicionário data igual ao do formulário, com n_images comprovantes
+def synthetic_data(n_images=8, shipping=False, image_size="medium", seed=0):
+    from ficha import image_keys
+    data = {
+        "nome_empresa": f"Empresa Sintética {seed} Ltda",
+        "cnpj": "33.069.212/0038-76",
+        "inscricao_estadual": "123.456.789.000",
+        "n_suframa": "",
+        "cod_df": "",
+        "telefone_fixo": "(11) 4444-5555",
+        "celular": "(11) 98888-7777",
+        "email": "fiscal@empresa.com.br",
+        "endereco": "Alameda Xingu",
+        "endereco_n": "350",
+        "endereco_bairro": "Alphaville Industrial",
+        "cep": "06455-030",
+        "cidade": "Barueri",
+        "uf": "SP",
+        "caixa_postal": "",
+        "sigla_universidade": "USP",
+        "sigla_instituto": "IQ",
+        "departamento": "Química Fundamental",
+        "laboratorio": "Lab 12",
+        "bloco_predio": "B",
+        "andar": "2",
+        "sala": "204",
+        "shipping_address": shipping,
+        "nome_contato": "Maria Silva",
+        "cargo": "Compradora",
+        "email_contato": "maria@empresa.com.br",
+        "telefone_contato": "(11) 97777-6666",
+        "tipo_empresa": "Privada",
+        "uso_produtos": "C3 = Consumidor Final: ICMS + IPI",
+        "area_atuacao_empresa": "Academy",
+        "tipo_contribuicao": "Contribuinte",
+    }
+    for key in ["endereco", "endereco_n", "endereco_bairro", "cep", "cidade", "uf", "caixa_postal",
+                "sigla_universidade", "sigla_instituto", "departamento", "laboratorio", "bloco_predio", "andar", "sala"]:
+        data[f"shipping_{key}"] = data[key] if shipping else None
+    keys = [key for key in image_keys if key != "shipping_comprovante_endereco"]
+    for i, key in enumerate(keys):
+        data[key] = io.BytesIO(synthetic_image(image_size, seed + i)) if i < n_images else None
+    return data
+
+
+# Função para gerar um CSV de CEPs no formato dos Correios, com cardinalidades parecidas com as reais
+# (cerca de 5.570 cidades, 60 mil bairros e 600 mil logradouros); retorna os CEPs gerados
+def synthetic_cep_csv(path, rows, seed=0):
+    import numpy as np
+    import pandas as pd
+    rng = np.random.default_rng(seed)
+    ceps = np.unique(rng.integers(1_000_000, 99_999_999, size=int(rows * 1.01)))[:rows]
+    rng.shuffle(ceps)
+    cidade = rng.integers(0, 5570, size=len(ceps))
+    frame = pd.DataFrame({
+        "cep": pd.Series(ceps).map("{:08d}".format),
+        "logradouro": "Rua Sintética " + pd.Series(rng.integers(0, 600_000, size=len(ceps))).astype(str),
+        "bairro": "Bairro " + pd.Series(rng.integers(0, 60_000, size=len(ceps))).astype(str),
+        "cidade": "Cidade " + pd.Series(cidade).astype(str),
+        "uf": pd.Series(cidade % len(UFS)).map(UFS.__getitem__),
+    })
+    frame.to_csv(path, sep=";", index=False)
+    return ceps
+
+
+# Função para montar um corpo multipart/form-data igual ao enviado por um parceiro: JSON em "data" e os comprovantes
+def multipart_body(data, image_keys):
+    boundary = "synthetic-boundary-7d1f"
+    fields = {key: value for key, value in data.items() if key not in image_keys}
+    parts = [f'--{boundary}\r\nContent-Disposition: form-data; name="data"\r\n'
+             f'Content-Type: application/json\r\n\r\n'.encode() + json.dumps(fields).encode() + b"\r\n"]
+    for key in image_keys:
+        if data.get(key) is not None:
+            parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{key}"; filename="{key}.jpg"\r\n'
+                         f'Content-Type: image/jpeg\r\n\r\n'.encode() + data[key].getvalue() + b"\r\n")
+    parts.append(f"--{boundary}--\r\n".encode())
+    return b"".join(parts), f"multipart/form-data; boundary={boundary}"
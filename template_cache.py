@@ -0,0 +1,32 @@
+import io
+import os
+import threading
+
+# Cache, por processo, do conteúdo bruto dos templates Excel.
+# Cada entrada guarda (mtime, bytes); se o arquivo for alterado no disco a entrada é recarregada.
+_cache = {}
+_lock = threading.Lock()
+
+# Função para ler o template do disco (sem cache)
+def _read_template(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+# Função para obter uma cópia privada do template, pronta para o load_workbook
+def load_template(path, use_cache=True):
+    if not use_cache:
+        return io.BytesIO(_read_template(path))
+
+    mtime = os.stat(path).st_mtime_ns
+    with _lock:
+        entry = _cache.get(path)
+        if entry is None or entry[0] != mtime:
+            entry = (mtime, _read_template(path))
+            _cache[path] = entry
+    # BytesIO sobre bytes imutáveis só copia o buffer se houver escrita
+    return io.BytesIO(entry[1])
+
+# Função para limpar o cache (útil em testes e benchmarks)
+def clear_template_cache():
+    with _lock:
+        _cache.clear()
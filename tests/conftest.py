@@ -0,0 +1,21 @@
+import os
+import sys
+import pytest
+
+# Os módulos do projeto ficam na raiz do repositório (sem pacote)
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+@pytest.fixture
+def smtp():
+    from smtp_stub import SMTPStub
+    with SMTPStub() as stub:
+        yield stub
+
+
+# Dicionário data do formulário com dois comprovantes pequenos
+@pytest.fixture
+def form_data():
+    from synthetic import synthetic_data
+    return synthetic_data(n_images=2, image_size="small")
@@ -0,0 +1,89 @@
+import asyncio
+import json
+import pytest
+import api
+from synthetic import multipart_body
+from ficha import image_keys
+
+
+@pytest.fixture(scope="module")
+def app():
+    return api.create_app({"image_keys": image_keys}, workers=1, max_pending=1)
+
+
+# Chama a aplicação ASGI diretamente, enviando o corpo em blocos (sem Content-Length, como em Transfer-Encoding:
+# chunked); retorna (status, JSON da resposta, blocos lidos pela aplicação)
+def _post(app, body, content_type, chunk_size=1024):
+    chunks = [body[i:i + chunk_size] for i in range(0, len(body), chunk_size)] or [b""]
+    received = []
+    messages = []
+
+    async def receive():
+        if len(received) < len(chunks):
+            received.append(chunks[len(received)])
+            return {"type": "http.request", "body": received[-1], "more_body": len(received) < len(chunks)}
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {"type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST", "scheme": "http",
+             "path": "/submissions", "raw_path": b"/submissions", "query_string": b"", "root_path": "",
+             "headers": [(b"content-type", content_type.encode("latin-1"))], "client": ("127.0.0.1", 1), "server": ("127.0.0.1", 80)}
+    asyncio.run(app(scope, receive, send))
+    status = messages[0]["status"]
+    payload = b"".join(message.get("body", b"") for message in messages[1:])
+    return status, json.loads(payload), len(received)
+
+
+def test_incomplete_form_is_rejected_with_422(app):
+    body, content_type = multipart_body({"nome_empresa": "ACME", "cnpj": "123²"}, image_keys)
+    status, payload, _ = _post(app, body, content_type)
+    assert status == 422
+    assert "cnpj" in payload["invalid_fields"]
+
+
+def test_chunked_json_over_the_request_limit_is_rejected(app, monkeypatch):
+    monkeypatch.setattr(api, "MAX_REQUEST_BYTES", 4096)
+    body = json.dumps({"nome_empresa": "x" * 100_000}).encode()
+    status, _, received = _post(app, body, "application/json")
+    assert status == 413
+    assert received < len(body) // 1024
+
+
+def test_upload_over_the_file_limit_is_rejected_while_streaming(app, monkeypatch):
+    monkeypatch.setattr(api, "MAX_UPLOAD_BYTES", 8192)
+    data = {"nome_empresa": "ACME", "comprovante_endereco": _Upload(b"\xff" * 200_000)}
+    body, content_type = multipart_body(data, image_keys)
+    status, payload, received = _post(app, body, content_type)
+    assert status == 413
+    assert received < 20
+
+
+def test_multipart_over_the_request_limit_is_rejected(app, monkeypatch):
+    monkeypatch.setattr(api, "MAX_REQUEST_BYTES", 50_000)
+    data = {"nome_empresa": "ACME", **{key: _Upload(b"\xff" * 20_000) for key in image_keys[:5]}}
+    body, content_type = multipart_body(data, image_keys)
+    status, _, received = _post(app, body, content_type)
+    assert status == 413
+    assert received < len(body) // 1024
+
+
+class _Upload:
+    def __init__(self, content):
+        self.content = content
+
+    def getvalue(self):
+        return self.content
+
+
+def test_shipping_fields_are_dropped_without_shipping_address():
+    from ficha import shipping_fields
+    shipping = {key: "Rua de Entrega" for key in shipping_fields}
+    data = api.parse_fields({"nome_empresa": "ACME", "shipping_address": "não", **shipping})
+    assert data["shipping_address"] is False
+    assert all(data[key] is None for key in shipping_fields)
+    assert data["nome_empresa"] == "ACME"
+    data = api.parse_fields({"nome_empresa": "ACME", "shipping_address": "sim", **shipping})
+    assert data["shipping_address"] is True
+    assert all(data[key] == "Rua de Entrega" for key in shipping_fields)
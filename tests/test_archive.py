@@ -0,0 +1,127 @@
+import os
+import time
+import pandas as pd
+import pytest
+from archive import CATEGORICAL_FIELDS, FIELDS, SubmissionArchive, archive_row, backfill, query, write_rows
+from synthetic import synthetic_data
+
+SEPTEMBER = time.mktime((2026, 9, 15, 12, 0, 0, 0, 0, -1))
+OCTOBER = time.mktime((2026, 10, 1, 9, 30, 0, 0, 0, -1))
+
+
+def _data(name, uf="SP", **fields):
+    return {**synthetic_data(n_images=0), "nome_empresa": name, "uf": uf, **fields}
+
+
+@pytest.fixture
+def root(tmp_path):
+    return str(tmp_path / "archive")
+
+
+def _partition_files(root, month, uf):
+    folder = os.path.join(root, f"month={month}", f"uf={uf}")
+    return [os.path.join(folder, name) for name in os.listdir(folder)]
+
+
+def test_archive_row():
+    row = archive_row({**_data(" ACME "), "uf": " sp ", "caixa_postal": "", "shipping_address": False}, OCTOBER)
+    assert row["nome_empresa"] == "ACME"
+    assert row["caixa_postal"] is None
+    assert row["shipping_address"] is False
+    assert (row["month"], row["uf"], row["source"]) == ("2026-10", "SP", "form")
+    assert row["submitted_at"] == pd.Timestamp("2026-10-01 09:30:00")
+    assert "comprovante_endereco" not in row
+    assert archive_row({"nome_empresa": "Sem UF"}, OCTOBER)["uf"] == "NA"
+
+
+def test_query_reads_only_the_matching_partitions(root):
+    assert write_rows(root, [archive_row(_data("A"), SEPTEMBER), archive_row(_data("B", "RJ"), SEPTEMBER),
+                             archive_row(_data("C"), OCTOBER),
+                             archive_row(_data("D", area_atuacao_empresa="Applied"), OCTOBER)]) == 4
+    assert sorted(os.listdir(root)) == ["month=2026-09", "month=2026-10"]
+    # Partições fora do filtro não são abertas: um arquivo corrompido nelas não atrapalha a consulta
+    for path in _partition_files(root, "2026-09", "RJ"):
+        with open(path, "wb") as f:
+            f.write(b"corrompido")
+
+    assert sorted(query(root, month="2026-10")["nome_empresa"]) == ["C", "D"]
+    assert list(query(root, month="2026-09", uf="sp")["nome_empresa"]) == ["A"]
+    assert sorted(query(root, month=["2026-09", "2026-10"], uf="SP")["nome_empresa"]) == ["A", "C", "D"]
+    frame = query(root, uf="SP", area_atuacao_empresa="Applied", columns=["nome_empresa", "month"])
+    assert frame.to_dict("records") == [{"nome_empresa": "D", "month": "2026-10"}]
+    with pytest.raises(ValueError):
+        query(root, cor="azul")
+    with pytest.raises(Exception):
+        query(root, month="2026-09")
+
+
+def test_query_without_archive(root):
+    frame = query(root, month="2026-10", columns=["nome_empresa"])
+    assert frame.empty and list(frame.columns) == ["nome_empresa"]
+
+
+def test_batches_with_all_null_columns_merge_under_the_schema(root):
+    empty = {key: None for key in FIELDS if key != "nome_empresa"}
+    write_rows(root, [archive_row({**empty, "nome_empresa": "Só o nome", "uf": "SP"}, OCTOBER)])
+    write_rows(root, [archive_row(_data("Completa"), OCTOBER)])
+    frame = query(root).sort_values("nome_empresa", ignore_index=True)
+    assert list(frame["nome_empresa"]) == ["Completa", "Só o nome"]
+    assert frame.loc[1, "cnpj"] is None
+    assert pd.isna(frame.loc[1, "tipo_empresa"])
+    assert frame.loc[0, "tipo_empresa"] == "Privada"
+    assert list(frame["shipping_address"]) == [False, False]
+
+
+def test_categorical_fields(root):
+    write_rows(root, [archive_row(_data(name, tipo_empresa=kind), OCTOBER)
+                      for name, kind in [("A", "Privada"), ("B", "Publica"), ("C", "Privada")]])
+    frame = query(root)
+    for key in CATEGORICAL_FIELDS:
+        assert isinstance(frame[key].dtype, pd.CategoricalDtype)
+    assert frame["cnpj"].dtype == object
+    assert frame.groupby("tipo_empresa", observed=True).size().to_dict() == {"Privada": 2, "Publica": 1}
+
+
+def test_backfill_reads_back_a_rendered_ficha(tmp_path, root):
+    from ficha import TEMPLATE_PATH, cells_ship_to, cells_sold_to, image_keys, save_to_excel
+    from template_cache import load_template
+    fichas = tmp_path / "fichas"
+    fichas.mkdir()
+    data = synthetic_data(n_images=1, shipping=True, image_size="small")
+    save_to_excel(str(fichas / "ficha.xlsx"), data, cells_sold_to, cells_ship_to, image_keys,
+                  template=load_template(TEMPLATE_PATH), engine="xml")
+    empty = {key: None for key in data}
+    save_to_excel(str(fichas / "vazia.xlsx"), empty, cells_sold_to, cells_ship_to, image_keys,
+                  template=load_template(TEMPLATE_PATH), engine="xml")
+    (fichas / "quebrada.xlsx").write_bytes(b"nao e um zip")
+
+    assert backfill([str(fichas)], root, workers=1) == {"archived": 1, "skipped": 1, "errors": 1}
+    (row,) = query(root).to_dict("records")
+    # A ficha não tem células para os campos shipping_* (a aba de entrega repete os dados de faturamento)
+    in_ficha = {key for key in [*cells_sold_to, *cells_ship_to] if key not in image_keys}
+    expected = archive_row({**{key: data[key] for key in in_ficha}, "shipping_address": True})
+    assert {key: row[key] for key in FIELDS} == {key: expected[key] for key in FIELDS}
+    assert row["tipo_empresa"] == data["tipo_empresa"] and row["shipping_cidade"] is None
+    assert (row["uf"], row["source"]) == ("SP", "backfill")
+
+
+def test_submission_archive_flushes_on_batch_size_and_close(root):
+    archive = SubmissionArchive(root, batch_size=2, interval=3600)
+    try:
+        archive.append(_data("A"), OCTOBER)
+        assert archive.pending() == 1
+        archive.append(_data("B"), OCTOBER)
+        # O lote cheio é gravado pela thread, sem esperar o intervalo
+        deadline = time.monotonic() + 5
+        while archive.pending() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert archive.pending() == 0
+        with archive._write_lock:  # espera a gravação em andamento terminar
+            pass
+        assert sorted(query(root)["nome_empresa"]) == ["A", "B"]
+        archive.append(_data("C", "RJ"), OCTOBER)
+    finally:
+        archive.close()
+    assert archive.pending() == 0
+    assert sorted(query(root)["nome_empresa"]) == ["A", "B", "C"]
+    assert query(root, uf="RJ")["source"].tolist() == ["form"]
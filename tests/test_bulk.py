@@ -0,0 +1,101 @@
+import csv
+import json
+import os
+import zipfile
+import pytest
+from openpyxl import load_workbook
+from bulk import REPORT_COLUMNS, find_duplicates, iter_rows, normalize_row, run_bulk
+from ficha import image_keys, required_fields
+from synthetic import synthetic_data, synthetic_image
+
+PROOFS = [key for key in image_keys if key in required_fields]
+
+
+# Arquivo de entrada com quatro linhas: válida, sem cidade, com um comprovante inexistente e repetida (CNPJ da 1ª)
+@pytest.fixture
+def rows(tmp_path):
+    (tmp_path / "docs").mkdir()
+    (tmp_path / "docs" / "doc.jpg").write_bytes(synthetic_image("small"))
+    base = {key: value for key, value in synthetic_data(n_images=0).items()
+            if key not in image_keys and key != "shipping_address" and value is not None}
+    base.update({key: "docs/doc.jpg" for key in PROOFS})
+    return [
+        {**base, "nome_empresa": "Empresa Válida Ltda"},
+        {**base, "nome_empresa": "Empresa Sem Cidade Ltda", "cnpj": "11.222.333/0001-81", "cidade": ""},
+        {**base, "nome_empresa": "Empresa Sem Arquivo Ltda", "cnpj": "11.222.333/0001-81", "contrato_social": "docs/nao_existe.jpg"},
+        {**base, "nome_empresa": "Empresa Repetida Ltda"},
+    ]
+
+
+def _write_csv(path, rows):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def _report(path):
+    with open(path, newline="", encoding="utf-8") as f:
+        return list(csv.DictReader(f))
+
+
+def _run(tmp_path, input_path, output, **kwargs):
+    report_path = str(tmp_path / "relatorio.csv")
+    counts = run_bulk(str(input_path), output, report_path, workers=1, engine="xml", customer_index="", **kwargs)
+    return counts, sorted(_report(report_path), key=lambda row: int(row["row"]))
+
+
+def test_run_bulk_csv_to_zip(tmp_path, rows):
+    input_path = tmp_path / "clientes.csv"
+    _write_csv(input_path, rows)
+    output = str(tmp_path / "fichas.zip")
+    counts, report = _run(tmp_path, input_path, output)
+
+    assert counts == (1, 3)
+    assert list(report[0]) == REPORT_COLUMNS
+    assert [row["status"] for row in report] == ["ok", "error", "error", "duplicate"]
+    assert "Cidade" in report[1]["error"]
+    assert report[2]["error"].startswith("FileNotFoundError")
+    assert report[3]["error"] == "Mesmo CNPJ/CPF da linha 1"
+    with zipfile.ZipFile(output) as archive:
+        assert archive.namelist() == [report[0]["file"]]
+        assert report[0]["file"].startswith("000001_")
+        with archive.open(report[0]["file"]) as f:
+            wb = load_workbook(f)
+    values = {cell.value for ws in wb for row in ws.iter_rows() for cell in row}
+    assert "Empresa Válida Ltda" in values
+
+
+def test_run_bulk_jsonl_to_directory_allowing_duplicates(tmp_path, rows):
+    input_path = tmp_path / "clientes.jsonl"
+    input_path.write_text("".join(json.dumps(row, ensure_ascii=False) + "\n" for row in rows), encoding="utf-8")
+    output = str(tmp_path / "fichas")
+    counts, report = _run(tmp_path, input_path, output, allow_duplicates=True)
+
+    assert counts == (2, 2)
+    assert [row["status"] for row in report] == ["ok", "error", "error", "ok"]
+    assert report[3]["warning"] == "Mesmo CNPJ/CPF da linha 1"
+    assert sorted(os.listdir(output)) == sorted(row["file"] for row in report if row["status"] == "ok")
+
+
+def test_iter_rows_and_normalize_row(tmp_path):
+    input_path = tmp_path / "clientes.jsonl"
+    input_path.write_text('{"nome_empresa": " ACME ", "endereco_n": 350.0, "shipping_address": "Sim"}\n'
+                          '{"nome_empresa": "Outra", "caixa_postal": null, "shipping_address": false}\n', encoding="utf-8")
+    first, second = (normalize_row(record) for record in iter_rows(str(input_path)))
+    assert first["nome_empresa"] == "ACME"
+    assert first["endereco_n"] == "350"
+    assert first["shipping_address"] is True
+    assert second["shipping_address"] is False
+    assert "caixa_postal" not in second
+    assert all(first[key] is None for key in image_keys)
+    with pytest.raises(ValueError):
+        list(iter_rows(str(tmp_path / "clientes.txt")))
+
+
+def test_find_duplicates_by_cnpj_and_name():
+    seen = {}
+    assert find_duplicates({"cnpj": "33.069.212/0038-76", "nome_empresa": "ACME S/A"}, 1, seen, None) == ""
+    assert find_duplicates({"cnpj": "33069212003876", "nome_empresa": "Outra"}, 2, seen, None) == "Mesmo CNPJ/CPF da linha 1"
+    assert find_duplicates({"cnpj": "11.222.333/0001-81", "nome_empresa": "acme s.a."}, 3, seen, None) == \
+        "Mesma Razão Social da linha 1"
@@ -0,0 +1,70 @@
+import pytest
+from cep_index import CEPIndex, build_index, normalize_cep
+
+CSV = """CEP;Logradouro;Bairro;Localidade;UF
+06455-030;Alameda Xingu;Alphaville Industrial;Barueri;sp
+01001000; Praça da Sé ;Sé;São Paulo;SP
+20040-020;Avenida Rio Branco;Centro;Rio de Janeiro;RJ
+06455030;Repetido;Repetido;Barueri;SP
+sem cep;CEP inválido;Centro;Nenhures;XX
+"""
+
+
+@pytest.fixture
+def index(tmp_path):
+    csv_path = tmp_path / "ceps.csv"
+    csv_path.write_text(CSV, encoding="utf-8")
+    output = str(tmp_path / "ceps.idx")
+    assert build_index(str(csv_path), output) == 3
+    cep_index = CEPIndex(output)
+    yield cep_index
+    cep_index.close()
+
+
+def test_normalize_cep():
+    assert normalize_cep("06455-030") == normalize_cep(" 06455030 ") == 6455030
+    assert normalize_cep("0645-5030") == 6455030
+    assert normalize_cep("6455030") is None
+    assert normalize_cep(None) is None
+
+
+def test_lookup(index):
+    assert len(index) == 3
+    # CEP repetido: vale a primeira ocorrência; textos sem espaços nas pontas e UF em maiúsculas
+    assert index.lookup("06455030") == {"endereco": "Alameda Xingu", "endereco_bairro": "Alphaville Industrial",
+                                        "cidade": "Barueri", "uf": "SP"}
+    assert index.lookup("01001-000") == {"endereco": "Praça da Sé", "endereco_bairro": "Sé",
+                                         "cidade": "São Paulo", "uf": "SP"}
+    assert index.lookup("20040-020")["cidade"] == "Rio de Janeiro"
+
+
+def test_lookup_misses(index):
+    for cep in ("00000-000", "06455-031", "99999-999", "123", "", None):
+        assert index.lookup(cep) is None
+
+
+def test_lookup_matches_the_generated_csv(tmp_path):
+    from synthetic import synthetic_cep_csv
+    csv_path = str(tmp_path / "ceps.csv")
+    ceps = synthetic_cep_csv(csv_path, rows=2000)
+    output = str(tmp_path / "ceps.idx")
+    assert build_index(csv_path, output, sep=";") == len(ceps)
+    cep_index = CEPIndex(output)
+    try:
+        for cep in ceps[:200]:
+            assert cep_index.lookup(f"{cep:08d}")["cidade"].startswith("Cidade ")
+        assert sum(cep_index.lookup(f"{cep:08d}") is not None for cep in range(1_000_000, 1_002_000)) == \
+            len(set(ceps) & set(range(1_000_000, 1_002_000)))
+    finally:
+        cep_index.close()
+
+
+def test_missing_column_and_bad_file(tmp_path):
+    csv_path = tmp_path / "ceps.csv"
+    csv_path.write_text("cep;logradouro;bairro;cidade\n06455030;Rua;Centro;Barueri\n", encoding="utf-8")
+    with pytest.raises(ValueError, match="uf"):
+        build_index(str(csv_path), str(tmp_path / "ceps.idx"))
+    bad = tmp_path / "bad.idx"
+    bad.write_bytes(b"\0" * 64)
+    with pytest.raises(ValueError):
+        CEPIndex(str(bad))
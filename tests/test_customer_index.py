@@ -0,0 +1,63 @@
+import pytest
+from customer_index import CNPJ, NAME, BloomFilter, CustomerIndex, customer_keys, key_hash, normalize_cnpj, normalize_name
+
+ACME = {"cnpj": "33.069.212/0038-76", "nome_empresa": "Acme Indústria S/A"}
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "customers.db")
+
+
+def test_normalization():
+    assert normalize_cnpj("33.069.212/0038-76") == "33069212003876"
+    assert normalize_cnpj("123") is None
+    assert normalize_name("Merck S/A") == normalize_name("MERCK  S.A.") == "merck sa"
+    assert normalize_name("Indústria") == "industria"
+    assert [kind for kind, _ in customer_keys(ACME)] == [CNPJ, NAME]
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(1000)
+    hashes = [key_hash(f"cnpj:{i}") for i in range(1000)]
+    bloom.add_many(hashes[:500])
+    for h in hashes[500:]:
+        bloom.add(h)
+    assert all(h in bloom for h in hashes)
+    false_positives = sum(key_hash(f"outro:{i}") in bloom for i in range(10_000))
+    assert false_positives < 300
+
+
+def test_find_after_add_and_reopen(path):
+    index = CustomerIndex(path)
+    assert index.find(ACME) == []
+    assert index.add(ACME) == 2
+    assert index.add(ACME) == 0
+    assert {match["match"] for match in index.find({"cnpj": "33069212003876"})} == {CNPJ}
+    assert {match["match"] for match in index.find({"nome_empresa": "ACME INDUSTRIA SA"})} == {NAME}
+    index.close()
+    reopened = CustomerIndex(path)
+    assert len(reopened) == 2
+    assert len(reopened.find(ACME)) == 2
+    reopened.close()
+
+
+def test_filter_grows_past_capacity(path):
+    index = CustomerIndex(path, capacity=10)
+    index.add_many([{"cnpj": None, "nome_empresa": f"Empresa {i}"} for i in range(50)])
+    assert index._bloom.capacity >= 100
+    assert all(index.find({"nome_empresa": f"Empresa {i}"}) for i in range(50))
+    index.close()
+
+
+@pytest.mark.parametrize("refresh_interval", [0, 3600])
+def test_keys_added_by_another_process_are_found(path, refresh_interval):
+    # Dois índices sobre o mesmo banco, como o formulário e a API
+    form = CustomerIndex(path, refresh_interval=refresh_interval)
+    api = CustomerIndex(path, refresh_interval=refresh_interval)
+    assert form.find(ACME) == []
+    api.add(ACME)
+    assert len(form.find(ACME)) == 2
+    assert form.find({"cnpj": "11.222.333/0001-81"}) == []
+    api.close()
+    form.close()
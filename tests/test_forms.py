@@ -0,0 +1,180 @@
+import os
+import time
+import pytest
+from streamlit.runtime.memory_uploaded_file_manager import MemoryUploadedFileManager
+from streamlit.testing.v1 import AppTest
+from cep_index import build_index
+from ficha import image_keys
+from synthetic import synthetic_data
+
+# O formulário roda no AppTest (um script por vez, no mesmo processo), com SMTP local e sem caixa de saída,
+# índice de clientes ou arquivo de relatórios
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def secrets(smtp, tmp_path, monkeypatch):
+    # O script abre o logo e os templates com caminhos relativos à raiz do repositório
+    monkeypatch.chdir(ROOT)
+    return {
+        "SENDER_EMAIL": "remetente@example.com",
+        "RECEIVER_EMAIL": "cadastro@example.com",
+        "EMAIL_PASSWORD": "",
+        "SMTP_HOST": smtp.host,
+        "SMTP_PORT": smtp.port,
+        "SMTP_STARTTLS": False,
+        "EXCEL_ENGINE": "xml",
+        "IMAGE_NORMALIZE": False,
+        "OUTBOX_PATH": "",
+        "CUSTOMER_INDEX": "",
+        "ARCHIVE_PATH": "",
+        "CEP_INDEX": str(tmp_path / "ceps.idx"),
+        "METRICS_ENABLED": False,
+    }
+
+
+@pytest.fixture
+def removed(monkeypatch):
+    calls = []
+    remove_file = MemoryUploadedFileManager.remove_file
+
+    def record(self, session_id, file_id):
+        calls.append(file_id)
+        return remove_file(self, session_id, file_id)
+
+    monkeypatch.setattr(MemoryUploadedFileManager, "remove_file", record)
+    return calls
+
+
+def open_form(secrets, **extra):
+    at = AppTest.from_file(os.path.join(ROOT, "forms.py"), default_timeout=60)
+    for key, value in {**secrets, **extra}.items():
+        at.secrets[key] = value
+    return at.run()
+
+
+def _field(widget_key):
+    return next(key for key in image_keys if widget_key == key or widget_key.startswith(f"{key}_"))
+
+
+def fill_form(at, data):
+    for widget in at.text_input:
+        if data.get(widget.key) is not None:
+            widget.input(data[widget.key])
+    for widget in at.selectbox:
+        widget.set_value(data[widget.key])
+    return at
+
+
+def upload(at, data, fields=None):
+    for widget in at.file_uploader:
+        field = _field(widget.key)
+        if data.get(field) is not None and (fields is None or field in fields):
+            widget.set_value((f"{field}.jpg", data[field].getvalue(), "image/jpeg"))
+    return at
+
+
+def submit(at):
+    at.button[0].click().run()
+    deadline = time.monotonic() + 60
+    while "job_id" in at.session_state and time.monotonic() < deadline:
+        time.sleep(0.1)
+        at.run()
+    return at
+
+
+def test_successful_submit_releases_uploads_and_clears_the_form(smtp, secrets, removed):
+    data = synthetic_data(n_images=8, image_size="small")
+    at = open_form(secrets)
+    upload(fill_form(at, data), data).run()
+    file_ids = {widget.key: widget.value.file_id for widget in at.file_uploader if widget.value is not None}
+    assert len(file_ids) == 8
+
+    submit(at)
+    assert [element.value for element in at.success] == ["Formulário enviado com sucesso!"]
+    assert smtp.messages == 1
+    assert sorted(removed) == sorted(file_ids.values())
+    assert all(widget.value == "" for widget in at.text_input)
+    assert all(widget.value is None for widget in at.selectbox)
+    assert all(widget.value is None for widget in at.file_uploader)
+    # A chave de cada comprovante enviado muda, para o navegador esvaziar o file_uploader
+    assert {widget.key for widget in at.file_uploader} == {f"{_field(key)}_1" for key in file_ids}
+    for key in file_ids:
+        assert key not in at.session_state
+
+
+def test_upload_over_the_session_limit_is_dropped(secrets, removed):
+    data = synthetic_data(n_images=8, image_size="small")
+    size = len(data["comprovante_endereco"].getvalue())
+    limit = int(size * 1.5)
+    at = open_form(secrets, MAX_SESSION_UPLOAD_BYTES=limit)
+    upload(at, data, ["comprovante_endereco"]).run()
+    upload(at, data, ["cartao_receita_federal"]).run()
+
+    values = {_field(widget.key): widget.value for widget in at.file_uploader}
+    assert values["comprovante_endereco"] is not None
+    assert values["cartao_receita_federal"] is None
+    assert len(removed) == 1
+    assert "cartao_receita_federal_1" in [widget.key for widget in at.file_uploader]
+    (error,) = at.error
+    assert error.value.startswith("O arquivo cartao_receita_federal.jpg não foi anexado")
+    assert f"passaria de {limit / 1024:.0f} KB." in error.value
+
+
+@pytest.fixture
+def cep_index(secrets, tmp_path):
+    csv_path = tmp_path / "ceps.csv"
+    csv_path.write_text("CEP;Logradouro;Bairro;Localidade;UF\n"
+                        "06455-030;Alameda Xingu;Alphaville Industrial;Barueri;SP\n"
+                        "20040-020;Avenida Rio Branco;Centro;Rio de Janeiro;RJ\n", encoding="utf-8")
+    assert build_index(str(csv_path), secrets["CEP_INDEX"]) == 2
+    return secrets
+
+
+def _address(at, prefix=""):
+    keys = ["endereco", "endereco_bairro", "cidade", "uf"]
+    return {key: at.session_state[prefix + key] if prefix + key in at.session_state else None for key in keys}
+
+
+def test_cep_fills_the_address(cep_index):
+    at = open_form(cep_index)
+    at.text_input(key="cep").input("06455030").run()
+    assert _address(at) == {"endereco": "Alameda Xingu", "endereco_bairro": "Alphaville Industrial",
+                            "cidade": "Barueri", "uf": "SP"}
+    # Outro CEP substitui o que veio do anterior
+    at.text_input(key="cep").input("20040-020").run()
+    assert _address(at) == {"endereco": "Avenida Rio Branco", "endereco_bairro": "Centro",
+                            "cidade": "Rio de Janeiro", "uf": "RJ"}
+
+
+def test_cep_keeps_what_the_user_typed(cep_index):
+    at = open_form(cep_index)
+    at.text_input(key="endereco").input("Rua Digitada")
+    at.text_input(key="cep").input("06455-030").run()
+    assert _address(at) == {"endereco": "Rua Digitada", "endereco_bairro": "Alphaville Industrial",
+                            "cidade": "Barueri", "uf": "SP"}
+
+
+def test_unknown_cep_leaves_the_address_alone(cep_index):
+    at = open_form(cep_index)
+    at.text_input(key="cidade").input("Cotia")
+    at.text_input(key="cep").input("99999-999").run()
+    assert _address(at)["endereco"] in ("", None)
+    assert _address(at)["cidade"] == "Cotia"
+    assert "cep_autofill" not in at.session_state
+
+
+@pytest.mark.parametrize("size, text", [(300 * 1024, "300 KB"), (1024 * 1024, "1 MB"), (1536 * 1024, "1,5 MB"),
+                                        (30 * 1024 * 1024, "30 MB")])
+def test_format_size(size, text, secrets):
+    at = open_form(secrets, MAX_SESSION_UPLOAD_BYTES=size)
+    upload(at, {"comprovante_endereco": _Blob(size + 1)}, ["comprovante_endereco"]).run()
+    assert f"passaria de {text}." in at.error[0].value
+
+
+class _Blob:
+    def __init__(self, size):
+        self.size = size
+
+    def getvalue(self):
+        return b"\xff\xd8" + b"0" * (self.size - 2)
@@ -0,0 +1,104 @@
+import io
+import pytest
+from PIL import Image, ImageFile
+from images import image_format, normalize_image, normalize_uploads
+from synthetic import synthetic_image
+
+
+def _image(mode="RGB", size=(300, 200), fmt="JPEG", color=(200, 30, 30), **save):
+    buffer = io.BytesIO()
+    Image.new(mode, size, color).save(buffer, format=fmt, **save)
+    return buffer.getvalue()
+
+
+def _open(blob):
+    img = Image.open(io.BytesIO(blob))
+    img.load()
+    return img
+
+
+def test_exif_rotation_is_applied():
+    exif = Image.Exif()
+    exif[0x0112] = 6  # girar 90° no sentido horário
+    blob = _image(size=(300, 200), exif=exif.tobytes())
+    result, fmt, report = normalize_image(blob)
+    img = _open(result)
+    assert (fmt, img.format) == ("jpeg", "JPEG")
+    assert img.size == report["size"] == (200, 300)
+    assert img.getexif().get(0x0112, 1) == 1
+
+
+def test_longest_side_is_capped():
+    result, fmt, report = normalize_image(synthetic_image("small"), max_dimension=320)
+    assert _open(result).size == report["size"] == (320, 240)
+    assert report["original_size"] == (640, 480)
+    result, _, _ = normalize_image(_image(size=(100, 900), fmt="PNG"), max_dimension=300)
+    assert _open(result).size == (33, 300)
+
+
+def test_png_only_with_real_transparency():
+    opaque = _image("RGBA", fmt="PNG", color=(10, 20, 30, 255))
+    transparent = _image("RGBA", fmt="PNG", color=(10, 20, 30, 0))
+    palette = Image.new("P", (300, 200), 1)
+    buffer = io.BytesIO()
+    palette.save(buffer, format="PNG", transparency=1)
+    # max_dimension menor que a imagem obriga a recompressão
+    assert normalize_image(opaque, max_dimension=100)[1] == "jpeg"
+    assert normalize_image(transparent, max_dimension=100)[1] == "png"
+    result, fmt, _ = normalize_image(buffer.getvalue(), max_dimension=100)
+    assert (fmt, _open(result).mode) == ("png", "RGBA")
+    result, fmt, _ = normalize_image(_image("L", fmt="PNG", color=128), max_dimension=100)
+    assert (fmt, _open(result).mode) == ("jpeg", "L")
+
+
+def test_result_fits_max_bytes():
+    blob = synthetic_image("medium")
+    result, _, report = normalize_image(blob, max_bytes=60_000)
+    assert len(result) == report["bytes"] <= 60_000 < len(blob)
+    assert report["saved_bytes"] == len(blob) - len(result)
+
+
+def test_images_within_limits_are_kept_without_decoding(monkeypatch):
+    blob = synthetic_image("small")
+    png = _image(fmt="PNG")
+
+    def fail(*args, **kwargs):
+        raise AssertionError("a imagem não deveria ser decodificada")
+
+    monkeypatch.setattr(ImageFile.ImageFile, "load", fail)
+    assert normalize_image(blob)[:2] == (blob, "jpeg")
+    assert normalize_image(png)[0] is png
+    # Fora dos limites (ou em outro formato) a imagem é recodificada
+    monkeypatch.undo()
+    gif = _image(fmt="GIF", color=3)
+    assert normalize_image(blob, max_bytes=len(blob) - 1)[0] != blob
+    assert normalize_image(gif)[1] == "jpeg"
+
+
+def test_normalize_uploads_reports_the_real_format():
+    data = {"contrato_social": _image(fmt="PNG", color=(1, 2, 3)), "cartao_cnpj": _image(fmt="GIF", color=3),
+            "balanco_patrimonial_ou_dre": None, "nome_empresa": "ACME"}
+    keys = ["contrato_social", "cartao_cnpj", "balanco_patrimonial_ou_dre"]
+    result, formats, report = normalize_uploads(data, keys)
+    assert formats == {"contrato_social": "png", "cartao_cnpj": "jpeg"}
+    assert {key: image_format(result[key]) for key in formats} == formats
+    assert set(report) == set(formats)
+    assert result["nome_empresa"] == "ACME" and result["balanco_patrimonial_ou_dre"] is None
+    assert data["cartao_cnpj"] != result["cartao_cnpj"]
+
+
+@pytest.mark.parametrize("fmt", ["JPEG", "PNG", "GIF"])
+def test_image_format(fmt):
+    assert image_format(_image(fmt=fmt, color=3 if fmt == "GIF" else (1, 2, 3))) == fmt.lower()
+
+
+def test_image_format_of_non_images():
+    assert image_format(b"%PDF-1.7") is None
+    assert image_format(b"") is None
+
+
+def test_png_exif_orientation_is_applied():
+    exif = Image.Exif()
+    exif[0x0112] = 8  # girar 90° no sentido anti-horário
+    result, fmt, _ = normalize_image(_image(size=(300, 200), fmt="PNG", exif=exif.tobytes()))
+    assert (fmt, _open(result).size) == ("jpeg", (200, 300))
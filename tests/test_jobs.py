@@ -0,0 +1,125 @@
+import smtplib
+import threading
+import time
+import pytest
+from jobs import DONE, FAILED, QUEUED, RETRYING, RUNNING, JobQueue, QueueFull, retry_call
+from mailer import is_transient_smtp_error
+
+
+def _wait(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise AssertionError("tempo esgotado")
+        time.sleep(0.005)
+
+
+class Flaky:
+    def __init__(self, errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return "ok"
+
+
+def test_retry_call_retries_transient_errors_with_exponential_backoff():
+    fn = Flaky([smtplib.SMTPServerDisconnected("caiu"), smtplib.SMTPResponseException(421, b"ocupado")])
+    sleeps, retries = [], []
+    result = retry_call(fn, is_transient_smtp_error, max_attempts=3, backoff=0.5, sleep=sleeps.append,
+                        on_retry=lambda attempt, exc, delay: retries.append((attempt, type(exc), delay)))
+    assert result == "ok"
+    assert fn.calls == 3
+    assert sleeps == [0.5, 1.0]
+    assert retries == [(1, smtplib.SMTPServerDisconnected, 0.5), (2, smtplib.SMTPResponseException, 1.0)]
+
+
+def test_retry_call_gives_up_after_max_attempts():
+    fn = Flaky([ConnectionResetError()] * 5)
+    sleeps = []
+    with pytest.raises(ConnectionResetError):
+        retry_call(fn, is_transient_smtp_error, max_attempts=3, backoff=2.0, sleep=sleeps.append)
+    assert fn.calls == 3
+    assert sleeps == [2.0, 4.0]
+
+
+def test_retry_call_fails_immediately_on_permanent_errors():
+    fn = Flaky([smtplib.SMTPAuthenticationError(535, b"senha incorreta")])
+    sleeps = []
+    with pytest.raises(smtplib.SMTPAuthenticationError):
+        retry_call(fn, is_transient_smtp_error, sleep=sleeps.append)
+    assert fn.calls == 1
+    assert sleeps == []
+
+
+def test_job_status_transitions():
+    started, retrying, release = threading.Event(), threading.Event(), threading.Event()
+
+    def handler(job, errors):
+        started.set()
+        fn = Flaky(errors)
+
+        def on_retry(attempt, exc, delay):
+            job.status = RETRYING
+            job.error = str(exc)
+
+        def sleep(delay):
+            retrying.set()
+            release.wait(5)
+
+        return retry_call(fn, is_transient_smtp_error, on_retry=on_retry, sleep=sleep)
+
+    jobs = JobQueue(handler, workers=1, max_pending=5)
+    first = jobs.submit([smtplib.SMTPServerDisconnected("caiu")])
+    second = jobs.submit([ValueError("dados inválidos")])
+    assert started.wait(5) and retrying.wait(5)
+    assert jobs.get(first).status == RETRYING
+    assert jobs.get(first).error == "caiu"
+    assert jobs.get(second).status == QUEUED
+    release.set()
+    _wait(lambda: jobs.get(second).finished)
+    job = jobs.get(first)
+    assert (job.status, job.result, job.error, job.finished) == (DONE, "ok", None, True)
+    job = jobs.get(second)
+    assert (job.status, job.result, job.error) == (FAILED, None, "dados inválidos")
+    assert job.finished_at is not None
+    assert jobs.get("inexistente") is None
+
+
+def test_job_is_running_while_the_handler_works():
+    started, release = threading.Event(), threading.Event()
+    jobs = JobQueue(lambda job: started.set() or release.wait(5), workers=1)
+    job_id = jobs.submit()
+    assert started.wait(5)
+    assert jobs.get(job_id).status == RUNNING
+    release.set()
+    _wait(lambda: jobs.get(job_id).finished)
+    assert jobs.get(job_id).status == DONE
+
+
+def test_submit_raises_queue_full_when_the_queue_is_full():
+    started, release = threading.Event(), threading.Event()
+    jobs = JobQueue(lambda job: started.set() or release.wait(5), workers=1, max_pending=1)
+    running = jobs.submit()
+    assert started.wait(5)
+    waiting = jobs.submit()
+    with pytest.raises(QueueFull):
+        jobs.submit()
+    assert jobs.pending() == 1
+    assert len(jobs._jobs) == 2
+    release.set()
+    _wait(lambda: jobs.get(waiting).finished)
+    assert jobs.get(running).status == DONE
+
+
+def test_finished_jobs_are_pruned_after_keep_finished():
+    jobs = JobQueue(lambda job: None, workers=1, keep_finished=60)
+    old, recent = jobs.submit(), jobs.submit()
+    _wait(lambda: jobs.get(old).finished and jobs.get(recent).finished)
+    jobs.get(old).finished_at -= 120
+    jobs.submit()
+    assert jobs.get(old) is None
+    assert jobs.get(recent) is not None
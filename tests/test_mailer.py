@@ -0,0 +1,178 @@
+import email
+import io
+import smtplib
+import zipfile
+import pytest
+from mailer import _encoded_size, _zip_bundle, build_message, dedupe_files, iter_message, package_files, send_email, send_packaged
+
+FICHA = ("FICHA_CADASTRAL.xlsx", b"PK\x03\x04 planilha")
+
+
+def _files(*sizes):
+    return [FICHA] + [(f"doc{i}.jpg", bytes([i]) * size) for i, size in enumerate(sizes)]
+
+
+# Conexão SMTP falsa: guarda o comando DATA de cada mensagem enviada por stream_message
+class RecordingServer:
+    def __init__(self):
+        self.messages = []
+        self._data = None
+
+    def ehlo_or_helo_if_needed(self):
+        pass
+
+    def mail(self, sender):
+        return 250, b"OK"
+
+    def rcpt(self, address):
+        return 250, b"OK"
+
+    def docmd(self, command):
+        self._data = []
+        return 354, b"Go ahead"
+
+    def send(self, chunk):
+        self._data.append(bytes(chunk))
+
+    def getreply(self):
+        data = b"".join(self._data)
+        assert data.endswith(b"\r\n.\r\n")
+        self.messages.append(email.message_from_bytes(data[:-3].replace(b"\r\n..", b"\r\n.")))
+        return 250, b"OK"
+
+    def rset(self):
+        pass
+
+
+def _attachments(msg):
+    return {part.get_filename(): part.get_payload(decode=True) for part in msg.walk() if part.get_filename()}
+
+
+def test_dedupe_files_keeps_the_first_name():
+    files = [FICHA, ("contrato_social.pdf", b"pdf"), ("cartao_cnpj.pdf", b"pdf"), ("outro.pdf", b"outro")]
+    unique, notes = dedupe_files(files)
+    assert unique == [FICHA, ("contrato_social.pdf", b"pdf"), ("outro.pdf", b"outro")]
+    assert notes == ["cartao_cnpj.pdf: idêntico a contrato_social.pdf, enviado uma única vez"]
+
+
+def test_package_files_separate_splits_in_order():
+    files = _files(40_000, 40_000, 40_000)
+    assert package_files(files) == [files]
+    limit = _encoded_size(80_000) + 4096
+    groups = package_files(files, max_bytes=limit)
+    assert [[name for name, _ in group] for group in groups] == [["FICHA_CADASTRAL.xlsx", "doc0.jpg", "doc1.jpg"], ["doc2.jpg"]]
+    # Um arquivo maior que o limite sozinho vai em um e-mail próprio
+    assert [len(group) for group in package_files(_files(500_000), max_bytes=limit)] == [1, 1]
+    assert package_files([]) == [[]]
+    with pytest.raises(ValueError):
+        package_files(files, mode="rar")
+
+
+def test_package_files_zip():
+    files = _files(40_000, 40_000, 40_000)
+    (group,) = package_files(files, "zip")
+    ((name, bundle),) = group
+    assert name == "FICHA_CADASTRAL.zip"
+    with zipfile.ZipFile(bundle) as archive:
+        assert archive.testzip() is None
+        assert [(info.filename, archive.read(info)) for info in archive.infolist()] == files
+    groups = package_files(files, "zip", max_bytes=_encoded_size(80_000) + 4096, bundle_name="Cadastro ACME.xlsx")
+    assert [group[0][0] for group in groups] == ["Cadastro ACME_parte1.zip", "Cadastro ACME_parte2.zip"]
+
+
+def test_iter_message_matches_build_message():
+    files = [*_files(0, 1, 56, 57, 58, 300_000), ("ação.pdf", b"%PDF\n.linha")]
+    streamed = email.message_from_bytes(b"".join(iter_message("a@example.com", "b@example.com", "Cadastro",
+                                                              "Linha 1\n.Linha 2", files)))
+    built = build_message("a@example.com", "b@example.com", "Cadastro", "Linha 1\n.Linha 2", files)
+    assert streamed["Subject"] == built["Subject"] == "Cadastro"
+    assert _attachments(streamed) == _attachments(built) == dict(files)
+    assert streamed.get_content_type() == "multipart/mixed"
+    # O tipo de cada anexo vem da extensão do arquivo
+    assert [part.get_content_type() for part in streamed.walk()][2:] == [
+        "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", *["image/jpeg"] * 6, "application/pdf"]
+    # O corpo vai no comando DATA: o ponto no início da linha é duplicado
+    assert streamed.get_payload(0).get_payload() == "Linha 1\r\n..Linha 2"
+
+
+def test_iter_message_reads_file_objects():
+    bundle = io.BytesIO(b"z" * 200_000)
+    msg = email.message_from_bytes(b"".join(iter_message("a@example.com", "b@example.com", "Cadastro", "Corpo",
+                                                         [("FICHA.zip", bundle)])))
+    assert _attachments(msg) == {"FICHA.zip": b"z" * 200_000}
+
+
+def test_send_packaged_numbers_the_parts():
+    server = RecordingServer()
+    files = _files(40_000, 40_000, 40_000)
+    sent = send_packaged(server, "a@example.com", "b@example.com", "Cadastro", "Corpo", files,
+                         max_bytes=_encoded_size(80_000) + 4096)
+    assert sent == len(server.messages) == 2
+    assert [msg["Subject"] for msg in server.messages] == ["Cadastro (parte 1/2)", "Cadastro (parte 2/2)"]
+    assert server.messages[0].get_payload(0).get_payload() == "Corpo"
+    assert {**_attachments(server.messages[0]), **_attachments(server.messages[1])} == dict(files)
+
+
+def test_send_packaged_zip_closes_the_bundles(monkeypatch):
+    import mailer
+    bundles = []
+    monkeypatch.setattr(mailer, "_zip_bundle", lambda files: bundles.append(_zip_bundle(files)) or bundles[-1])
+    server = RecordingServer()
+    files = _files(40_000)
+    assert send_packaged(server, "a@example.com", "b@example.com", "Cadastro", "Corpo", files, mode="zip") == 1
+    assert server.messages[0]["Subject"] == "Cadastro"
+    ((name, content),) = _attachments(server.messages[0]).items()
+    assert name == "FICHA_CADASTRAL.zip"
+    with zipfile.ZipFile(io.BytesIO(content)) as archive:
+        assert archive.namelist() == [name for name, _ in files]
+    assert len(bundles) == 1 and bundles[0].closed
+
+
+def test_send_email_through_the_stub(smtp):
+    from mailer import SMTPPool
+    pool = SMTPPool(smtp.host, smtp.port, size=1, starttls=False)
+    try:
+        assert send_email("a@example.com", "b@example.com", "Cadastro", "Corpo", _files(40_000, 40_000), "",
+                          raise_errors=True, pool=pool, max_bytes=_encoded_size(40_000) + 4096)
+    finally:
+        pool.close()
+    assert smtp.messages == 2
+
+
+def test_send_email_without_pool_uses_the_given_server(smtp):
+    assert send_email("a@example.com", "b@example.com", "Cadastro", "Corpo", _files(1000), "", raise_errors=True,
+                      host=smtp.host, port=smtp.port, starttls=False)
+    assert (smtp.connections, smtp.messages) == (1, 1)
+
+
+def test_send_email_without_pool_closes_the_connection_on_error(monkeypatch):
+    import mailer
+
+    class Server(RecordingServer):
+        closed = False
+
+        def getreply(self):
+            raise smtplib.SMTPServerDisconnected("caiu")
+
+        def close(self):
+            self.closed = True
+
+    server = Server()
+    connects = []
+    monkeypatch.setattr(mailer, "connect", lambda *args: connects.append(args) or server)
+    with pytest.raises(smtplib.SMTPServerDisconnected):
+        send_email("a@example.com", "b@example.com", "Cadastro", "Corpo", _files(10), "senha", raise_errors=True,
+                   host="smtp.example.com", port=2525, starttls=False)
+    assert connects == [("smtp.example.com", 2525, "a@example.com", "senha", False)]
+    assert server.closed
+
+
+def test_stream_message_refused_recipient():
+    class Refusing(RecordingServer):
+        def rcpt(self, address):
+            return 550, b"No such user"
+
+    server = Refusing()
+    with pytest.raises(smtplib.SMTPRecipientsRefused):
+        send_packaged(server, "a@example.com", "b@example.com", "Cadastro", "Corpo", _files(10))
+    assert server.messages == []
@@ -0,0 +1,96 @@
+import io
+import json
+import logging
+import pytest
+import metrics
+
+
+@pytest.fixture
+def enabled():
+    metrics.reset()
+    metrics.configure(enabled=True, json_logs=False)
+    yield
+    metrics.configure(enabled=False)
+    metrics.reset()
+
+
+def test_stage_fills_the_histogram_buckets(enabled):
+    with metrics.stage("excel.save"):
+        pass
+    metrics.observe("excel.save", 0.3)
+    metrics.observe("excel.save", 60.0)
+    stages = metrics.snapshot()["stages"]
+    histogram = stages["excel.save"]
+    assert histogram["count"] == 3
+    assert histogram["sum"] == pytest.approx(60.3, abs=0.01)
+    # Buckets cumulativos: a medição de 0,3 s entra a partir de 0,5; a de 60 s só em +Inf
+    assert histogram["buckets"]["0.005"] == 1
+    assert histogram["buckets"]["0.25"] == 1
+    assert histogram["buckets"]["0.5"] == 2
+    assert histogram["buckets"]["30.0"] == 2
+
+
+def test_counters_are_kept_per_label(enabled):
+    metrics.incr("submissions_total", status="ok")
+    metrics.incr("submissions_total", status="ok")
+    metrics.incr("submissions_total", status="failed")
+    metrics.incr("attachment_bytes_total", 1024)
+    assert metrics.snapshot()["counters"] == [
+        {"name": "attachment_bytes_total", "labels": {}, "value": 1024},
+        {"name": "submissions_total", "labels": {"status": "failed"}, "value": 1},
+        {"name": "submissions_total", "labels": {"status": "ok"}, "value": 2},
+    ]
+
+
+def test_prometheus_text(enabled):
+    metrics.incr("submissions_total", status="ok")
+    metrics.incr("email_errors_total", error='Erro "SMTP"\n')
+    metrics.observe("smtp.send", 0.02)
+    lines = metrics.prometheus_text().splitlines()
+    assert lines.count("# TYPE forms_submissions_total counter") == 1
+    assert 'forms_submissions_total{status="ok"} 1' in lines
+    assert 'forms_email_errors_total{error="Erro \\"SMTP\\"\\n"} 1' in lines
+    assert "# TYPE forms_stage_seconds histogram" in lines
+    assert 'forms_stage_seconds_bucket{stage="smtp.send",le="0.01"} 0' in lines
+    assert 'forms_stage_seconds_bucket{stage="smtp.send",le="0.025"} 1' in lines
+    assert 'forms_stage_seconds_bucket{stage="smtp.send",le="+Inf"} 1' in lines
+    assert 'forms_stage_seconds_sum{stage="smtp.send"} 0.020000' in lines
+    assert 'forms_stage_seconds_count{stage="smtp.send"} 1' in lines
+
+
+def test_write_prometheus(enabled, tmp_path):
+    metrics.incr("emails_sent_total")
+    path = tmp_path / "forms.prom"
+    metrics.write_prometheus(str(path))
+    assert path.read_text(encoding="utf-8") == metrics.prometheus_text()
+    assert [p.name for p in tmp_path.iterdir()] == ["forms.prom"]
+
+
+def test_trace_logs_one_json_line(enabled, monkeypatch):
+    stream = io.StringIO()
+    handler = logging.StreamHandler(stream)
+    monkeypatch.setattr(metrics.logger, "handlers", [handler])
+    monkeypatch.setattr(metrics.logger, "level", logging.INFO)
+    with pytest.raises(ValueError):
+        with metrics.trace("submission", job_id="abc"):
+            metrics.observe("excel.save", 0.1)
+            metrics.observe("excel.save", 0.2)
+            metrics.incr("attachments_total", 3)
+            raise ValueError
+    record = json.loads(stream.getvalue())
+    assert (record["event"], record["job_id"]) == ("submission", "abc")
+    assert (record["status"], record["error"]) == ("error", "ValueError")
+    assert record["stages"] == {"excel.save": pytest.approx(0.3)}
+    assert record["counters"] == {"attachments_total": 3}
+
+
+def test_disabled_metrics_are_a_no_op():
+    metrics.configure(enabled=False)
+    metrics.reset()
+    assert metrics.stage("excel.save") is metrics.stage("smtp.send")
+    assert metrics.trace("submission") is metrics.stage("excel.save")
+    with metrics.stage("excel.save"):
+        metrics.incr("submissions_total", status="ok")
+        metrics.observe("smtp.send", 1.0)
+    assert metrics.snapshot() == {"counters": [], "stages": {}}
+    assert metrics.prometheus_text() == "\n"
@@ -0,0 +1,88 @@
+import time
+import pytest
+from mailer import SMTPPool
+from outbox import FAILED, PENDING, SENDING, SENT, Outbox, submission_key
+
+FILES = [("ficha.xlsx", b"xlsx"), ("contrato_social.jpg", b"jpg")]
+
+
+@pytest.fixture
+def outbox(tmp_path):
+    box = Outbox(str(tmp_path / "outbox.db"), lease=60)
+    yield box
+    box.close()
+
+
+def _add(outbox, key="k1"):
+    return outbox.add(key, "a@example.com", "b@example.com", "Assunto", "Corpo", FILES)
+
+
+def _files(outbox):
+    return outbox._conn.execute("SELECT COUNT(*) FROM outbox_files").fetchone()[0]
+
+
+def test_submission_key_ignores_surrounding_spaces_and_empty_strings():
+    base = {"nome_empresa": "ACME", "cnpj": "1", "caixa_postal": None, "comprovante_endereco": b"img"}
+    same = {"nome_empresa": " ACME ", "cnpj": "1", "caixa_postal": "", "comprovante_endereco": b"img"}
+    other = {**base, "comprovante_endereco": b"outra"}
+    keys = ["comprovante_endereco"]
+    assert submission_key(base, keys) == submission_key(same, keys)
+    assert submission_key(base, keys) != submission_key(other, keys)
+
+
+def test_add_is_idempotent(outbox):
+    assert _add(outbox)
+    assert not _add(outbox)
+    assert outbox.counts() == {PENDING: 1}
+    assert outbox.message("k1")[4] == FILES
+
+
+def test_claim_reserves_once_until_the_lease_expires(outbox):
+    _add(outbox)
+    assert outbox.claim(["k1"]) == ["k1"]
+    assert outbox.status("k1") == SENDING
+    assert outbox.claim(["k1"]) == []
+    assert outbox.claim() == []
+    # Reserva expirada (processo caiu no meio do envio): pode ser reservada de novo
+    outbox._conn.execute("UPDATE outbox SET claimed_at = ?", (time.time() - 120,))
+    assert outbox.claim() == ["k1"]
+
+
+def test_failed_entries_are_only_claimed_by_key(outbox):
+    _add(outbox)
+    outbox._set_status(["k1"], FAILED, "550")
+    assert outbox.claim() == []
+    assert outbox.claim(["k1"]) == ["k1"]
+
+
+def test_deliver_marks_sent(outbox, smtp):
+    _add(outbox)
+    _add(outbox, "k2")
+    pool = SMTPPool(smtp.host, smtp.port, starttls=False)
+    assert outbox.dispatch(pool) == 2
+    assert outbox.counts() == {SENT: 2}
+    assert smtp.messages == 2
+
+
+def test_transient_failure_returns_entry_to_pending(outbox):
+    _add(outbox)
+    pool = SMTPPool("127.0.0.1", 1, starttls=False, timeout=1)
+    with pytest.raises(OSError):
+        outbox.deliver(outbox.claim(["k1"]), pool)
+    assert outbox.status("k1") == PENDING
+
+
+def test_purge_removes_old_sent_files_and_old_failed_entries(outbox):
+    for key in ("sent", "failed", "recent"):
+        _add(outbox, key)
+    outbox._set_status(["sent"], SENT)
+    outbox._set_status(["failed", "recent"], FAILED, "550")
+    old = time.time() - 40 * 24 * 3600
+    outbox._conn.execute("UPDATE outbox SET sent_at = ? WHERE key = 'sent'", (old,))
+    outbox._conn.execute("UPDATE outbox SET created_at = ? WHERE key = 'failed'", (old,))
+    outbox.purge()
+    assert outbox.status("sent") == SENT
+    assert outbox.status("failed") is None
+    assert outbox.status("recent") == FAILED
+    # Restam só os anexos do envio com falha recente
+    assert _files(outbox) == len(FILES)
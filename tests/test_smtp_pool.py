@@ -0,0 +1,38 @@
+import pytest
+from mailer import SMTPPool
+
+
+def test_connection_is_reused(smtp):
+    pool = SMTPPool(smtp.host, smtp.port, size=1, starttls=False)
+    for _ in range(3):
+        with pool.connection() as server:
+            server.noop()
+    assert smtp.connections == 1
+    pool.close()
+
+
+def test_connection_is_dropped_after_an_error_mid_message(smtp):
+    pool = SMTPPool(smtp.host, smtp.port, size=1, starttls=False, timeout=5)
+    with pytest.raises(RuntimeError):
+        with pool.connection() as server:
+            server.mail("a@example.com")
+            server.rcpt("b@example.com")
+            server.docmd("DATA")
+            server.send(b"Subject: parcial\r\n\r\n")
+            raise RuntimeError("falha ao gerar o anexo")
+    with pool.connection() as server:
+        assert server.noop()[0] == 250
+    assert smtp.connections == 2
+    assert smtp.messages == 0
+    pool.close()
+
+
+def test_slot_is_released_on_base_exceptions(smtp):
+    pool = SMTPPool(smtp.host, smtp.port, size=1, starttls=False)
+    with pytest.raises(KeyboardInterrupt):
+        with pool.connection():
+            raise KeyboardInterrupt
+    assert pool._in_use == 0
+    with pool.connection() as server:
+        assert server.noop()[0] == 250
+    pool.close()
@@ -0,0 +1,86 @@
+import time
+import pytest
+from ficha import image_keys
+from mailer import SMTPPool
+from outbox import SENDING, SENT, Outbox
+from submission import process_submission
+
+
+class Recorder:
+    def __init__(self):
+        self.rows = []
+
+    def add(self, data):
+        self.rows.append(data["cnpj"])
+
+    def append(self, data):
+        self.rows.append(data["cnpj"])
+
+
+def _settings(smtp, tmp_path):
+    return {
+        "sender_email": "remetente@example.com",
+        "receiver_email": "cadastro@example.com",
+        "password": "",
+        "excel_engine": "xml",
+        "templates": ["ficha"],
+        "image_keys": image_keys,
+        "image_normalize": False,
+        "smtp_pool": SMTPPool(smtp.host, smtp.port, starttls=False),
+        "smtp_max_attempts": 1,
+        "outbox": Outbox(str(tmp_path / "outbox.db")),
+        "customers": Recorder(),
+        "archive": Recorder(),
+    }
+
+
+def test_resubmission_is_not_archived_twice(smtp, tmp_path, form_data):
+    settings = _settings(smtp, tmp_path)
+    process_submission(None, dict(form_data), settings)
+    process_submission(None, dict(form_data), settings)
+    assert smtp.messages == 1
+    assert settings["customers"].rows == [form_data["cnpj"]]
+    assert settings["archive"].rows == [form_data["cnpj"]]
+
+
+def test_failed_outbox_entry_is_archived_when_resent(smtp, tmp_path, form_data):
+    settings = _settings(smtp, tmp_path)
+    working_pool = settings["smtp_pool"]
+    # Primeira tentativa sem servidor SMTP: o envio fica pendente na caixa de saída
+    settings["smtp_pool"] = SMTPPool("127.0.0.1", 1, starttls=False, timeout=1)
+    with pytest.raises(OSError):
+        process_submission(None, dict(form_data), settings)
+    assert settings["archive"].rows == []
+    settings["smtp_pool"] = working_pool
+    process_submission(None, dict(form_data), settings)
+    assert smtp.messages == 1
+    assert settings["archive"].rows == [form_data["cnpj"]]
+    assert list(settings["outbox"].counts()) == [SENT]
+
+
+def test_submission_being_sent_elsewhere_is_reported_as_sending(smtp, tmp_path, form_data):
+    settings = _settings(smtp, tmp_path)
+    assert process_submission(None, dict(form_data), settings) == SENT
+    outbox = settings["outbox"]
+    # Simula outro worker enviando o mesmo cadastro
+    outbox._conn.execute("UPDATE outbox SET status = ?, claimed_at = ?", (SENDING, time.time()))
+    assert process_submission(None, dict(form_data), settings) == SENDING
+    assert smtp.messages == 1
+    assert len(settings["archive"].rows) == 1
+
+
+def test_attachment_extension_matches_the_image_format(smtp, tmp_path, form_data, monkeypatch):
+    import io
+    import submission
+    from synthetic import synthetic_image
+    sent = []
+    monkeypatch.setattr(submission, "send_email", lambda sender, receiver, subject, body, files, *args, **kwargs:
+                        sent.append([name for name, _ in files]))
+    data = {**form_data, "contrato_social": io.BytesIO(synthetic_image("small", fmt="PNG")),
+            "cartao_cnpj": io.BytesIO(synthetic_image("small", seed=1))}
+    # Sem normalização, ou dentro dos limites, o PNG continua PNG; recomprimido (sem transparência) vira JPEG
+    for options in ({"image_normalize": False}, {"image_normalize": True},
+                    {"image_normalize": True, "image_max_dimension": 320}):
+        process_submission(None, dict(data), {**_settings(smtp, tmp_path), "outbox": None, **options})
+    assert [names[1:] for names in sent] == [["contrato_social.png", "cartao_cnpj.jpg"]] * 2 + \
+        [["contrato_social.jpg", "cartao_cnpj.jpg"]]
@@ -0,0 +1,56 @@
+import os
+import pytest
+import template_cache
+from template_cache import clear_template_cache, load_template
+
+
+@pytest.fixture
+def template(tmp_path):
+    clear_template_cache()
+    path = tmp_path / "template.xlsx"
+    path.write_bytes(b"PK\x03\x04 primeira versao")
+    yield str(path)
+    clear_template_cache()
+
+
+@pytest.fixture
+def reads(monkeypatch):
+    calls = []
+    read_template = template_cache._read_template
+    monkeypatch.setattr(template_cache, "_read_template", lambda path: calls.append(path) or read_template(path))
+    return calls
+
+
+def test_each_call_gets_an_independent_stream_over_the_cached_bytes(template, reads):
+    first, second = load_template(template), load_template(template)
+    assert reads == [template]
+    assert first is not second
+    assert first.getvalue() == second.getvalue() == template_cache._cache[template][1]
+    first.read(4)
+    first.seek(0, os.SEEK_END)
+    first.write(b" alterado")
+    # Ler ou escrever em uma cópia não afeta a outra nem o cache
+    assert second.tell() == 0
+    assert second.getvalue() == b"PK\x03\x04 primeira versao"
+    assert load_template(template).getvalue() == b"PK\x03\x04 primeira versao"
+    assert len(reads) == 1
+
+
+def test_a_new_mtime_reloads_the_template(template, reads):
+    assert load_template(template).getvalue() == b"PK\x03\x04 primeira versao"
+    with open(template, "wb") as f:
+        f.write(b"PK\x03\x04 segunda versao")
+    mtime = os.stat(template).st_mtime_ns + 1_000_000
+    os.utime(template, ns=(mtime, mtime))
+    assert load_template(template).getvalue() == b"PK\x03\x04 segunda versao"
+    assert load_template(template).getvalue() == b"PK\x03\x04 segunda versao"
+    assert len(reads) == 2
+
+
+def test_use_cache_false_bypasses_the_cache(template, reads):
+    load_template(template)
+    assert load_template(template, use_cache=False).getvalue() == b"PK\x03\x04 primeira versao"
+    assert load_template(template, use_cache=False).getvalue() == b"PK\x03\x04 primeira versao"
+    assert len(reads) == 3
+    # Sem cache o arquivo é lido mesmo com o mtime inalterado, e a entrada em cache continua a mesma
+    assert list(template_cache._cache) == [template]
@@ -0,0 +1,73 @@
+import pandas as pd
+import pytest
+from validation import CHECKS, is_valid_cep, is_valid_cnpj_cpf, validate_fields, validate_frame
+
+VALID = {
+    "cnpj_cpf": ["33.069.212/0038-76", "33069212003876", "529.982.247-25", " 52998224725 "],
+    "cep": ["06455-030", "06455030", " 06455-030 "],
+    "uf": ["SP", "sp", " RJ "],
+    "phone": ["(11) 4444-5555", "(11) 98888-7777", "+55 11 98888-7777"],
+    "email": ["fiscal@empresa.com.br", "a.b@c.io"],
+}
+
+INVALID = {
+    "cnpj_cpf": ["33.069.212/0038-77", "111.111.111-11", "1234", "33.069.212/0038-76x"],
+    "cep": ["06455-03", "0645-5030", "06455_030"],
+    "uf": ["XX", "S P"],
+    "phone": ["(01) 4444-5555", "(11) 8888-77777", "4444-5555"],
+    "email": ["empresa.com.br", "a@b", "a b@c.com"],
+}
+
+# Valores com caracteres não ASCII: dígitos de largura total, sobrescritos, outros sistemas de dígitos e espaços Unicode
+NON_ASCII = [
+    "123²",
+    "²²²²²²²²²²²",
+    "０６４５５-０３０",
+    "３３.069.212/0038-76",
+    "33.069.212/0038-76 ",
+    "　06455-030",
+    "٠٦٤٥٥-٠٣٠",
+    "(１1) 4444-5555",
+    "(11) 4444-5555",
+    "ＳＰ",
+    "fiscal@empresa.com.br　",
+    " ",
+]
+
+
+@pytest.mark.parametrize("kind", list(CHECKS))
+def test_valid_values(kind):
+    scalar, vectorized, _ = CHECKS[kind]
+    assert all(scalar(value) for value in VALID[kind])
+    assert vectorized(pd.Series(VALID[kind])).all()
+
+
+@pytest.mark.parametrize("kind", list(CHECKS))
+def test_invalid_values(kind):
+    scalar, vectorized, _ = CHECKS[kind]
+    assert not any(scalar(value) for value in INVALID[kind])
+    assert not vectorized(pd.Series(INVALID[kind])).any()
+
+
+@pytest.mark.parametrize("kind", list(CHECKS))
+def test_scalar_and_vectorized_agree_on_non_ascii(kind):
+    scalar, vectorized, _ = CHECKS[kind]
+    expected = vectorized(pd.Series(NON_ASCII)).tolist()
+    assert [scalar(value) for value in NON_ASCII] == expected
+
+
+def test_non_ascii_digits_are_rejected_without_errors():
+    assert not is_valid_cnpj_cpf("123²")
+    assert not is_valid_cnpj_cpf("３３.069.212/0038-76")
+    assert not is_valid_cep("０６４５５-０３０")
+
+
+def test_validate_fields_matches_validate_frame():
+    rows = [
+        {"cnpj": "33.069.212/0038-76", "cep": "06455-030", "uf": "SP", "telefone_fixo": "(11) 4444-5555", "email": "a@b.com"},
+        {"cnpj": "123²", "cep": "０６４５５-０３０", "uf": "ＳＰ", "telefone_fixo": "(１1) 4444-5555", "email": "a@b"},
+        {"cnpj": "", "cep": None, "uf": " ", "telefone_fixo": " ", "email": ""},
+    ]
+    frame_errors = validate_frame(pd.DataFrame(rows))
+    for i, row in enumerate(rows):
+        assert "; ".join(validate_fields(row).values()) == frame_errors[i]
@@ -0,0 +1,55 @@
+import io
+import zipfile
+import pytest
+from openpyxl import load_workbook
+import xlsx_patcher
+from ficha import TEMPLATES, image_keys, render_template
+
+
+def _cell_values(content, spec):
+    wb = load_workbook(io.BytesIO(content))
+    values = {}
+    for sheet, cells in ((spec["sheet_sold_to"], spec["cells_sold_to"]), (spec["sheet_ship_to"], spec["cells_ship_to"])):
+        ws = wb[sheet]
+        for key, ref in cells.items():
+            if key in image_keys:
+                continue
+            for cell in [ref] if isinstance(ref, str) else ref:
+                values[sheet, cell] = ws[cell].value
+        values[sheet, "images"] = len(ws._images)
+    return values
+
+
+@pytest.fixture
+def shipping_data():
+    from synthetic import synthetic_data
+    return synthetic_data(n_images=3, shipping=True, image_size="small")
+
+
+@pytest.mark.parametrize("template", sorted(TEMPLATES))
+def test_engines_fill_the_same_cells(template, shipping_data):
+    spec = TEMPLATES[template]
+    _, expected, _ = render_template(spec, shipping_data, image_keys, engine="openpyxl")
+    _, patched, _ = render_template(spec, shipping_data, image_keys, engine="xml")
+    assert zipfile.ZipFile(io.BytesIO(patched)).testzip() is None
+    values = _cell_values(patched, spec)
+    assert values == _cell_values(expected, spec)
+    assert values[spec["sheet_sold_to"], spec["cells_sold_to"]["nome_empresa"]] == shipping_data["nome_empresa"]
+    # Os 3 comprovantes, além das imagens que já estão no template (logotipo)
+    template_images = len(load_workbook(spec["path"])[spec["sheet_sold_to"]]._images)
+    assert values[spec["sheet_sold_to"], "images"] == template_images + 3
+
+
+def test_raw_copy_self_check_passes():
+    assert xlsx_patcher._raw_copy_works()
+
+
+@pytest.mark.parametrize("template", sorted(TEMPLATES))
+def test_public_zip_fallback_matches_raw_copy(template, shipping_data, monkeypatch):
+    spec = TEMPLATES[template]
+    _, raw, _ = render_template(spec, shipping_data, image_keys, engine="xml")
+    monkeypatch.setattr(xlsx_patcher, "_raw_copy_checked", False)
+    _, public, _ = render_template(spec, shipping_data, image_keys, engine="xml")
+    with zipfile.ZipFile(io.BytesIO(raw)) as a, zipfile.ZipFile(io.BytesIO(public)) as b:
+        assert a.namelist() == b.namelist()
+        assert all(a.read(name) == b.read(name) for name in a.namelist())
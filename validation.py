@@ -0,0 +1,277 @@
+import re
+import numpy as np
+import pandas as pd
+from ficha import required_fields
+
+# Validação de formato dos campos do cadastro: dígitos verificadores de CNPJ/CPF, CEP, UF, telefone e e-mail.
+# Há duas APIs com as mesmas regras:
+# - escalar (is_valid_*, validate_fields), usada no formulário;
+# - vetorizada (*_valid sobre arrays/Series, validate_frame), usada no cadastro em lote. Os textos são
+#   convertidos em uma matriz de bytes (uma linha por valor) e os dígitos verificadores são calculados
+#   com NumPy, sem laço em Python por linha.
+# Campos vazios são considerados válidos aqui; a obrigatoriedade é verificada por find_missing_fields.
+# Só dígitos e espaços ASCII são aceitos nas duas APIs (dígitos de largura total, sobrescritos e espaços
+# Unicode tornam o valor inválido), para que um mesmo valor tenha o mesmo resultado no formulário e no lote.
+
+UFS = ["AC", "AL", "AP", "AM", "BA", "CE", "DF", "ES", "GO", "MA", "MT", "MS", "MG", "PA", "PB", "PR", "PE", "PI",
+       "RJ", "RN", "RS", "RO", "RR", "SC", "SP", "SE", "TO"]
+
+CPF_WEIGHTS = (np.arange(10, 1, -1), np.arange(11, 1, -1))
+CNPJ_WEIGHTS = (np.array([5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2]), np.array([6, 5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2]))
+# Quantidade de formatos distintos (posições dos dígitos) até a qual a extração de dígitos é feita por grupo
+MAX_LAYOUTS = 32
+
+WHITESPACE = " \t\n\r\x0b\x0c"
+DOCUMENT_CHARS = re.compile(r"[0-9./\-\s]+", re.ASCII)
+PHONE_CHARS = re.compile(r"[0-9()+\-.\s]+", re.ASCII)
+CEP_PATTERN = re.compile(r"[0-9]{5}-?[0-9]{3}", re.ASCII)
+EMAIL_PATTERN = re.compile(r"[^@\s]+@[^@\s]+\.[^@\s]+", re.ASCII)
+
+
+# Dígitos de um valor que já passou pela checagem de formato (só dígitos ASCII)
+def _digits(value):
+    return [int(c) for c in value if "0" <= c <= "9"]
+
+
+def _cpf_ok(digits):
+    if len(set(digits)) == 1:
+        return False
+    for weights in CPF_WEIGHTS:
+        n = len(weights)
+        if sum(d * int(w) for d, w in zip(digits[:n], weights)) * 10 % 11 % 10 != digits[n]:
+            return False
+    return True
+
+
+def _cnpj_ok(digits):
+    if len(set(digits)) == 1:
+        return False
+    for weights in CNPJ_WEIGHTS:
+        n = len(weights)
+        remainder = sum(d * int(w) for d, w in zip(digits[:n], weights)) % 11
+        if (0 if remainder < 2 else 11 - remainder) != digits[n]:
+            return False
+    return True
+
+
+def is_valid_cpf(value):
+    value = value.strip(WHITESPACE)
+    if not DOCUMENT_CHARS.fullmatch(value):
+        return False
+    digits = _digits(value)
+    return len(digits) == 11 and _cpf_ok(digits)
+
+
+def is_valid_cnpj(value):
+    value = value.strip(WHITESPACE)
+    if not DOCUMENT_CHARS.fullmatch(value):
+        return False
+    digits = _digits(value)
+    return len(digits) == 14 and _cnpj_ok(digits)
+
+
+# Função para validar o campo CNPJ/CPF do formulário: 11 dígitos são CPF e 14 dígitos são CNPJ
+def is_valid_cnpj_cpf(value):
+    return is_valid_cpf(value) or is_valid_cnpj(value)
+
+
+def is_valid_cep(value):
+    return bool(CEP_PATTERN.fullmatch(value.strip(WHITESPACE)))
+
+
+def is_valid_uf(value):
+    return value.strip(WHITESPACE).upper() in UFS
+
+
+# Telefone com DDD: 10 dígitos (fixo) ou 11 dígitos começando por 9 após o DDD (celular), com ou sem +55
+def is_valid_phone(value):
+    value = value.strip(WHITESPACE)
+    if not PHONE_CHARS.fullmatch(value):
+        return False
+    digits = _digits(value)
+    if len(digits) in (12, 13) and digits[:2] == [5, 5]:
+        digits = digits[2:]
+    if len(digits) not in (10, 11) or digits[0] == 0 or digits[1] == 0:
+        return False
+    return len(digits) == 10 or digits[2] == 9
+
+
+def is_valid_email(value):
+    return bool(EMAIL_PATTERN.fullmatch(value.strip(WHITESPACE)))
+
+
+# Conversão para a matriz de bytes usada pelas funções vetorizadas: cada valor vira uma linha com width bytes
+# (zeros à direita). Valores maiores que width são marcados como longos demais e valores vazios ou só com
+# espaços, como vazios. Espaços nas pontas só são removidos com strip=True (para CNPJ/CPF e telefone os
+# espaços já são aceitos em qualquer posição).
+def _byte_matrix(values, width, strip=False):
+    values = pd.Series(values, dtype=object, copy=False)
+    missing = values.isna().to_numpy()
+    strings = values.to_numpy(dtype=object, copy=True)
+    strings[missing] = ""
+    if strip:
+        strings = pd.Series(strings, dtype=object).str.strip(WHITESPACE).to_numpy(dtype=object)
+    try:
+        matrix = strings.astype(f"S{width + 1}").view(np.uint8).reshape(len(strings), width + 1)
+    except UnicodeEncodeError:
+        # Acentos e outros caracteres não ASCII nunca são válidos nesses campos: viram o byte 255
+        codes = strings.astype(f"U{width + 1}").view(np.uint32).reshape(len(strings), width + 1)
+        matrix = np.minimum(codes, 255).astype(np.uint8)
+    too_long = matrix[:, width] != 0
+    matrix = matrix[:, :width]
+    return matrix, _only(matrix, "", digits=False), too_long
+
+
+# Linhas formadas só pelos caracteres em chars (e dígitos, se digits=True); espaços e o preenchimento
+# com zeros são sempre aceitos
+def _only(matrix, chars, digits=True):
+    allowed = np.zeros(256, dtype=bool)
+    allowed[np.frombuffer(f"\0 \t\n\r\x0b\x0c{chars}".encode("ascii"), dtype=np.uint8)] = True
+    allowed[48:58] = digits
+    return allowed[matrix].all(axis=1)
+
+
+# Extrai os primeiros size dígitos de cada linha, na ordem em que aparecem, e a quantidade de dígitos da linha.
+# As colunas além da quantidade de dígitos da linha não são dígitos e só devem ser usadas em linhas com
+# dígitos suficientes.
+# Em uma importação os valores costumam seguir poucos formatos (só dígitos, 00.000.000/0000-00, ...): as linhas
+# são agrupadas pela posição dos dígitos e cada grupo é extraído com índices de coluna fixos. Com muitos
+# formatos diferentes (mais que MAX_LAYOUTS), uma ordenação estável por "não é dígito" leva os dígitos para o
+# início de cada linha.
+def _digit_matrix(matrix, size):
+    is_digit = (matrix >= 48) & (matrix <= 57)
+    counts = is_digit.sum(axis=1)
+    packed = np.zeros((len(matrix), 4), dtype=np.uint8)
+    packed[:, :(matrix.shape[1] + 7) // 8] = np.packbits(is_digit, axis=1, bitorder="little")
+    codes, layouts = pd.factorize(packed.view("<u4")[:, 0])
+    if len(layouts) > MAX_LAYOUTS:
+        order = np.argsort(~is_digit, axis=1, kind="stable")[:, :size]
+        return np.take_along_axis(matrix, order, axis=1).astype(np.int16) - 48, counts
+    digits = np.empty((len(matrix), size), dtype=np.uint8)
+    for code in range(len(layouts)):
+        rows = codes == code
+        columns = np.argsort(~is_digit[rows.argmax()], kind="stable")[:size]
+        digits[rows] = matrix[rows][:, columns]
+    return digits.astype(np.int16) - 48, counts
+
+
+def _all_equal(digits):
+    return (digits == digits[:, :1]).all(axis=1)
+
+
+# digits: linhas com exatamente 11 dígitos
+def _cpf_digits_ok(digits):
+    ok = ~_all_equal(digits[:, :11])
+    for weights in CPF_WEIGHTS:
+        n = len(weights)
+        ok &= digits[:, :n] @ weights.astype(np.int16) * 10 % 11 % 10 == digits[:, n]
+    return ok
+
+
+# digits: linhas com exatamente 14 dígitos
+def _cnpj_digits_ok(digits):
+    ok = ~_all_equal(digits[:, :14])
+    for weights in CNPJ_WEIGHTS:
+        n = len(weights)
+        remainder = digits[:, :n] @ weights.astype(np.int16) % 11
+        ok &= np.where(remainder < 2, 0, 11 - remainder) == digits[:, n]
+    return ok
+
+
+# Funções vetorizadas: recebem uma sequência/Series de textos e retornam um array booleano
+def cnpj_cpf_valid(values):
+    matrix, empty, too_long = _byte_matrix(values, 24)
+    digits, counts = _digit_matrix(matrix, 14)
+    valid = _only(matrix, "./- ") & ~too_long
+    cpf = counts == 11
+    cnpj = counts == 14
+    # Cada regra só é calculada nas linhas com a quantidade de dígitos correspondente
+    valid[cpf] &= _cpf_digits_ok(digits[cpf])
+    valid[cnpj] &= _cnpj_digits_ok(digits[cnpj])
+    return (valid & (cpf | cnpj)) | empty
+
+
+def cep_valid(values):
+    matrix, empty, too_long = _byte_matrix(values, 9, strip=True)
+    is_digit = (matrix >= 48) & (matrix <= 57)
+    plain = is_digit[:, :8].all(axis=1) & (matrix[:, 8] == 0)
+    dashed = is_digit[:, :5].all(axis=1) & (matrix[:, 5] == ord("-")) & is_digit[:, 6:9].all(axis=1)
+    return ((plain | dashed) & ~too_long) | empty
+
+
+def uf_valid(values):
+    values = pd.Series(values, dtype=object, copy=False).str.strip(WHITESPACE)
+    return (values.isna() | (values == "") | values.str.upper().isin(UFS)).to_numpy(dtype=bool)
+
+
+def phone_valid(values):
+    matrix, empty, too_long = _byte_matrix(values, 24)
+    digits, counts = _digit_matrix(matrix, 5)
+    # Com +55, o DDD começa no terceiro dígito
+    country = ((counts == 12) | (counts == 13)) & (digits[:, 0] == 5) & (digits[:, 1] == 5)
+    start = np.where(country, 2, 0)
+    counts = counts - start
+    ddd1 = np.take_along_axis(digits, start[:, None], axis=1)[:, 0]
+    ddd2 = np.take_along_axis(digits, start[:, None] + 1, axis=1)[:, 0]
+    third = np.take_along_axis(digits, start[:, None] + 2, axis=1)[:, 0]
+    valid = _only(matrix, "()+-. ") & ~too_long & ((counts == 10) | (counts == 11))
+    valid &= (ddd1 != 0) & (ddd2 != 0) & ((counts == 10) | (third == 9))
+    return valid | empty
+
+
+def email_valid(values):
+    values = pd.Series(values, dtype=object, copy=False).str.strip(WHITESPACE)
+    matches = values.str.fullmatch(EMAIL_PATTERN.pattern, flags=EMAIL_PATTERN.flags, na=False)
+    return (values.isna() | (values == "") | matches).to_numpy(dtype=bool)
+
+
+# Regras por tipo de campo: (validação escalar, validação vetorizada, mensagem)
+CHECKS = {
+    "cnpj_cpf": (is_valid_cnpj_cpf, cnpj_cpf_valid, "dígitos verificadores inválidos ou formato incorreto (CPF com 11 dígitos, CNPJ com 14)"),
+    "cep": (is_valid_cep, cep_valid, "formato inválido, use 00000-000"),
+    "uf": (is_valid_uf, uf_valid, "sigla de estado inválida"),
+    "phone": (is_valid_phone, phone_valid, "telefone inválido, informe o DDD: (00) 0000-0000 ou (00) 90000-0000"),
+    "email": (is_valid_email, email_valid, "e-mail inválido"),
+}
+
+# Campos validados: (tipo, rótulo); os rótulos dos campos obrigatórios são os mesmos de required_fields
+FIELDS = {
+    "cnpj": ("cnpj_cpf", required_fields["cnpj"]),
+    "cep": ("cep", required_fields["cep"]),
+    "uf": ("uf", required_fields["uf"]),
+    "telefone_fixo": ("phone", required_fields["telefone_fixo"]),
+    "email": ("email", required_fields["email"]),
+    "celular": ("phone", "Telefone Celular"),
+    "shipping_cep": ("cep", "CEP de entrega"),
+    "shipping_uf": ("uf", "Estado de entrega"),
+    "email_contato": ("email", "Email do contato"),
+    "telefone_contato": ("phone", "Telefone do contato"),
+}
+
+
+# Função para validar um envio do formulário; retorna {campo: "Rótulo: mensagem"} só com os campos inválidos
+def validate_fields(data, fields=FIELDS):
+    errors = {}
+    for field, (kind, label) in fields.items():
+        value = data.get(field)
+        if not isinstance(value, str) or not value.strip(WHITESPACE):
+            continue
+        check, _, message = CHECKS[kind]
+        if not check(value):
+            errors[field] = f"{label}: {message}"
+    return errors
+
+
+# Função para validar um DataFrame inteiro; retorna uma Series (mesmo índice) com as mensagens de cada
+# linha separadas por "; " ("" quando a linha é válida)
+def validate_frame(frame, fields=FIELDS):
+    errors = pd.Series("", index=frame.index, dtype=object)
+    for field, (kind, label) in fields.items():
+        if field not in frame.columns:
+            continue
+        _, check, message = CHECKS[kind]
+        invalid = ~check(frame[field])
+        if invalid.any():
+            text = f"{label}: {message}"
+            errors[invalid] = np.where(errors[invalid] == "", text, errors[invalid] + "; " + text)
+    return errors
@@ -0,0 +1,434 @@
+import copy
+import io
+import posixpath
+import re
+import struct
+import zipfile
+import xml.etree.ElementTree as ET
+from xml.sax.saxutils import escape
+from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+from openpyxl.utils.cell import column_index_from_string, coordinate_from_string
+from PIL import Image as PILImage
+
+# Preenchimento direto do XML do xlsx: só as abas alteradas (e seus desenhos/relacionamentos)
+# são reescritas; todos os outros membros do zip são copiados sem descompactar.
+
+NS_MAIN = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+NS_REL = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+NS_PKG_REL = "http://schemas.openxmlformats.org/package/2006/relationships"
+REL_DRAWING = NS_REL + "/drawing"
+REL_IMAGE = NS_REL + "/image"
+REL_CALC_CHAIN = NS_REL + "/calcChain"
+CT_DRAWING = "application/vnd.openxmlformats-officedocument.drawing+xml"
+
+EMU_PER_PIXEL = 9525
+
+_ROW_RE = re.compile(r'<row\b[^>]*?\br="(\d+)"[^>]*?(/?)>')
+_CELL_RE = re.compile(r'<c\b[^>]*?\br="([A-Z]+)(\d+)"[^>]*?(?:/>|>.*?</c>)', re.S)
+_STYLE_RE = re.compile(r'\bs="(\d+)"')
+_CNVPR_ID_RE = re.compile(r'<xdr:cNvPr\b[^>]*?\bid="(\d+)"')
+_RID_RE = re.compile(r'\bId="rId(\d+)"')
+
+# Elementos que, pela ordem do schema, vêm depois de <drawing> numa worksheet
+_AFTER_DRAWING = ("<legacyDrawing", "<legacyDrawingHF", "<drawingHF", "<picture", "<oleObjects",
+                  "<controls", "<webPublishItems", "<tableParts", "<extLst", "</worksheet>")
+
+# Formatos que o openpyxl incorpora sem conversão; os demais viram PNG
+_RAW_IMAGE_FORMATS = {"png": "image/png", "jpeg": "image/jpeg", "gif": "image/gif"}
+
+
+# Função para preencher o template e gravar o resultado em dest
+# sheets: {nome_da_aba: {"cells": {"C11": valor}, "images": {"C165": arquivo_ou_bytes}}}
+def patch_workbook(source, dest, sheets):
+    if isinstance(source, str):
+        with open(source, "rb") as f:
+            source = io.BytesIO(f.read())
+    elif isinstance(source, bytes):
+        source = io.BytesIO(source)
+
+    with zipfile.ZipFile(source) as zin:
+        package = _Package(zin)
+        for sheet_name, plan in sheets.items():
+            package.patch_sheet(sheet_name, plan.get("cells", {}), plan.get("images", {}))
+        package.finish()
+
+        if isinstance(dest, str):
+            with open(dest, "wb") as f:
+                package.write(f)
+        else:
+            package.write(dest)
+
+
+# Função para ler valores de células sem carregar o workbook (usada para extrair dados de fichas já geradas)
+# sheets: {nome_da_aba: ["C11", ...]}; retorna {nome_da_aba: {"C11": texto ou None}} (abas inexistentes ficam vazias)
+def read_cells(source, sheets):
+    result = {}
+    with zipfile.ZipFile(source) as zin:
+        package = _Package(zin)
+        shared = None
+        for sheet_name, refs in sheets.items():
+            result[sheet_name] = values = dict.fromkeys(refs)
+            if sheet_name not in package._sheet_parts:
+                continue
+            wanted = set(refs)
+            for match in _CELL_RE.finditer(package.read_text(package._sheet_parts[sheet_name])):
+                ref = match.group(1) + match.group(2)
+                if ref not in wanted:
+                    continue
+                # O trecho da célula não traz a declaração do namespace: as tags ficam sem prefixo
+                cell = ET.fromstring(match.group(0))
+                kind = cell.get("t")
+                if kind == "inlineStr":
+                    value = "".join(t.text or "" for t in cell.iter("t"))
+                else:
+                    v = cell.find("v")
+                    value = v.text if v is not None else None
+                    if value is not None and kind == "s":
+                        if shared is None:
+                            shared = _shared_strings(package)
+                        value = shared[int(value)]
+                    elif value is not None and kind in (None, "n") and value.endswith(".0"):
+                        value = value[:-2]
+                values[ref] = value if value != "" else None
+    return result
+
+
+def _shared_strings(package):
+    if not package.exists("xl/sharedStrings.xml"):
+        return []
+    root = ET.fromstring(package.read("xl/sharedStrings.xml"))
+    return ["".join(t.text or "" for t in si.iter(f"{{{NS_MAIN}}}t")) for si in root.findall(f"{{{NS_MAIN}}}si")]
+
+
+
+class _Package:
+    def __init__(self, zin):
+        self.zin = zin
+        self.names = set(zin.namelist())
+        self.changed = {}
+        self.removed = set()
+        self.drop_calc_chain = False
+        self._workbook_rels = self._read_rels("xl/workbook.xml")
+        self._sheet_parts = self._read_sheet_parts()
+
+    # Leitura das partes, considerando as alterações pendentes
+    def read(self, name):
+        if name in self.changed:
+            return self.changed[name]
+        return self.zin.read(name)
+
+    def read_text(self, name):
+        return self.read(name).decode("utf-8")
+
+    def exists(self, name):
+        return name in self.changed or (name in self.names and name not in self.removed)
+
+    def put(self, name, content):
+        if isinstance(content, str):
+            content = content.encode("utf-8")
+        self.changed[name] = content
+
+    def _read_rels(self, part):
+        rels_name = _rels_name(part)
+        if not self.exists(rels_name):
+            return []
+        root = ET.fromstring(self.read(rels_name))
+        base = posixpath.dirname(part)
+        rels = []
+        for rel in root.findall(f"{{{NS_PKG_REL}}}Relationship"):
+            target = rel.get("Target")
+            if rel.get("TargetMode") != "External":
+                target = target[1:] if target.startswith("/") else posixpath.normpath(posixpath.join(base, target))
+            rels.append((rel.get("Id"), rel.get("Type"), target))
+        return rels
+
+    def _read_sheet_parts(self):
+        root = ET.fromstring(self.read("xl/workbook.xml"))
+        targets = {rid: target for rid, _, target in self._workbook_rels}
+        sheets = root.find(f"{{{NS_MAIN}}}sheets")
+        return {sheet.get("name"): targets[sheet.get(f"{{{NS_REL}}}id")] for sheet in sheets}
+
+    def _add_rel(self, part, rel_type, target_part):
+        rels_name = _rels_name(part)
+        if self.exists(rels_name):
+            xml = self.read_text(rels_name)
+        else:
+            xml = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                   f'<Relationships xmlns="{NS_PKG_REL}"></Relationships>')
+        used = [int(n) for n in _RID_RE.findall(xml)]
+        rid = f"rId{max(used, default=0) + 1}"
+        target = posixpath.relpath(target_part, posixpath.dirname(part))
+        rel = f'<Relationship Id="{rid}" Type="{rel_type}" Target="{escape(target)}"/>'
+        self.put(rels_name, xml.replace("</Relationships>", rel + "</Relationships>", 1))
+        return rid
+
+    def _free_name(self, pattern):
+        n = 1
+        while self.exists(pattern.format(n)):
+            n += 1
+        return pattern.format(n)
+
+    def patch_sheet(self, sheet_name, cells, images):
+        if sheet_name not in self._sheet_parts:
+            raise KeyError(f"Worksheet {sheet_name} does not exist.")
+        part = self._sheet_parts[sheet_name]
+        xml = self.read_text(part)
+
+        if cells:
+            xml = self._patch_cells(xml, cells)
+        if images:
+            xml = self._add_images(part, xml, images)
+        self.put(part, xml)
+
+    def _patch_cells(self, xml, cells):
+        by_row = {}
+        for ref, value in cells.items():
+            col, row = coordinate_from_string(ref)
+            by_row.setdefault(row, {})[column_index_from_string(col)] = (f"{col}{row}", value)
+
+        start = xml.find("<sheetData")
+        open_end = xml.find(">", start) + 1
+        if xml[open_end - 2] == "/":
+            # <sheetData/> vazio
+            head, body, tail = xml[:start] + "<sheetData>", "", "</sheetData>" + xml[open_end:]
+        else:
+            close = xml.find("</sheetData>", open_end)
+            head, body, tail = xml[:open_end], xml[open_end:close], xml[close:]
+
+        pending = sorted(by_row)
+        out = []
+        pos = 0
+        for m in _ROW_RE.finditer(body):
+            row = int(m.group(1))
+            if m.group(2):
+                content, end = "", m.end()
+                open_tag = m.group(0)[:-2].rstrip() + ">"
+            else:
+                close = body.index("</row>", m.end())
+                content, end = body[m.end():close], close + len("</row>")
+                open_tag = m.group(0)
+            out.append(body[pos:m.start()])
+            while pending and pending[0] < row:
+                r = pending.pop(0)
+                out.append(f'<row r="{r}">{self._patch_row("", by_row[r])}</row>')
+            if pending and pending[0] == row:
+                pending.pop(0)
+                content = self._patch_row(content, by_row[row])
+            out.append(f"{open_tag}{content}</row>" if content or not m.group(2) else m.group(0))
+            pos = end
+        out.append(body[pos:])
+        for r in pending:
+            out.append(f'<row r="{r}">{self._patch_row("", by_row[r])}</row>')
+        return head + "".join(out) + tail
+
+    def _patch_row(self, content, updates):
+        pending = sorted(updates)
+        out = []
+        pos = 0
+        for m in _CELL_RE.finditer(content):
+            col = column_index_from_string(m.group(1))
+            out.append(content[pos:m.start()])
+            while pending and pending[0] < col:
+                ref, value = updates[pending.pop(0)]
+                out.append(_cell_xml(ref, None, value))
+            if pending and pending[0] == col:
+                ref, value = updates[pending.pop(0)]
+                old = m.group(0)
+                if "<f>" in old or "<f " in old:
+                    self.drop_calc_chain = True
+                style = _STYLE_RE.search(old[:old.index(">")])
+                out.append(_cell_xml(ref, style.group(1) if style else None, value))
+            else:
+                out.append(m.group(0))
+            pos = m.end()
+        out.append(content[pos:])
+        for col in pending:
+            ref, value = updates[col]
+            out.append(_cell_xml(ref, None, value))
+        return "".join(out)
+
+    def _add_images(self, sheet_part, sheet_xml, images):
+        drawing = next((t for _, rel_type, t in self._read_rels(sheet_part) if rel_type == REL_DRAWING), None)
+        if drawing is None:
+            drawing = self._free_name("xl/drawings/drawing{}.xml")
+            self.put(drawing, '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                              '<xdr:wsDr xmlns:xdr="http://schemas.openxmlformats.org/drawingml/2006/spreadsheetDrawing" '
+                              'xmlns:a="http://schemas.openxmlformats.org/drawingml/2006/main"></xdr:wsDr>')
+            self._add_override(drawing, CT_DRAWING)
+            rid = self._add_rel(sheet_part, REL_DRAWING, drawing)
+            element = f'<drawing xmlns:r="{NS_REL}" r:id="{rid}"/>'
+            idx = min(i for i in (sheet_xml.find(tag) for tag in _AFTER_DRAWING) if i >= 0)
+            sheet_xml = sheet_xml[:idx] + element + sheet_xml[idx:]
+
+        drawing_xml = self.read_text(drawing)
+        next_id = max((int(n) for n in _CNVPR_ID_RE.findall(drawing_xml)), default=1) + 1
+        anchors = []
+        for ref, image in images.items():
+            blob, fmt, width, height = _load_image(image)
+            media = self._free_name("xl/media/image{}." + fmt)
+            self.put(media, blob)
+            self._add_default(fmt, _RAW_IMAGE_FORMATS[fmt])
+            rid = self._add_rel(drawing, REL_IMAGE, media)
+
+            col, row = coordinate_from_string(ref)
+            anchors.append(
+                "<xdr:oneCellAnchor>"
+                f"<xdr:from><xdr:col>{column_index_from_string(col) - 1}</xdr:col><xdr:colOff>0</xdr:colOff>"
+                f"<xdr:row>{row - 1}</xdr:row><xdr:rowOff>0</xdr:rowOff></xdr:from>"
+                f'<xdr:ext cx="{width * EMU_PER_PIXEL}" cy="{height * EMU_PER_PIXEL}"/>'
+                f'<xdr:pic><xdr:nvPicPr><xdr:cNvPr id="{next_id}" name="Image {next_id}"/>'
+                '<xdr:cNvPicPr><a:picLocks noChangeAspect="1"/></xdr:cNvPicPr></xdr:nvPicPr>'
+                f'<xdr:blipFill><a:blip xmlns:r="{NS_REL}" r:embed="{rid}"/><a:stretch><a:fillRect/></a:stretch></xdr:blipFill>'
+                '<xdr:spPr><a:prstGeom prst="rect"><a:avLst/></a:prstGeom></xdr:spPr></xdr:pic>'
+                "<xdr:clientData/></xdr:oneCellAnchor>"
+            )
+            next_id += 1
+        self.put(drawing, drawing_xml.replace("</xdr:wsDr>", "".join(anchors) + "</xdr:wsDr>", 1))
+        return sheet_xml
+
+    def _add_default(self, extension, content_type):
+        xml = self.read_text("[Content_Types].xml")
+        if re.search(r'<Default\b[^>]*\bExtension="%s"' % re.escape(extension), xml, re.I):
+            return
+        default = f'<Default Extension="{extension}" ContentType="{content_type}"/>'
+        idx = xml.index(">", xml.index("<Types")) + 1
+        self.put("[Content_Types].xml", xml[:idx] + default + xml[idx:])
+
+    def _add_override(self, part, content_type):
+        xml = self.read_text("[Content_Types].xml")
+        override = f'<Override PartName="/{part}" ContentType="{content_type}"/>'
+        self.put("[Content_Types].xml", xml.replace("</Types>", override + "</Types>", 1))
+
+    # Remove o calcChain quando alguma fórmula foi sobrescrita (o Excel o reconstrói ao abrir)
+    def finish(self):
+        if not self.drop_calc_chain:
+            return
+        for rid, rel_type, target in self._workbook_rels:
+            if rel_type == REL_CALC_CHAIN:
+                self.removed.add(target)
+                rels_name = _rels_name("xl/workbook.xml")
+                xml = self.read_text(rels_name)
+                self.put(rels_name, re.sub(r'<Relationship\b[^>]*\bId="%s"[^>]*/>' % rid, "", xml))
+                ct = self.read_text("[Content_Types].xml")
+                self.put("[Content_Types].xml", re.sub(r'<Override\b[^>]*\bPartName="/%s"[^>]*/>' % re.escape(target), "", ct))
+
+    def write(self, fileobj):
+        with zipfile.ZipFile(fileobj, "w", zipfile.ZIP_DEFLATED) as zout:
+            for info in self.zin.infolist():
+                if info.filename in self.removed:
+                    continue
+                if info.filename in self.changed:
+                    zout.writestr(info.filename, self.changed[info.filename], zipfile.ZIP_DEFLATED)
+                else:
+                    _copy_raw(self.zin, zout, info)
+            for name, content in self.changed.items():
+                if name not in self.names:
+                    compress = zipfile.ZIP_STORED if name.startswith("xl/media/") else zipfile.ZIP_DEFLATED
+                    zout.writestr(name, content, compress)
+
+
+# Função para montar o XML de uma célula (texto como inlineStr, sem tocar no sharedStrings)
+def _cell_xml(ref, style, value):
+    attrs = f'r="{ref}"' + (f' s="{style}"' if style is not None else "")
+    if value is None or value == "":
+        return f"<c {attrs}/>"
+    if isinstance(value, bool):
+        return f'<c {attrs} t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, (int, float)):
+        return f'<c {attrs} t="n"><v>{value!r}</v></c>'
+    value = str(value)
+    if ILLEGAL_CHARACTERS_RE.search(value):
+        raise ValueError(f"Caracteres inválidos para o Excel na célula {ref}")
+    space = ' xml:space="preserve"' if value != value.strip() or "\n" in value else ""
+    return f'<c {attrs} t="inlineStr"><is><t{space}>{escape(value)}</t></is></c>'
+
+
+# Função para obter bytes, formato e dimensões da imagem (mesmas regras do openpyxl)
+def _load_image(image):
+    blob = image.getvalue() if hasattr(image, "getvalue") else image
+    with PILImage.open(io.BytesIO(blob)) as img:
+        fmt = (img.format or "").lower()
+        width, height = img.size
+        if fmt not in _RAW_IMAGE_FORMATS:
+            buffer = io.BytesIO()
+            img.save(buffer, format="png")
+            blob, fmt = buffer.getvalue(), "png"
+    return blob, fmt, width, height
+
+
+def _rels_name(part):
+    return posixpath.join(posixpath.dirname(part), "_rels", posixpath.basename(part) + ".rels")
+
+
+# Copia um membro do zip de origem. O caminho rápido grava os bytes compactados sem descompactar/recompactar,
+# usando atributos internos do zipfile (fp, filelist, NameToInfo, start_dir, ZipInfo.FileHeader); ele só é
+# usado depois que _raw_copy_works() confirmou, neste processo, que a cópia gera um zip íntegro. Caso contrário
+# (ou para membros criptografados/ZIP64) a cópia usa só a API pública, cerca de 100 ms a mais por ficha.
+def _copy_raw(zin, zout, info):
+    if (not _raw_copy_works() or info.flag_bits & 0x01 or info.file_size >= zipfile.ZIP64_LIMIT
+            or info.compress_size >= zipfile.ZIP64_LIMIT):
+        _copy_member(zin, zout, info)
+        return
+    _write_raw(zin, zout, info)
+
+
+# Cópia pela API pública; o ZipInfo é copiado porque writestr altera o objeto (offset, tamanhos) e o de
+# origem continua em uso pelo zip de leitura
+def _copy_member(zin, zout, info):
+    zout.writestr(copy.copy(info), zin.read(info))
+
+
+def _write_raw(zin, zout, info):
+    zin.fp.seek(info.header_offset)
+    header = zin.fp.read(30)
+    name_len, extra_len = struct.unpack("<HH", header[26:30])
+    zin.fp.seek(info.header_offset + 30 + name_len + extra_len)
+    raw = zin.fp.read(info.compress_size)
+
+    new = zipfile.ZipInfo(info.filename, info.date_time)
+    new.compress_type = info.compress_type
+    new.external_attr = info.external_attr
+    new.create_system = info.create_system
+    new.flag_bits = info.flag_bits & ~0x08
+    new.CRC = info.CRC
+    new.compress_size = info.compress_size
+    new.file_size = info.file_size
+    new.header_offset = zout.fp.tell()
+    zout.fp.write(new.FileHeader(False))
+    zout.fp.write(raw)
+    zout.filelist.append(new)
+    zout.NameToInfo[new.filename] = new
+    zout.start_dir = zout.fp.tell()
+
+
+_raw_copy_checked = None
+
+
+# Verifica uma vez por processo se a cópia sem recompactar funciona nesta versão do Python: copia um zip de
+# teste (membros compactado e armazenado, antes e depois de um writestr) e confere o resultado pela API pública
+def _raw_copy_works():
+    global _raw_copy_checked
+    if _raw_copy_checked is None:
+        _raw_copy_checked = _check_raw_copy()
+    return _raw_copy_checked
+
+
+def _check_raw_copy():
+    members = {"a.xml": (b"<a>" + b"x" * 4096 + b"</a>", zipfile.ZIP_DEFLATED), "b.png": (bytes(range(256)), zipfile.ZIP_STORED)}
+    try:
+        source = io.BytesIO()
+        with zipfile.ZipFile(source, "w") as zsrc:
+            for name, (content, compress) in members.items():
+                zsrc.writestr(name, content, compress)
+        target = io.BytesIO()
+        with zipfile.ZipFile(source) as zin, zipfile.ZipFile(target, "w", zipfile.ZIP_DEFLATED) as zout:
+            infos = zin.infolist()
+            _write_raw(zin, zout, infos[0])
+            zout.writestr("c.xml", b"<c/>")
+            _write_raw(zin, zout, infos[1])
+        with zipfile.ZipFile(target) as zcheck:
+            if zcheck.testzip() is not None or zcheck.namelist() != ["a.xml", "c.xml", "b.png"]:
+                return False
+            return all(zcheck.read(name) == content for name, (content, _) in members.items())
+    except Exception:
+        return False